@@ -0,0 +1,190 @@
+"""Latency-SLO admission control for FLAN-T5 generation; template replies when over the SLO.
+
+    CHATBOT_GENERATION_SLO=6     # seconds per reply/plan, default 6
+    CHATBOT_GENERATION_SLOTS=1   # parallel generations; default: the profile's
+                                 # generator concurrency, else 1
+"""
+from __future__ import annotations
+
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Iterator, List, Optional
+
+from app.crisis import is_crisis
+from app.v2 import load as load_v2
+
+SLO_ENV = "CHATBOT_GENERATION_SLO"
+SLOTS_ENV = "CHATBOT_GENERATION_SLOTS"
+DEFAULT_SLO_S = 6.0
+KINDS = ("reply", "plan")
+
+CRISIS_REPLY = (
+    "I'm really concerned about what you're sharing, and I'm glad you told me. "
+    "Your safety matters most right now. Please reach out to one of the contacts shown here, "
+    "or to someone you trust, straight away."
+)
+FALLBACK_PLAN = [
+    "Take five slow breaths, breathing out longer than you breathe in",
+    "Name five things you can see and three you can hear",
+    "Drink some water and sit somewhere comfortable",
+    "Send a short message to someone you trust",
+]
+CRISIS_PLAN = ["Contact one of the helplines shown above now"] + FALLBACK_PLAN[:2]
+
+
+@dataclass
+class Ticket:
+    kind: str
+    started: float
+    ahead: float  # predicted wait when admitted, in units of service time
+
+
+@dataclass
+class Generated:
+    text: str
+    mode: str  # "model", "template" (degraded) or "crisis_fast_path"
+
+    @property
+    def degraded(self) -> bool:
+        return self.mode != "model"
+
+
+class AdmissionController:
+    """Admit a generation only if it is predicted to finish within the SLO."""
+
+    def __init__(self, slo_s: Optional[float] = None, slots: Optional[int] = None, window: int = 50) -> None:
+        self.slo_s = float(os.environ.get(SLO_ENV, DEFAULT_SLO_S)) if slo_s is None else slo_s
+        # $CHATBOT_GENERATION_SLOTS wins; ``slots`` (e.g. the profile's concurrency) is the default
+        self.slots = max(1, int(os.environ.get(SLOTS_ENV) or slots or 1))
+        self._service: Dict[str, Deque[float]] = {kind: deque(maxlen=window) for kind in KINDS}
+        self._in_flight: List[Ticket] = []
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {"admitted": 0, "degraded": 0, "crisis_fast_path": 0, "slo_missed": 0}
+
+    def estimate(self, kind: str) -> float:
+        """p90 of recent service times for ``kind`` (0 until the first sample)."""
+        samples = self._service[kind]
+        if not samples:
+            return 0.0
+        if len(samples) < 10:
+            return max(samples)
+        return statistics.quantiles(samples, n=10)[-1]
+
+    def _predict(self, kind: str) -> float:
+        backlog = sum(self.estimate(t.kind) for t in self._in_flight)
+        return backlog / self.slots + self.estimate(kind)
+
+    def predicted_latency(self, kind: str) -> float:
+        with self._lock:
+            return self._predict(kind)
+
+    def _admit(self, kind: str) -> Ticket:
+        ticket = Ticket(kind, time.perf_counter(), len(self._in_flight) / self.slots)
+        self._in_flight.append(ticket)
+        self.counts["admitted"] += 1
+        return ticket
+
+    def try_acquire(self, kind: str) -> Optional[Ticket]:
+        with self._lock:
+            if self._predict(kind) > self.slo_s:
+                self.counts["degraded"] += 1
+                return None
+            return self._admit(kind)
+
+    def try_acquire_free(self, kind: str) -> Optional[Ticket]:
+        """A ticket only if a slot is idle right now (checked and taken under one lock); never waits."""
+        with self._lock:
+            if len(self._in_flight) < self.slots:
+                return self._admit(kind)
+            self.counts["crisis_fast_path"] += 1
+            return None
+
+    def release(self, ticket: Ticket) -> None:
+        elapsed = time.perf_counter() - ticket.started
+        with self._lock:
+            self._in_flight.remove(ticket)
+            # Elapsed includes waiting behind the generations already running;
+            # divide it out so the window holds service time only
+            self._service[ticket.kind].append(elapsed / (1 + ticket.ahead))
+            if elapsed > self.slo_s:
+                self.counts["slo_missed"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.counts["admitted"] + self.counts["degraded"]
+            return {
+                **self.counts,
+                "degraded_rate": round(self.counts["degraded"] / total, 4) if total else 0.0,
+                "in_flight": len(self._in_flight),
+                "slots": self.slots,
+                "slo_s": self.slo_s,
+                "estimate_s": {kind: round(self.estimate(kind), 3) for kind in KINDS},
+            }
+
+
+class GuardedGeneration:
+    """Replies and plans from ``NLPModels`` under an ``AdmissionController``."""
+
+    def __init__(self, models, controller: Optional[AdmissionController] = None) -> None:
+        self.models = models
+        if controller is None:
+            profile = getattr(models, "profile", None)
+            concurrency = profile.models["generator"].concurrency if profile is not None else 0
+            controller = AdmissionController(slots=concurrency or None)
+        self.controller = controller
+        v2_nlp = load_v2("nlp")
+        self._analyzer = v2_nlp.CompanionNLP()
+        self._templates = v2_nlp.AdvancedResponseSystem()
+        self._lexicons = load_v2("lexicons")
+
+    def is_crisis(self, text: str) -> bool:
+        return is_crisis(text)
+
+    def _template_reply(self, text: str) -> str:
+        emotion = self._analyzer.analyze_sentiment(text)["dominant_emotion"]
+        # No companion persona here: FINAL's replies don't introduce a name
+        traits = {"topics_discussed": set(), "user_interests": set(), "first_interaction": False}
+        return self._templates.generate_response(text, emotion, [], traits, lexicon=self._lexicons.route(text))
+
+    def _ticket(self, kind: str, crisis: bool) -> Optional[Ticket]:
+        if crisis:
+            # Run the model only if it can start now; never queue a crisis turn
+            return self.controller.try_acquire_free(kind)
+        return self.controller.try_acquire(kind)
+
+    def reply(self, user_text: str, emotion_hint: Optional[str] = None, crisis: Optional[bool] = None,
+              context=None) -> Generated:
+        crisis = self.is_crisis(user_text) if crisis is None else crisis
+        ticket = self._ticket("reply", crisis)
+        if ticket is None:
+            return Generated(CRISIS_REPLY, "crisis_fast_path") if crisis else Generated(self._template_reply(user_text), "template")
+        try:
+            kwargs = {"context": context} if context else {}  # RemoteModels replies are stateless
+            reply = self.models.generate_empathetic_reply(user_text, emotion_hint=emotion_hint, crisis=crisis, **kwargs)
+            return Generated(reply, "model")
+        finally:
+            self.controller.release(ticket)
+
+    def plan(self, user_text: str, crisis: Optional[bool] = None,
+             emotion_hint: Optional[str] = None) -> "tuple[Iterator[str], str]":
+        """(bullet iterator, mode); the ticket is held until the iterator is exhausted or closed."""
+        crisis = self.is_crisis(user_text) if crisis is None else crisis
+        ticket = self._ticket("plan", crisis)
+        if ticket is None:
+            if crisis:
+                return iter(CRISIS_PLAN), "crisis_fast_path"
+            return iter(FALLBACK_PLAN), "template"
+        return self._stream_plan(user_text, ticket, crisis, emotion_hint), "model"
+
+    def _stream_plan(self, user_text: str, ticket: Ticket, crisis: bool, emotion_hint: Optional[str]) -> Iterator[str]:
+        try:
+            yield from self.models.stream_support_plan(user_text, emotion_hint=emotion_hint, crisis=crisis)
+        finally:
+            self.controller.release(ticket)
+
+    def stats(self) -> Dict:
+        return self.controller.stats()
@@ -0,0 +1,143 @@
+"""Audio preprocessing before speech-to-text.
+
+Uploads are downmixed to mono, resampled to Whisper's 16 kHz with a
+polyphase filter, and reduced to their speech spans by a frame-energy
+detector. The framing matches V2 ``Speech.rms_from_wav`` (60 ms frames,
+last partial frame kept), so both apps see the same envelope.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from math import gcd
+from typing import List, Tuple
+
+import numpy as np
+import soundfile as sf
+from scipy.signal import resample_poly
+
+try:
+    import whisper  # ffmpeg decoding for formats libsndfile can't read
+except Exception:
+    whisper = None
+
+TARGET_SR = 16000
+FRAME_MS = 60
+FLOOR_DB = -45.0  # dBFS; quieter than this is silence whatever the noise floor
+
+
+@dataclass
+class PreparedAudio:
+    samples: np.ndarray  # float32 mono at TARGET_SR, speech only
+    segments: List[Tuple[float, float]] = field(default_factory=list)  # seconds in the original
+    duration: float = 0.0
+    speech_duration: float = 0.0
+
+
+def load_audio(path: str) -> Tuple[np.ndarray, int]:
+    """Decode to float32 (frames, channels) without ffmpeg when possible."""
+    try:
+        data, sr = sf.read(path, dtype="float32", always_2d=True)
+        return data, sr
+    except Exception:
+        if whisper is None:
+            raise
+        # mp3/m4a on older libsndfile: ffmpeg already yields 16 kHz mono
+        return whisper.load_audio(path)[:, None], TARGET_SR
+
+
+def downmix(data: np.ndarray) -> np.ndarray:
+    if data.ndim == 1:
+        return data.astype(np.float32, copy=False)
+    return data.mean(axis=1, dtype=np.float32)
+
+
+def resample(data: np.ndarray, sr: int, target_sr: int = TARGET_SR) -> np.ndarray:
+    if sr == target_sr:
+        return data
+    g = gcd(sr, target_sr)
+    return resample_poly(data, target_sr // g, sr // g).astype(np.float32, copy=False)
+
+
+def frame_rms(data: np.ndarray, sr: int, chunk_ms: int = FRAME_MS) -> np.ndarray:
+    """Per-frame RMS, vectorized; same frames as V2 Speech.rms_from_wav (unnormalized)."""
+    chunk = max(1, int(sr * (chunk_ms / 1000.0)))
+    n_full = len(data) // chunk
+    squares = np.square(data, dtype=np.float64)
+    rms = np.sqrt(squares[: n_full * chunk].reshape(n_full, chunk).mean(axis=1))
+    if len(data) % chunk:
+        rms = np.append(rms, np.sqrt(squares[n_full * chunk:].mean()))
+    return rms
+
+
+def speech_frames(rms: np.ndarray, floor_db: float = FLOOR_DB, above_noise_db: float = 10.0) -> np.ndarray:
+    """Mark frames louder than both an absolute floor and the noise floor + margin."""
+    if rms.size == 0:
+        return np.zeros(0, dtype=bool)
+    db = 20 * np.log10(np.maximum(rms, 1e-10))
+    noise_db = np.percentile(db, 10)
+    return db > max(floor_db, noise_db + above_noise_db)
+
+
+def speech_segments(mask: np.ndarray, frame_s: float, min_speech_s: float = 0.25,
+                    max_gap_s: float = 0.5, pad_s: float = 0.2) -> List[Tuple[float, float]]:
+    """Turn a frame mask into padded (start, end) seconds, bridging short pauses."""
+    if not mask.any():
+        return []
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    runs = [[start * frame_s, end * frame_s] for start, end in zip(edges[::2], edges[1::2])]
+    merged = [runs[0]]
+    for start, end in runs[1:]:
+        if start - merged[-1][1] <= max_gap_s:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    total = len(mask) * frame_s
+    return [
+        (max(0.0, start - pad_s), min(total, end + pad_s))
+        for start, end in merged
+        if end - start >= min_speech_s
+    ]
+
+
+def preprocess(path: str, gap_s: float = 0.3) -> PreparedAudio:
+    """Load, downmix, resample and keep only speech, joined by short silences."""
+    data, sr = load_audio(path)
+    mono = resample(downmix(data), sr)
+    duration = len(mono) / TARGET_SR
+    rms = frame_rms(mono, TARGET_SR)
+    segments = speech_segments(speech_frames(rms), FRAME_MS / 1000.0)
+    if not segments:
+        # Steady speech with no quiet lead-in has no frames above its own
+        # noise floor; if it isn't silence, let Whisper hear all of it
+        level = float(np.sqrt(np.mean(np.square(mono, dtype=np.float64)))) if len(mono) else 0.0
+        if 20 * np.log10(max(level, 1e-10)) > FLOOR_DB:
+            return PreparedAudio(mono, [(0.0, duration)], duration, duration)
+        return PreparedAudio(np.zeros(0, dtype=np.float32), [], duration, 0.0)
+    gap = np.zeros(int(gap_s * TARGET_SR), dtype=np.float32)
+    pieces = []
+    for start, end in segments:
+        pieces.append(mono[int(start * TARGET_SR):int(end * TARGET_SR)])
+        pieces.append(gap)
+    samples = np.concatenate(pieces[:-1])
+    return PreparedAudio(samples, segments, duration, sum(e - s for s, e in segments))
+
+
+def chunk_for_whisper(prepared: PreparedAudio, max_s: float = 30.0) -> List[np.ndarray]:
+    """Split prepared speech into Whisper-sized windows, preferring silence gaps."""
+    samples = prepared.samples
+    limit = int(max_s * TARGET_SR)
+    if len(samples) <= limit:
+        return [samples] if len(samples) else []
+    chunks = []
+    start = 0
+    while start < len(samples):
+        end = min(len(samples), start + limit)
+        if end < len(samples):
+            # Cut at the quietest 60 ms frame in the last quarter of the window
+            window = samples[start + limit * 3 // 4:end]
+            rms = frame_rms(window, TARGET_SR)
+            if rms.size:
+                end = start + limit * 3 // 4 + int(np.argmin(rms)) * int(TARGET_SR * FRAME_MS / 1000)
+        chunks.append(samples[start:end])
+        start = end
+    return chunks
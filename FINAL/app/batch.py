@@ -0,0 +1,378 @@
+"""Offline batch scoring of message exports.
+
+Streams JSONL or CSV, fans fixed-size chunks out to a process pool whose
+workers each load their engine once, and writes results in input order
+as JSONL or Parquet. Only a bounded window of chunks is ever in memory,
+so file size does not matter. A checkpoint next to the output records the
+input byte offset and output state after each flush; ``--resume`` picks up
+from there after an interruption.
+
+    python -m app.batch messages.jsonl --out scored.jsonl --engine keyword --workers 8
+    python -m app.batch export.csv --out scored.parquet --engine cascade --resume
+
+Engines:
+    keyword      V2 keyword analyzer + crisis keywords (no models)
+    cascade      keyword first, XLM-R for the ambiguous rest (batched per chunk)
+    transformer  XLM-R sentiment for every message (batched per chunk)
+"""
+from __future__ import annotations
+
+import argparse
+import codecs
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from app.cascade import EMOTION_POLARITY, keyword_verdict, load_threshold
+from app.crisis import detect_crisis
+from app.v2 import load as load_v2
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:
+    pa = None
+    pq = None
+
+ENGINES = ("keyword", "cascade", "transformer")
+CHECKPOINT_SUFFIX = ".ckpt.json"
+TRANSFORMER_BATCH = 32
+
+
+# ---------------------------------------------------------------------------
+# Engines (one instance per worker process)
+
+
+class KeywordEngine:
+    def __init__(self, threshold: Optional[float] = None) -> None:
+        self.analyzer = load_v2("nlp").CompanionNLP()
+        self.threshold = load_threshold() if threshold is None else threshold
+
+    def _keyword_row(self, text: str) -> Dict:
+        analysis = self.analyzer.analyze_sentiment(text)
+        label, confidence = keyword_verdict(analysis)
+        crisis, hits = detect_crisis(text)
+        return {
+            "label": label or EMOTION_POLARITY.get(analysis["dominant_emotion"], "neutral"),
+            "source": "keyword",
+            "confidence": round(confidence, 4),
+            "emotion": analysis["dominant_emotion"],
+            "crisis": crisis,
+            "crisis_hits": hits,
+            "crisis_level": analysis["crisis_level"],
+            "language": analysis["language"],
+            "_confident": label is not None and confidence >= self.threshold,
+        }
+
+    def score(self, texts: List[str]) -> List[Dict]:
+        rows = [self._keyword_row(text) for text in texts]
+        for row in rows:
+            del row["_confident"]
+        return rows
+
+
+class TransformerEngine(KeywordEngine):
+    def __init__(self, threshold: Optional[float] = None) -> None:
+        super().__init__(threshold)
+        import torch
+        from transformers import pipeline
+
+        from app.nlp import SENTIMENT_MODEL
+
+        # One intra-op thread per worker: the pool supplies the parallelism
+        torch.set_num_threads(1)
+        self.sentiment = pipeline("sentiment-analysis", model=SENTIMENT_MODEL)
+
+    def _classify(self, texts: List[str]) -> List[str]:
+        if not texts:
+            return []
+        results = self.sentiment(texts, batch_size=TRANSFORMER_BATCH, truncation=True)
+        return [r.get("label", "neutral") for r in results]
+
+    def score(self, texts: List[str]) -> List[Dict]:
+        rows = [self._keyword_row(text) for text in texts]
+        for row, label in zip(rows, self._classify(texts)):
+            row["label"], row["source"] = label, "transformer"
+            del row["_confident"]
+        return rows
+
+
+class CascadeEngine(TransformerEngine):
+    def score(self, texts: List[str]) -> List[Dict]:
+        rows = [self._keyword_row(text) for text in texts]
+        escalate = [i for i, row in enumerate(rows) if not row["_confident"]]
+        for i, label in zip(escalate, self._classify([texts[i] for i in escalate])):
+            rows[i]["label"], rows[i]["source"] = label, "transformer"
+        for row in rows:
+            del row["_confident"]
+        return rows
+
+
+_ENGINE_CLASSES = {"keyword": KeywordEngine, "cascade": CascadeEngine, "transformer": TransformerEngine}
+_engine = None
+
+
+def _init_worker(engine: str, threshold: Optional[float]) -> None:
+    global _engine
+    _engine = _ENGINE_CLASSES[engine](threshold)
+
+
+def _score_chunk(texts: List[Optional[str]]) -> List[Dict]:
+    present = [i for i, text in enumerate(texts) if text]
+    scored = _engine.score([texts[i] for i in present])
+    rows: List[Dict] = [{"error": "missing text"} for _ in texts]
+    for i, row in zip(present, scored):
+        rows[i] = row
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# Input: records with the byte offset just past each one
+
+
+def _lines_with_offsets(fh, start: int) -> Iterator[Tuple[str, int]]:
+    fh.seek(start)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    offset = start
+    for raw in fh:
+        offset += len(raw)
+        yield decoder.decode(raw), offset
+
+
+def read_records(path: str, fmt: str, start: int = 0) -> Iterator[Tuple[Dict, int]]:
+    """Yield (record, end_offset). CSV headers are re-read when resuming mid-file."""
+    with open(path, "rb") as fh:
+        if fmt == "jsonl":
+            for line, offset in _lines_with_offsets(fh, start):
+                line = line.strip().lstrip("\ufeff")
+                if line:
+                    try:
+                        yield json.loads(line), offset
+                    except ValueError:
+                        yield {}, offset
+            return
+        header = fh.readline()
+        fieldnames = next(csv.reader([header.decode("utf-8-sig")]))
+        lines = _lines_with_offsets(fh, max(start, len(header)))
+        offset = {"end": start}
+
+        def text_lines() -> Iterator[str]:
+            # csv.reader pulls one physical line at a time, so the offset after
+            # the last pulled line is exactly the end of the current record
+            for line, end in lines:
+                offset["end"] = end
+                yield line
+
+        for values in csv.reader(text_lines()):
+            yield dict(zip(fieldnames, values)), offset["end"]
+
+
+# ---------------------------------------------------------------------------
+# Output
+
+
+class JsonlSink:
+    def __init__(self, path: str, resume_bytes: Optional[int]) -> None:
+        self.path = path
+        if resume_bytes is None:
+            self.fh = open(path, "wb")
+        else:
+            self.fh = open(path, "r+b")
+            self.fh.truncate(resume_bytes)  # drop rows written after the checkpoint
+            self.fh.seek(resume_bytes)
+
+    def write(self, rows: List[Dict]) -> None:
+        self.fh.write("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode("utf-8"))
+
+    def checkpoint(self) -> Dict:
+        self.fh.flush()
+        os.fsync(self.fh.fileno())
+        return {"out_bytes": self.fh.tell()}
+
+    def close(self) -> None:
+        self.fh.close()
+
+
+class ParquetSink:
+    """A directory of part files; each checkpoint closes the current part."""
+
+    COLUMNS = ("index", "id", "label", "source", "confidence", "emotion", "crisis",
+               "crisis_hits", "crisis_level", "language", "error")
+
+    def __init__(self, path: str, resume_parts: Optional[int]) -> None:
+        if pa is None:
+            raise SystemExit("Parquet output needs pyarrow: pip install pyarrow")
+        self.path = path
+        self.parts = resume_parts or 0
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            # Parts started after the checkpoint are incomplete
+            if name.startswith("part-") and int(name[5:10]) >= self.parts:
+                os.unlink(os.path.join(path, name))
+        self.buffer: Dict[str, list] = {col: [] for col in self.COLUMNS}
+
+    def write(self, rows: List[Dict]) -> None:
+        for row in rows:
+            for col in self.COLUMNS:
+                value = row.get(col)
+                self.buffer[col].append(json.dumps(value) if col == "id" and value is not None else value)
+
+    def checkpoint(self) -> Dict:
+        if self.buffer["index"]:
+            table = pa.table(self.buffer)
+            pq.write_table(table, os.path.join(self.path, f"part-{self.parts:05d}.parquet"))
+            self.parts += 1
+            self.buffer = {col: [] for col in self.COLUMNS}
+        return {"parts": self.parts}
+
+    def close(self) -> None:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Driver
+
+
+def _fingerprint(path: str, engine: str, text_field: str) -> Dict:
+    stat = os.stat(path)
+    return {"input": os.path.abspath(path), "size": stat.st_size, "mtime": int(stat.st_mtime),
+            "engine": engine, "text_field": text_field}
+
+
+def _save_checkpoint(path: str, state: Dict) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(state, fh)
+    os.replace(tmp, path)
+
+
+def _chunks(records: Iterator[Tuple[Dict, int]], size: int, first_index: int,
+            text_field: str, id_field: str) -> Iterator[Tuple[List[Optional[str]], List[Dict], int]]:
+    """(texts, row stubs with index/id, end offset) per chunk."""
+    index = first_index
+    texts: List[Optional[str]] = []
+    stubs: List[Dict] = []
+    end = 0
+    for record, end in records:
+        text = record.get(text_field)
+        texts.append(text if isinstance(text, str) else None)
+        stub = {"index": index}
+        if id_field in record:
+            stub["id"] = record[id_field]
+        stubs.append(stub)
+        index += 1
+        if len(texts) == size:
+            yield texts, stubs, end
+            texts, stubs = [], []
+    if texts:
+        yield texts, stubs, end
+
+
+def run(input_path: str, out_path: str, engine: str = "keyword", workers: int = 0,
+        chunk_size: int = 512, input_format: Optional[str] = None, output_format: Optional[str] = None,
+        text_field: str = "text", id_field: str = "id", checkpoint_every: int = 50_000,
+        resume: bool = False, threshold: Optional[float] = None) -> Dict:
+    input_format = input_format or ("csv" if input_path.lower().endswith(".csv") else "jsonl")
+    output_format = output_format or ("parquet" if out_path.lower().endswith(".parquet") else "jsonl")
+    ckpt_path = out_path.rstrip("/\\") + CHECKPOINT_SUFFIX
+    fingerprint = _fingerprint(input_path, engine, text_field)
+
+    state = {**fingerprint, "rows": 0, "offset": 0}
+    if os.path.exists(ckpt_path):
+        if not resume:
+            raise SystemExit(f"{ckpt_path} exists: pass --resume to continue, or delete it to start over")
+        with open(ckpt_path, "r", encoding="utf-8") as fh:
+            state = json.load(fh)
+        if any(state.get(k) != v for k, v in fingerprint.items()):
+            raise SystemExit(f"{ckpt_path} was written for a different input or engine")
+    elif os.path.exists(out_path):
+        raise SystemExit(f"{out_path} exists and has no checkpoint; choose another --out")
+    resuming = state["rows"] > 0
+
+    if output_format == "parquet":
+        sink = ParquetSink(out_path, state.get("parts") if resuming else None)
+    else:
+        sink = JsonlSink(out_path, state.get("out_bytes") if resuming else None)
+    _save_checkpoint(ckpt_path, state)  # from here on, an interrupted run can --resume
+
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    rows_this_run = 0
+    records = read_records(input_path, input_format, state["offset"])
+    chunks = _chunks(records, chunk_size, state["rows"], text_field, id_field)
+    in_flight: Deque[Tuple[Future, List[Dict], int]] = deque()
+    since_checkpoint = 0
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(engine, threshold)) as pool:
+        def fill() -> None:
+            # Bounded window: the file is read only as fast as results drain
+            while len(in_flight) < workers * 2:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    return
+                texts, stubs, end = chunk
+                in_flight.append((pool.submit(_score_chunk, texts), stubs, end))
+
+        fill()
+        while in_flight:
+            future, stubs, end = in_flight.popleft()
+            scored = future.result()
+            sink.write([{**stub, **row} for stub, row in zip(stubs, scored)])
+            state["rows"] += len(stubs)
+            state["offset"] = end
+            rows_this_run += len(stubs)
+            since_checkpoint += len(stubs)
+            if since_checkpoint >= checkpoint_every:
+                state.update(sink.checkpoint())
+                _save_checkpoint(ckpt_path, state)
+                since_checkpoint = 0
+            fill()
+
+    state.update(sink.checkpoint())
+    sink.close()
+    if os.path.exists(ckpt_path):
+        os.remove(ckpt_path)
+    elapsed = time.perf_counter() - started
+    return {
+        "rows": state["rows"],
+        "rows_this_run": rows_this_run,
+        "seconds": round(elapsed, 2),
+        "rows_per_sec": round(rows_this_run / elapsed, 1) if elapsed else 0.0,
+        "workers": workers,
+        "output": out_path,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Score a JSONL/CSV message export in parallel")
+    parser.add_argument("input", help="JSONL (one object per line) or CSV with a header row")
+    parser.add_argument("--out", required=True, help="output .jsonl file or .parquet directory")
+    parser.add_argument("--engine", choices=ENGINES, default="keyword")
+    parser.add_argument("--workers", type=int, default=0, help="processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=512)
+    parser.add_argument("--input-format", choices=("jsonl", "csv"), default=None)
+    parser.add_argument("--output-format", choices=("jsonl", "parquet"), default=None)
+    parser.add_argument("--text-field", default="text")
+    parser.add_argument("--id-field", default="id", help="copied to the output when present")
+    parser.add_argument("--checkpoint-every", type=int, default=50_000, help="rows between checkpoints")
+    parser.add_argument("--threshold", type=float, default=None, help="cascade threshold (default: cascade.json)")
+    parser.add_argument("--resume", action="store_true", help="continue from the checkpoint next to --out")
+    args = parser.parse_args(argv)
+
+    summary = run(
+        args.input, args.out, engine=args.engine, workers=args.workers, chunk_size=args.chunk_size,
+        input_format=args.input_format, output_format=args.output_format, text_field=args.text_field,
+        id_field=args.id_field, checkpoint_every=args.checkpoint_every, resume=args.resume,
+        threshold=args.threshold,
+    )
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
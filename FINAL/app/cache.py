@@ -0,0 +1,197 @@
+"""MinHash/LSH cache of generated replies and plans, keyed by near-duplicate input text."""
+from __future__ import annotations
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Generic, List, Optional, Set, Tuple, TypeVar
+
+V = TypeVar("V")
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Function words and intensifiers that do not change what a reply should say
+STOPWORDS = frozenset(
+    """
+    a an the i i'm im me my mine myself am is are was were be been being
+    so really very quite just too such much lot lots bit little kind sort
+    about of to in on at for with by from and or but that this it its
+    do does did have has had will would can could should
+    """.split()
+)
+
+_SUFFIXES = ("ingly", "edly", "ing", "ed", "ly", "es", "s")
+
+# One negation barely moves Jaccard, so entries only match with the same negators
+# (as normalize_tokens leaves them: "don't" -> "dont", "nothing" -> "noth")
+NEGATORS = frozenset(
+    """
+    not no never nothing nobody none nor neither cannot
+    dont doesnt didnt cant couldnt wont wouldnt shouldnt isnt arent wasnt werent
+    havent hasnt hadnt aint
+    nunca jamás nada ni ne pas jamais rien नहीं मत हरगिज़ hapana
+    """.split()
+)
+
+
+def _stem(word: str) -> str:
+    if word.endswith(("ss", "us")):
+        return word
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: -len(suffix)]
+    return word
+
+
+def normalize_tokens(text: str) -> FrozenSet[str]:
+    words = _WORD_RE.findall(text.casefold().replace("'", "").replace("’", ""))
+    return frozenset(_stem(w) for w in words if w not in STOPWORDS)
+
+
+_NEGATOR_STEMS = frozenset(_stem(w) for w in NEGATORS)
+
+
+def negators(tokens: FrozenSet[str]) -> FrozenSet[str]:
+    return tokens & _NEGATOR_STEMS
+
+
+def _hash64(token: str, seed: int) -> int:
+    digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8, key=seed.to_bytes(8, "little"))
+    return int.from_bytes(digest.digest(), "little")
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 64, bands: int = 16) -> None:
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+
+    def signature(self, tokens: FrozenSet[str]) -> Tuple[int, ...]:
+        if not tokens:
+            return tuple([0] * self.num_perm)
+        return tuple(min(_hash64(tok, seed) for tok in tokens) for seed in range(self.num_perm))
+
+    def band_keys(self, sig: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+        return [(b, sig[b * self.rows:(b + 1) * self.rows]) for b in range(self.bands)]
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+@dataclass
+class _Entry(Generic[V]):
+    tokens: FrozenSet[str]
+    negators: FrozenSet[str]
+    bands: List[Tuple[int, Tuple[int, ...]]]
+    value: V
+
+
+class SemanticCache(Generic[V]):
+    """Size-bounded LRU cache keyed by near-duplicate text.
+
+    ``namespace`` separates unrelated outputs (e.g. replies vs plans, or
+    replies for different emotion hints) that share the same input text.
+    """
+
+    def __init__(self, max_entries: int = 2048, threshold: float = 0.8,
+                 num_perm: int = 64, bands: int = 16) -> None:
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, bands)
+        self._entries: "OrderedDict[int, _Entry[V]]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, int, Tuple[int, ...]], Set[int]] = {}
+        self._namespaces: Dict[int, str] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+
+    def _fingerprint(self, text: str) -> Tuple[FrozenSet[str], List[Tuple[int, Tuple[int, ...]]]]:
+        tokens = normalize_tokens(text)
+        return tokens, self.hasher.band_keys(self.hasher.signature(tokens))
+
+    def get(self, text: str, namespace: str = "") -> Optional[V]:
+        tokens, bands = self._fingerprint(text)
+        if not tokens:
+            self.record_bypass()
+            return None
+        negated = negators(tokens)
+        with self._lock:
+            best_id, best_sim = None, 0.0
+            seen: Set[int] = set()
+            for band in bands:
+                for entry_id in self._buckets.get((namespace, *band), ()):
+                    if entry_id in seen:
+                        continue
+                    seen.add(entry_id)
+                    entry = self._entries[entry_id]
+                    if entry.negators != negated:
+                        continue
+                    sim = jaccard(tokens, entry.tokens)
+                    if sim > best_sim:
+                        best_id, best_sim = entry_id, sim
+            if best_id is not None and best_sim >= self.threshold:
+                self._entries.move_to_end(best_id)
+                self.hits += 1
+                return self._entries[best_id].value
+            self.misses += 1
+            return None
+
+    def put(self, text: str, value: V, namespace: str = "") -> None:
+        tokens, bands = self._fingerprint(text)
+        if not tokens:
+            return
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(tokens, negators(tokens), bands, value)
+            self._namespaces[entry_id] = namespace
+            for band in bands:
+                self._buckets.setdefault((namespace, *band), set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._evict_oldest()
+
+    def _evict_oldest(self) -> None:
+        entry_id, entry = self._entries.popitem(last=False)
+        namespace = self._namespaces.pop(entry_id)
+        for band in entry.bands:
+            key = (namespace, *band)
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+        self.evictions += 1
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self.bypassed += 1
+
+    def clear(self) -> None:
+        """Drop every entry and start the counters over, so stats() describes the new cache."""
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._namespaces.clear()
+            self.hits = self.misses = self.bypassed = self.evictions = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
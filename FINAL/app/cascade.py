@@ -0,0 +1,187 @@
+"""Keyword-first sentiment cascade: XLM-R only for messages the V2 analyzer is unsure of.
+
+    python -m app.cascade calibrate data/sentiment_sample.jsonl --out cascade.json
+    python -m app.cascade report messages.jsonl
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.v2 import load as load_v2
+
+CONFIG_ENV = "CHATBOT_CASCADE_CONFIG"
+DEFAULT_CONFIG_PATH = "cascade.json"
+DEFAULT_THRESHOLD = 0.4
+
+# V2 emotions -> the sentiment labels the XLM-R model emits
+EMOTION_POLARITY = {
+    "joy": "positive",
+    "sadness": "negative",
+    "anger": "negative",
+    "fear": "negative",
+    "disgust": "negative",
+    "neutral": "neutral",
+}
+
+
+@dataclass
+class CascadeResult:
+    label: str
+    source: str  # "keyword" or "transformer"
+    confidence: float
+    emotion: str
+
+
+def keyword_verdict(analysis: Dict) -> Tuple[Optional[str], float]:
+    """Sentiment label from a V2 analysis, or None if polarity is unclear."""
+    scores = analysis["emotion_scores"]
+    if analysis["crisis_level"] != "low":
+        return "negative", 1.0
+    if scores == {"neutral": 1.0}:  # greeting
+        return "neutral", 1.0
+    top = max(scores.values()) if scores else 0
+    if top == 0:
+        return None, 0.0
+    polarities = {EMOTION_POLARITY.get(e) for e, s in scores.items() if s == top}
+    if len(polarities) != 1 or None in polarities:
+        # Tied emotions disagree, or the winner (surprise) has no polarity
+        return None, analysis["confidence"]
+    return polarities.pop(), analysis["confidence"]
+
+
+def load_threshold(path: Optional[str] = None) -> float:
+    path = path or os.environ.get(CONFIG_ENV) or DEFAULT_CONFIG_PATH
+    if not os.path.exists(path):
+        return DEFAULT_THRESHOLD
+    with open(path, "r", encoding="utf-8") as fh:
+        return float(json.load(fh).get("threshold", DEFAULT_THRESHOLD))
+
+
+class CascadeClassifier:
+    def __init__(self, models=None, threshold: Optional[float] = None) -> None:
+        self.models = models  # NLPModels; only needed to escalate
+        self.threshold = load_threshold() if threshold is None else threshold
+        self.keyword = load_v2("nlp").CompanionNLP()
+        self._lock = threading.Lock()
+        self.answered = 0
+        self.escalated = 0
+
+    def classify(self, text: str) -> CascadeResult:
+        analysis = self.keyword.analyze_sentiment(text)
+        label, confidence = keyword_verdict(analysis)
+        if label is not None and confidence >= self.threshold:
+            with self._lock:
+                self.answered += 1
+            return CascadeResult(label, "keyword", confidence, analysis["dominant_emotion"])
+        with self._lock:
+            self.escalated += 1
+        if self.models is None:
+            return CascadeResult(label or "neutral", "keyword", confidence, analysis["dominant_emotion"])
+        return CascadeResult(
+            self.models.detect_sentiment(text), "transformer", confidence, analysis["dominant_emotion"]
+        )
+
+    def detect_sentiment(self, text: str) -> str:
+        return self.classify(text).label
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.answered + self.escalated
+            return {
+                "threshold": self.threshold,
+                "answered_by_keywords": self.answered,
+                "escalated": self.escalated,
+                "escalation_rate": (self.escalated / total) if total else 0.0,
+            }
+
+
+# ---------------------------------------------------------------------------
+# Calibration
+
+
+def _read_jsonl(path: str) -> Iterable[Dict]:
+    with open(path, "r", encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _normalize_label(label: str) -> str:
+    label = label.lower()
+    for polarity in ("negative", "neutral", "positive"):
+        if label.startswith(polarity[:3]):
+            return polarity
+    return label
+
+
+def calibrate(samples: List[Dict], target_accuracy: float = 0.9) -> Dict:
+    """Pick the lowest threshold whose keyword answers meet ``target_accuracy``.
+
+    Lower thresholds answer more messages without the transformer, so the
+    lowest one that is still accurate enough minimizes the escalation rate.
+    """
+    analyzer = load_v2("nlp").CompanionNLP()
+    verdicts = []
+    for sample in samples:
+        label, confidence = keyword_verdict(analyzer.analyze_sentiment(sample["text"]))
+        verdicts.append((label, confidence, _normalize_label(sample["label"])))
+
+    candidates = sorted({c for label, c, _ in verdicts if label is not None})
+    table = []
+    chosen = None
+    for threshold in candidates:
+        fast = [(label, gold) for label, c, gold in verdicts if label is not None and c >= threshold]
+        correct = sum(1 for label, gold in fast if label == gold)
+        accuracy = correct / len(fast) if fast else 0.0
+        escalation = 1 - len(fast) / len(verdicts)
+        table.append({"threshold": threshold, "fast_accuracy": accuracy, "escalation_rate": escalation})
+        if chosen is None and fast and accuracy >= target_accuracy:
+            chosen = threshold
+    if chosen is None:
+        # Nothing is accurate enough: escalate everything
+        chosen = float("inf")
+    return {"threshold": chosen, "target_accuracy": target_accuracy, "samples": len(verdicts), "table": table}
+
+
+def report(texts: Iterable[str], threshold: float) -> Dict[str, float]:
+    """Escalation rate of the keyword tier on unlabeled traffic (no transformer calls)."""
+    cascade = CascadeClassifier(models=None, threshold=threshold)
+    for text in texts:
+        cascade.classify(text)
+    return cascade.stats()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Keyword/transformer sentiment cascade tools")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    cal = sub.add_parser("calibrate", help="pick the threshold from a labeled JSONL sample")
+    cal.add_argument("labeled", help='JSONL with {"text": ..., "label": "negative|neutral|positive"}')
+    cal.add_argument("--target-accuracy", type=float, default=0.9)
+    cal.add_argument("--out", default=DEFAULT_CONFIG_PATH)
+    rep = sub.add_parser("report", help="escalation rate on a JSONL sample of messages")
+    rep.add_argument("messages", help='JSONL with {"text": ...}')
+    rep.add_argument("--threshold", type=float, default=None)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "calibrate":
+        result = calibrate(list(_read_jsonl(args.labeled)), args.target_accuracy)
+        for row in result["table"]:
+            print(f"threshold={row['threshold']:.2f} fast_accuracy={row['fast_accuracy']:.3f} "
+                  f"escalation_rate={row['escalation_rate']:.3f}")
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump({"threshold": result["threshold"]}, fh, indent=2)
+        print(f"Chose threshold {result['threshold']} -> {args.out}")
+    else:
+        threshold = load_threshold() if args.threshold is None else args.threshold
+        stats = report((row["text"] for row in _read_jsonl(args.messages)), threshold)
+        print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Per-session conversation history under a hard token budget.
+
+Each turn is tokenized once, when it is added, as ``User: ...`` or
+``Companion: ...``, together with a compressed form (its first
+``COMPRESSED_TOKENS`` tokens and an ellipsis). ``encode`` then only packs
+ids: newest turns first at full length while they fit, older turns in
+their compressed form, and whatever still doesn't fit is dropped. The
+result goes straight into the ``{history}`` slot of the reply template
+(see app/prompts.py), whose budget the template sets when it is
+compiled, so a long session never re-tokenizes its past or pushes the
+prompt over the model's input limit.
+"""
+from __future__ import annotations
+
+import typing as t
+from collections import deque
+from dataclasses import dataclass
+
+MAX_TURNS = 20  # older turns could never fit the budget anyway
+COMPRESSED_TOKENS = 24
+ROLES = {"user": "User:", "assistant": "Companion:"}
+
+
+@dataclass(frozen=True)
+class Turn:
+    role: str
+    text: str
+    ids: t.Tuple[int, ...]
+    short: t.Tuple[int, ...]  # compressed form; same as ids for short turns
+
+
+class ConversationContext:
+    def __init__(self, tok, budget: int, max_turns: int = MAX_TURNS,
+                 compressed_tokens: int = COMPRESSED_TOKENS) -> None:
+        self.tok = tok
+        self.budget = budget
+        self.compressed_tokens = compressed_tokens
+        self.turns: t.Deque[Turn] = deque(maxlen=max_turns)
+        self._ellipsis = tuple(self._ids("..."))
+        self.tokenized = 0  # turns tokenized so far; one per add()
+        self.last: t.Dict[str, int] = {"full": 0, "compressed": 0, "dropped": 0, "tokens": 0}
+
+    def __len__(self) -> int:
+        return len(self.turns)
+
+    def _ids(self, text: str) -> t.List[int]:
+        return self.tok(text, add_special_tokens=False)["input_ids"]
+
+    def add(self, role: str, text: str) -> Turn:
+        text = " ".join(text.split())
+        ids = tuple(self._ids(f"{ROLES[role]} {text}"))
+        self.tokenized += 1
+        short = ids
+        if len(ids) > self.compressed_tokens + len(self._ellipsis):
+            short = ids[: self.compressed_tokens] + self._ellipsis
+        turn = Turn(role, text, ids, short)
+        self.turns.append(turn)
+        return turn
+
+    def encode(self, budget: t.Optional[int] = None) -> t.List[int]:
+        """History ids in chronological order, never longer than the budget."""
+        remaining = self.budget if budget is None else budget
+        picked: t.List[t.Tuple[int, ...]] = []
+        full = compressed = 0
+        for turn in reversed(self.turns):
+            if len(turn.ids) <= remaining:
+                picked.append(turn.ids)
+                full += 1
+            elif len(turn.short) <= remaining:
+                picked.append(turn.short)
+                compressed += 1
+            else:
+                break  # keep the history contiguous; older turns are dropped
+            remaining -= len(picked[-1])
+        ids = [i for turn_ids in reversed(picked) for i in turn_ids]
+        self.last = {"full": full, "compressed": compressed,
+                     "dropped": len(self.turns) - full - compressed, "tokens": len(ids)}
+        return ids
+
+    def clear(self) -> None:
+        self.turns.clear()
+
+    def stats(self) -> t.Dict[str, int]:
+        return {"turns": len(self.turns), "tokenized": self.tokenized, "budget": self.budget, **self.last}
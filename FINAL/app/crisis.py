@@ -1,6 +1,12 @@
 from __future__ import annotations
 
-from typing import List, Tuple
+import re
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from app.v2 import load as load_v2
 
 HIGH_RISK_KEYWORDS = [
     "suicide",
@@ -13,22 +19,247 @@ HIGH_RISK_KEYWORDS = [
     "want to die",
 ]
 
+# Whole words, plus plain English inflections ("overdosed", "self harming"),
+# so "end my lifestyle" is not "end my life"
+_KEYWORD_RES = [
+    (kw, re.compile(r"(?<!\w)" + re.escape(kw) + r"(?:s|es|d|ed|ing)?(?!\w)")) for kw in HIGH_RISK_KEYWORDS
+]
+
+_fuzzy_lock = threading.Lock()
+_fuzzy = None
+
+
+def _fuzzy_matcher():
+    # V2's deletion-index matcher over our keywords: "suicde", "k!ll myself", "selfharm"
+    global _fuzzy
+    with _fuzzy_lock:
+        if _fuzzy is None:
+            _fuzzy = load_v2("fuzzy").FuzzyCrisisMatcher({kw: "high" for kw in HIGH_RISK_KEYWORDS})
+        return _fuzzy
+
+
+_analyzer_lock = threading.Lock()
+_analyzer = None
+
+
+def _v2_analyzer():
+    global _analyzer
+    with _analyzer_lock:
+        if _analyzer is None:
+            _analyzer = load_v2("nlp").CompanionNLP()
+        return _analyzer
+
 
 def detect_crisis(text: str) -> Tuple[bool, List[str]]:
     lowered = text.lower()
-    hits = [kw for kw in HIGH_RISK_KEYWORDS if kw in lowered]
+    hits = [kw for kw, pattern in _KEYWORD_RES if pattern.search(lowered)]
+    try:
+        fuzzy_hits = _fuzzy_matcher().matches(text)
+    except ImportError:  # no V2 checkout: exact keywords still screen the message
+        fuzzy_hits = []
+    hits.extend(kw for kw, _level in fuzzy_hits if kw not in hits)
     return (len(hits) > 0, hits)
 
 
+def is_crisis(text: str) -> bool:
+    """The UI's crisis decision: FINAL's keywords or V2's lexicon at "high"."""
+    if detect_crisis(text)[0]:
+        return True
+    try:
+        return _v2_analyzer().analyze_sentiment(text)["crisis_level"] == "high"
+    except ImportError:
+        return False
+
+
+@dataclass(frozen=True)
+class CrisisEvent:
+    phrase: str  # folded pattern that matched
+    level: str  # "high" or "medium"
+    offset: int  # characters fed (raw) when the phrase completed
+
+
+def fold_stream(text: str) -> str:
+    # V2's per-character lexicon folding: a stream never needs its script up front
+    fold_char = load_v2("fuzzy").fold_char
+    return "".join(fold_char(ch) for ch in text)
+
+
+class _Automaton:
+    """Aho-Corasick over folded crisis phrases; immutable once built."""
+
+    def __init__(self, phrases: Dict[str, str]) -> None:
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[Tuple[str, ...]] = [()]
+        self.levels = phrases
+        for phrase in phrases:
+            node = 0
+            for ch in phrase:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(())
+                node = nxt
+            self.out[node] += (phrase,)
+        queue = deque(self.goto[0].values())  # depth-1 nodes fail to the root
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                self.fail[nxt] = self.step(self.fail[node], ch)
+                self.out[nxt] += self.out[self.fail[nxt]]
+
+    def step(self, node: int, ch: str) -> int:
+        while node and ch not in self.goto[node]:
+            node = self.fail[node]
+        return self.goto[node].get(ch, 0)
+
+
+_automaton_lock = threading.Lock()
+_automaton: Optional[_Automaton] = None
+
+
+def crisis_phrases() -> Dict[str, str]:
+    """Folded phrase -> level: FINAL's keywords plus every V2 language pack."""
+    lexicons = load_v2("lexicons")
+    phrases: Dict[str, str] = {}
+    for level in ("medium", "high"):  # high wins when a phrase is in both
+        for pack in lexicons.LEXICONS.values():
+            for phrase in pack.get("crisis", {}).get(level, []):
+                phrases[" ".join(fold_stream(phrase).split())] = level
+    for phrase in HIGH_RISK_KEYWORDS:
+        phrases[fold_stream(phrase)] = "high"
+    return phrases
+
+
+def _get_automaton() -> _Automaton:
+    global _automaton
+    with _automaton_lock:
+        if _automaton is None:
+            _automaton = _Automaton(crisis_phrases())
+        return _automaton
+
+
+_stream_fuzzy_lock = threading.Lock()
+_stream_fuzzy = None
+
+
+def _get_stream_fuzzy():
+    # Same folded phrases as the automaton, so both report the same phrase keys
+    global _stream_fuzzy
+    with _stream_fuzzy_lock:
+        if _stream_fuzzy is None:
+            _stream_fuzzy = load_v2("fuzzy").FuzzyCrisisMatcher(crisis_phrases())
+        return _stream_fuzzy
+
+
+class StreamingCrisisDetector:
+    """Crisis screening for text that arrives in pieces (STT chunks, streams).
+
+    ``feed`` keeps the matcher state between calls, so a phrase split across
+    chunks ("kill my" + "self") is still found, and returns each phrase the
+    first time it completes. Whitespace runs are collapsed, so line breaks and
+    double spaces between words don't hide a phrase.
+
+    Exact phrases are found character by character. Typos and obfuscation
+    ("suicde", "k!ll myself") go through V2's fuzzy matcher, run over the
+    last few words each time a word is complete (followed by whitespace);
+    ``finish`` settles the last word at the end of the stream. A fuzzy hit's
+    offset is where the chunk that completed it ends.
+    """
+
+    def __init__(self, on_event: Optional[Callable[[CrisisEvent], None]] = None) -> None:
+        self.automaton = _get_automaton()
+        self.fuzzy = _get_stream_fuzzy()
+        self._fold_char = load_v2("fuzzy").fold_char
+        self.on_event = on_event
+        self.events: List[CrisisEvent] = []
+        self._seen: set = set()
+        self._node = 0
+        self._space = True  # leading whitespace is dropped
+        self._offset = 0
+        # Longest phrase plus the tokens a compound may be re-joined from
+        span = max((len(toks) for toks in self.fuzzy.phrases), default=1) + load_v2("fuzzy").MAX_JOIN
+        self._words: Deque[str] = deque(maxlen=span)
+        self._partial = ""  # raw text of a word still being fed
+
+    @property
+    def level(self) -> str:
+        levels = {e.level for e in self.events}
+        return "high" if "high" in levels else ("medium" if levels else "low")
+
+    def _emit(self, phrase: str, level: str, new: List[CrisisEvent]) -> None:
+        if phrase in self._seen:
+            return
+        self._seen.add(phrase)
+        event = CrisisEvent(phrase, level, self._offset)
+        self.events.append(event)
+        new.append(event)
+        if self.on_event is not None:
+            self.on_event(event)
+
+    def _fuzzy_tail(self, text: str, final: bool, new: List[CrisisEvent]) -> None:
+        words = (self._partial + text).split()
+        ends_word = final or text[-1:].isspace()
+        self._partial = "" if ends_word or not words else words.pop()
+        if words:
+            self._words.extend(words)
+            for phrase, level in self.fuzzy.matches(" ".join(self._words)):
+                self._emit(phrase, level, new)
+
+    def feed(self, chunk: str) -> List[CrisisEvent]:
+        new: List[CrisisEvent] = []
+        auto = self.automaton
+        for raw in chunk:
+            self._offset += 1
+            for ch in self._fold_char(raw):
+                if ch.isspace():
+                    if self._space:
+                        continue
+                    ch, self._space = " ", True
+                else:
+                    self._space = False
+                self._node = auto.step(self._node, ch)
+                for phrase in auto.out[self._node]:
+                    self._emit(phrase, auto.levels[phrase], new)
+        self._fuzzy_tail(chunk, False, new)
+        return new
+
+    def finish(self) -> List[CrisisEvent]:
+        """End of the stream: screen the last word, which no whitespace followed."""
+        new: List[CrisisEvent] = []
+        self._fuzzy_tail("", True, new)
+        return new
+
+    def reset(self) -> None:
+        self.events.clear()
+        self._seen.clear()
+        self._node, self._space, self._offset = 0, True, 0
+        self._words.clear()
+        self._partial = ""
+
+
+def preload_helplines() -> None:
+    """Load the helpline index up front so crisis replies never wait on disk."""
+    load_v2("helplines").get_resolver()
+
+
 def crisis_helpline(locale: str = "en") -> str:
-    # Minimal non-regional guidance; in production, localize per country
-    if locale.startswith("en"):
+    # Resolved in memory from V2/data/helplines.json (locale -> country -> language -> global);
+    # without V2 (or any match) the generic advice below still goes out
+    try:
+        lines = load_v2("helplines").get_resolver().lines(locale)
+    except Exception:
+        lines = []
+    if not lines:
         return (
             "If you are in immediate danger, call your local emergency number. "
-            "You can also contact a crisis hotline: US 988 Suicide & Crisis Lifeline, UK Samaritans 116 123."
+            "Please reach out to your nearest crisis hotline for support."
         )
-    # Fallback
     return (
         "If you are in immediate danger, call your local emergency number. "
-        "Please reach out to your nearest crisis hotline for support."
+        "You can also contact: " + "; ".join(lines) + "."
     )
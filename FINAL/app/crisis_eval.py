@@ -0,0 +1,219 @@
+"""Accuracy and throughput of the crisis detectors.
+
+Runs every registered detector over a labeled corpus (``data/crisis_eval.jsonl``
+by default: direct statements, paraphrases, typos, negations, idioms,
+third-party mentions, a few non-English lines and benign lookalikes such as
+"my books are overdue") and reports precision,
+recall, per-category recall, the missed crises and messages/sec.
+
+    python -m app.crisis_eval
+    python -m app.crisis_eval --detector final_keywords --show 20
+    python -m app.crisis_eval --baseline union   # fail if any detector misses what the baseline catches
+
+A new detector goes in ``DETECTORS``; with ``--baseline`` the command exits
+non-zero if it misses a crisis the baseline catches, so a faster detector
+cannot quietly trade away recall.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from app.crisis import StreamingCrisisDetector, crisis_phrases, detect_crisis
+from app.v2 import load as load_v2
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "crisis_eval.jsonl")
+
+Detector = Callable[[str], bool]
+
+
+def _v2_level(text: str) -> str:
+    lexicons = load_v2("lexicons")
+    lexicon = lexicons.route(text)
+    return lexicon.crisis_level(lexicon.fold(text))
+
+
+def _streamed(text: str, chunk: int = 7) -> bool:
+    # Small chunks, so most phrases straddle a boundary
+    detector = StreamingCrisisDetector()
+    for i in range(0, len(text), chunk):
+        detector.feed(text[i : i + chunk])
+    detector.finish()
+    return detector.level == "high"
+
+
+_fuzzy_high = None
+
+
+def _fuzzy(text: str) -> bool:
+    global _fuzzy_high
+    if _fuzzy_high is None:
+        high = {phrase: level for phrase, level in crisis_phrases().items() if level == "high"}
+        _fuzzy_high = load_v2("fuzzy").FuzzyCrisisMatcher(high)
+    return _fuzzy_high.level(text) == "high"
+
+
+DETECTORS: Dict[str, Detector] = {
+    # FINAL: HIGH_RISK_KEYWORDS substring match (gates the helpline banner)
+    # (exact substrings plus V2's fuzzy index over the same keywords)
+    "final_keywords": lambda text: detect_crisis(text)[0],
+    # V2: per-language lexicon, "high" only (gates the crisis reply)
+    "v2_high": lambda text: _v2_level(text) == "high",
+    # V2: "high" or "medium" (medium gets the support reply)
+    "v2_any": lambda text: _v2_level(text) != "low",
+    "union": lambda text: detect_crisis(text)[0] or _v2_level(text) == "high",
+    # Aho-Corasick over FINAL's keywords and every V2 pack's phrases, plus the fuzzy
+    # matcher over the stream's last words; fed in 7-char chunks
+    "stream_high": _streamed,
+    # Typo/obfuscation-tolerant index over the same phrases as stream_high
+    "fuzzy_high": _fuzzy,
+}
+
+
+@dataclass
+class DetectorReport:
+    name: str
+    tp: int = 0
+    fp: int = 0
+    fn: int = 0
+    tn: int = 0
+    by_category: Dict[str, List[int]] = field(default_factory=dict)  # category -> [caught, total]
+    false_negatives: List[str] = field(default_factory=list)
+    false_positives: List[str] = field(default_factory=list)
+    messages_per_sec: float = 0.0
+
+    @property
+    def precision(self) -> float:
+        return self.tp / (self.tp + self.fp) if self.tp + self.fp else 0.0
+
+    @property
+    def recall(self) -> float:
+        return self.tp / (self.tp + self.fn) if self.tp + self.fn else 0.0
+
+    @property
+    def f1(self) -> float:
+        p, r = self.precision, self.recall
+        return 2 * p * r / (p + r) if p + r else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "detector": self.name,
+            "precision": round(self.precision, 4),
+            "recall": round(self.recall, 4),
+            "f1": round(self.f1, 4),
+            "tp": self.tp, "fp": self.fp, "fn": self.fn, "tn": self.tn,
+            "by_category": {cat: {"flagged": c, "total": t} for cat, (c, t) in sorted(self.by_category.items())},
+            "messages_per_sec": round(self.messages_per_sec, 1),
+            "false_negatives": self.false_negatives,
+            "false_positives": self.false_positives,
+        }
+
+
+def load_corpus(path: str = DEFAULT_CORPUS) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def _throughput(detector: Detector, texts: List[str], min_seconds: float) -> float:
+    detector(texts[0])  # warm lazy imports and indexes
+    done = 0
+    started = time.perf_counter()
+    while True:
+        for text in texts:
+            detector(text)
+        done += len(texts)
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            return done / elapsed
+
+
+def evaluate(name: str, detector: Detector, corpus: List[Dict], min_seconds: float = 0.5) -> DetectorReport:
+    report = DetectorReport(name)
+    for sample in corpus:
+        flagged = bool(detector(sample["text"]))
+        crisis = bool(sample["label"])
+        counts = report.by_category.setdefault(sample.get("category", "other"), [0, 0])
+        counts[0] += flagged
+        counts[1] += 1
+        if crisis and flagged:
+            report.tp += 1
+        elif crisis:
+            report.fn += 1
+            report.false_negatives.append(sample["text"])
+        elif flagged:
+            report.fp += 1
+            report.false_positives.append(sample["text"])
+        else:
+            report.tn += 1
+    report.messages_per_sec = _throughput(detector, [s["text"] for s in corpus], min_seconds)
+    return report
+
+
+def regressions(report: DetectorReport, baseline: DetectorReport) -> List[str]:
+    """Crises the baseline catches but this detector misses."""
+    baseline_missed = set(baseline.false_negatives)
+    return [text for text in report.false_negatives if text not in baseline_missed]
+
+
+def _print_report(report: DetectorReport, show: int) -> None:
+    print(f"== {report.name}")
+    print(f"   precision {report.precision:.3f}  recall {report.recall:.3f}  f1 {report.f1:.3f}  "
+          f"(tp {report.tp}, fp {report.fp}, fn {report.fn}, tn {report.tn})  "
+          f"{report.messages_per_sec:,.0f} msg/s")
+    for category, (flagged, total) in sorted(report.by_category.items()):
+        print(f"   {category:<13} flagged {flagged}/{total}")
+    for label, examples in (("missed", report.false_negatives), ("false alarm", report.false_positives)):
+        for text in examples[:show]:
+            print(f"   {label}: {text}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Evaluate crisis detectors on a labeled corpus")
+    parser.add_argument("corpus", nargs="?", default=DEFAULT_CORPUS,
+                        help='JSONL with {"text", "label": 0|1, "category"}')
+    parser.add_argument("--detector", action="append", choices=sorted(DETECTORS),
+                        help="repeatable; default: all")
+    parser.add_argument("--show", type=int, default=10, help="examples of misses/false alarms per detector")
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="timing budget per detector")
+    parser.add_argument("--baseline", choices=sorted(DETECTORS), default=None,
+                        help="exit 1 if a detector misses a crisis this one catches")
+    parser.add_argument("--min-recall", type=float, default=None, help="exit 1 below this recall")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus(args.corpus)
+    names = args.detector or list(DETECTORS)
+    if args.baseline and args.baseline not in names:
+        names.append(args.baseline)
+    reports = {name: evaluate(name, DETECTORS[name], corpus, args.min_seconds) for name in names}
+
+    failures = []
+    for name, report in reports.items():
+        if args.min_recall is not None and report.recall < args.min_recall:
+            failures.append(f"{name}: recall {report.recall:.3f} < {args.min_recall}")
+        if args.baseline and name != args.baseline:
+            for text in regressions(report, reports[args.baseline]):
+                failures.append(f"{name} misses (caught by {args.baseline}): {text}")
+
+    if args.json:
+        print(json.dumps({"corpus": args.corpus, "samples": len(corpus),
+                          "detectors": [r.to_dict() for r in reports.values()],
+                          "failures": failures}, ensure_ascii=False, indent=2))
+    else:
+        positives = sum(1 for s in corpus if s["label"])
+        print(f"{len(corpus)} messages ({positives} crisis) from {args.corpus}\n")
+        for report in reports.values():
+            _print_report(report, args.show)
+            print()
+        for failure in failures:
+            print("FAIL " + failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
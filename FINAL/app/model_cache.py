@@ -0,0 +1,301 @@
+"""Local safetensors cache of model weights, memory-mapped on load.
+
+    CHATBOT_MODEL_CACHE=~/.cache/chatbot-models streamlit run streamlit_app.py
+    python -m app.model_cache build --dtype bfloat16 --whisper small
+    python -m app.model_cache verify
+    python -m app.model_cache list
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import struct
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+CACHE_ENV = "CHATBOT_MODEL_CACHE"
+DTYPE_ENV = "CHATBOT_MODEL_CACHE_DTYPE"
+MANIFEST = "manifest.json"
+WEIGHTS = "model.safetensors"
+EXTRA = "extra.safetensors"  # non-persistent buffers (position ids, masks)
+FORMAT_VERSION = 1
+
+
+class CacheError(RuntimeError):
+    pass
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(8 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _header_sha(path: str) -> str:
+    # safetensors: 8-byte little-endian header length, then the JSON header
+    with open(path, "rb") as fh:
+        (length,) = struct.unpack("<Q", fh.read(8))
+        return hashlib.sha256(fh.read(length)).hexdigest()
+
+
+def _slug(source: str, dtype: Optional[str]) -> str:
+    return source.replace("/", "--") + (f"@{dtype}" if dtype else "")
+
+
+def _split_state(model, dtype: Optional[str]) -> Tuple[Dict, Dict, Dict[str, str], List[str]]:
+    """(weights, extra buffers, aliases, sparse buffer names) ready for safetensors."""
+    import torch
+
+    cast = getattr(torch, dtype) if dtype else None
+
+    def prepare(t):
+        t = t.detach()
+        if cast is not None and t.is_floating_point():
+            t = t.to(cast)
+        return t.contiguous()
+
+    weights: Dict = {}
+    aliases: Dict[str, str] = {}
+    seen: Dict[Tuple[int, Tuple[int, ...]], str] = {}
+    for name, tensor in model.state_dict().items():
+        key = (tensor.data_ptr(), tuple(tensor.shape))
+        if key in seen:  # tied weights are stored once
+            aliases[name] = seen[key]
+            continue
+        seen[key] = name
+        weights[name] = prepare(tensor)
+    persistent = set(model.state_dict())
+    extra, sparse = {}, []
+    for name, buf in model.named_buffers():
+        if name in persistent or buf is None:
+            continue
+        if buf.is_sparse:
+            sparse.append(name)
+            buf = buf.to_dense()
+        extra[name] = prepare(buf)
+    return weights, extra, aliases, sparse
+
+
+def _assign(model, weights: Dict, extra: Dict, aliases: Dict[str, str], sparse: List[str]) -> None:
+    state = dict(weights)
+    for name, target in aliases.items():
+        state[name] = weights[target]
+    model.load_state_dict(state, strict=False, assign=True)
+    for name, buf in extra.items():
+        module_name, _, attr = name.rpartition(".")
+        module = model.get_submodule(module_name) if module_name else model
+        module._buffers[attr] = buf.to_sparse() if name in sparse else buf
+    missing = [n for n, t in list(model.named_parameters()) + list(model.named_buffers()) if t is not None and t.is_meta]
+    if missing:
+        raise CacheError(f"cached weights missing {len(missing)} tensors, e.g. {missing[0]}")
+
+
+class ModelCache:
+    def __init__(self, root: str, dtype: Optional[str] = None) -> None:
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.dtype = dtype or None
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    # -- manifest ---------------------------------------------------------
+
+    def manifest(self) -> Dict:
+        path = os.path.join(self.root, MANIFEST)
+        if not os.path.exists(path):
+            return {"version": FORMAT_VERSION, "entries": {}}
+        with open(path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+
+    def _record(self, slug: str, entry: Dict) -> None:
+        with self._lock:
+            manifest = self.manifest()
+            manifest["entries"][slug] = entry
+            tmp = os.path.join(self.root, MANIFEST + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump(manifest, fh, indent=2, sort_keys=True)
+            os.replace(tmp, os.path.join(self.root, MANIFEST))
+
+    def _check(self, slug: str) -> Optional[Dict]:
+        """Manifest entry if the files on disk still match it (sizes, headers), else None."""
+        entry = self.manifest()["entries"].get(slug)
+        if entry is None:
+            return None
+        directory = os.path.join(self.root, slug)
+        for name, meta in entry["files"].items():
+            path = os.path.join(directory, name)
+            if not os.path.exists(path) or os.path.getsize(path) != meta["bytes"]:
+                problem = "missing or truncated"
+            elif "header_sha256" in meta and _header_sha(path) != meta["header_sha256"]:
+                problem = "header does not match the manifest"
+            else:
+                continue
+            print(f"model cache: {slug}/{name} {problem}; converting again", file=sys.stderr)
+            return None
+        return entry
+
+    def _write(self, slug: str, source: str, kind: str, model, save_extra_files, dtype: Optional[str]) -> None:
+        from safetensors.torch import save_file
+
+        import torch
+
+        weights, extra, aliases, sparse = _split_state(model, dtype)
+        final = os.path.join(self.root, slug)
+        tmp = final + f".tmp{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        meta = {"aliases": json.dumps(aliases), "sparse": json.dumps(sparse)}
+        save_file(weights, os.path.join(tmp, WEIGHTS), metadata=meta)
+        if extra:
+            save_file(extra, os.path.join(tmp, EXTRA))
+        save_extra_files(tmp)
+        files = {}
+        for name in sorted(os.listdir(tmp)):
+            path = os.path.join(tmp, name)
+            if os.path.isfile(path):
+                files[name] = {"bytes": os.path.getsize(path), "sha256": _sha256(path)}
+                if name.endswith(".safetensors"):
+                    files[name]["header_sha256"] = _header_sha(path)
+        shutil.rmtree(final, ignore_errors=True)
+        os.replace(tmp, final)
+        self._record(slug, {
+            "source": source,
+            "kind": kind,
+            "dtype": dtype or "original",
+            "files": files,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "torch": torch.__version__,
+            "format": FORMAT_VERSION,
+        })
+
+    def _read(self, slug: str) -> Tuple[Dict, Dict, Dict[str, str], List[str]]:
+        from safetensors import safe_open
+        from safetensors.torch import load_file
+
+        directory = os.path.join(self.root, slug)
+        with safe_open(os.path.join(directory, WEIGHTS), framework="pt") as fh:
+            meta = fh.metadata() or {}
+        # load_file maps the file; the tensors are views into the mapping
+        weights = load_file(os.path.join(directory, WEIGHTS))
+        extra_path = os.path.join(directory, EXTRA)
+        extra = load_file(extra_path) if os.path.exists(extra_path) else {}
+        return weights, extra, json.loads(meta.get("aliases", "{}")), json.loads(meta.get("sparse", "[]"))
+
+    # -- transformers -----------------------------------------------------
+
+    def load_transformer(self, source: str, auto_class: str):
+        """(model, tokenizer) for a Hugging Face checkpoint, converting on first use."""
+        import torch
+        import transformers
+
+        slug = _slug(source, self.dtype)
+        cls = getattr(transformers, auto_class)
+        if self._check(slug) is None:
+            model = cls.from_pretrained(source)
+            tokenizer = transformers.AutoTokenizer.from_pretrained(source)
+
+            def save_extra(directory: str) -> None:
+                model.config.save_pretrained(directory)
+                tokenizer.save_pretrained(directory)
+
+            self._write(slug, source, auto_class, model, save_extra, self.dtype)
+            del model
+        directory = os.path.join(self.root, slug)
+        config = transformers.AutoConfig.from_pretrained(directory)
+        with torch.device("meta"):
+            model = cls.from_config(config)
+        _assign(model, *self._read(slug))
+        model.eval()
+        return model, transformers.AutoTokenizer.from_pretrained(directory)
+
+    # -- whisper ----------------------------------------------------------
+
+    def load_whisper(self, name: str):
+        """Whisper model, kept in its original dtype (decoding picks its own precision)."""
+        import torch
+        import whisper
+        from whisper.model import ModelDimensions, Whisper
+
+        slug = _slug(f"whisper/{name}", None)
+        if self._check(slug) is None:
+            model = whisper.load_model(name, device="cpu")
+
+            def save_extra(directory: str) -> None:
+                with open(os.path.join(directory, "dims.json"), "w", encoding="utf-8") as fh:
+                    json.dump(vars(model.dims), fh)
+
+            self._write(slug, f"whisper/{name}", "whisper", model, save_extra, None)
+            del model
+        with open(os.path.join(self.root, slug, "dims.json"), "r", encoding="utf-8") as fh:
+            dims = ModelDimensions(**json.load(fh))
+        with torch.device("meta"):
+            model = Whisper(dims)
+        _assign(model, *self._read(slug))
+        model.eval()
+        return model
+
+    # -- maintenance ------------------------------------------------------
+
+    def verify(self) -> List[str]:
+        """Full SHA-256 check of every file; returns the problems found."""
+        problems = []
+        for slug, entry in self.manifest()["entries"].items():
+            for name, meta in entry["files"].items():
+                path = os.path.join(self.root, slug, name)
+                if not os.path.exists(path):
+                    problems.append(f"{slug}/{name}: missing")
+                elif _sha256(path) != meta["sha256"]:
+                    problems.append(f"{slug}/{name}: sha256 mismatch")
+        return problems
+
+
+def from_env() -> Optional[ModelCache]:
+    root = os.environ.get(CACHE_ENV)
+    return ModelCache(root, os.environ.get(DTYPE_ENV)) if root else None
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build and check the memory-mapped model cache")
+    parser.add_argument("command", choices=["build", "verify", "list"])
+    parser.add_argument("--root", default=os.environ.get(CACHE_ENV, "~/.cache/chatbot-models"))
+    parser.add_argument("--dtype", default=os.environ.get(DTYPE_ENV), help="e.g. bfloat16; default keeps the original")
+    parser.add_argument("--whisper", action="append", default=[], help="Whisper model name(s) to cache, e.g. small")
+    args = parser.parse_args(argv)
+    cache = ModelCache(args.root, args.dtype)
+
+    if args.command == "build":
+        from app.nlp import GENERATOR_MODEL, NLI_MODEL, SENTIMENT_MODEL
+
+        jobs = [
+            (SENTIMENT_MODEL, lambda: cache.load_transformer(SENTIMENT_MODEL, "AutoModelForSequenceClassification")),
+            (GENERATOR_MODEL, lambda: cache.load_transformer(GENERATOR_MODEL, "AutoModelForSeq2SeqLM")),
+            (NLI_MODEL, lambda: cache.load_transformer(NLI_MODEL, "AutoModelForSequenceClassification")),
+        ] + [(f"whisper/{name}", lambda name=name: cache.load_whisper(name)) for name in args.whisper]
+        for source, load in jobs:
+            started = time.perf_counter()
+            load()  # converts if needed
+            built = time.perf_counter() - started
+            started = time.perf_counter()
+            load()  # now a pure mapped load
+            print(f"{source:<50} ready in {built:6.1f}s, mapped load {1000 * (time.perf_counter() - started):7.1f} ms")
+        print(f"cache: {cache.root}")
+    elif args.command == "verify":
+        problems = cache.verify()
+        for problem in problems:
+            print(problem)
+        print("ok" if not problems else f"{len(problems)} problems")
+        sys.exit(1 if problems else 0)
+    else:
+        for slug, entry in sorted(cache.manifest()["entries"].items()):
+            size = sum(meta["bytes"] for meta in entry["files"].values())
+            print(f"{slug:<55} {entry['dtype']:<9} {size / 2**20:9.1f} MiB  {entry['created']}")
+
+
+if __name__ == "__main__":
+    main()
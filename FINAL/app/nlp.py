@@ -1,74 +1,326 @@
+import queue
+import threading
 import typing as t
+from dataclasses import dataclass
 
+import torch
 from transformers import (
     pipeline,
     AutoTokenizer,
     AutoModelForSeq2SeqLM,
+    StoppingCriteria,
+    StoppingCriteriaList,
 )
 
+from app.cache import SemanticCache
+from app.context import ConversationContext
+from app.crisis import is_crisis
+from app.model_cache import from_env as model_cache
+from app.plan import BulletParser
+from app.prompts import compile_templates
+from app.quantize import apply as apply_quantization
+from app.runtime import MODEL_ROLES, ExecutionProfile, load_profile
+from app.v2 import load as load_v2
+
+SENTIMENT_MODEL = "cardiffnlp/twitter-xlm-roberta-base-sentiment"
+GENERATOR_MODEL = "google/flan-t5-base"
+NLI_MODEL = "joeddav/xlm-roberta-large-xnli"
+
+# Long inputs (Whisper transcripts, pasted journal entries) are scored in
+# overlapping token windows instead of one truncated or quadratic pass
+LONG_TEXT_CHARS = 1000
+SENTIMENT_WINDOW = 256  # tokens per window, specials included
+SENTIMENT_OVERLAP = 64  # tokens shared by consecutive windows
+WINDOW_BATCH = 16  # windows per forward pass
+
+
+@dataclass
+class SentimentWindow:
+    start: int  # character span in the input
+    end: int
+    weight: int  # tokens this window adds beyond the previous one
+    label: str
+    scores: t.Dict[str, float]
+
+
+@dataclass
+class WindowedSentiment:
+    label: str
+    votes: t.Dict[str, float]  # label -> share of tokens voting for it
+    windows: t.List[SentimentWindow]
+
+    def peak(self, label: str = "negative") -> t.Optional[SentimentWindow]:
+        """The window scoring highest for ``label`` (where distress peaks)."""
+        return max(self.windows, key=lambda w: w.scores.get(label, 0.0), default=None)
+
+
+# Zero-shot emotions: one premise/hypothesis pair per V2 emotion, scored in one batch
+HYPOTHESIS_TEMPLATE = "This text expresses {}."
+
+
+@dataclass
+class EmotionScores:
+    labels: t.Tuple[str, ...]
+    vector: t.List[float]  # aligned with labels; sums to 1
+
+    @property
+    def top(self) -> str:
+        return self.labels[max(range(len(self.vector)), key=self.vector.__getitem__)]
+
+    def as_dict(self) -> t.Dict[str, float]:
+        return dict(zip(self.labels, self.vector))
+
+
+class BulletStoppingCriteria(StoppingCriteria):
+    """Stops FLAN-T5 once the support plan's bullet list is complete."""
+
+    def __init__(self, tok, parser: BulletParser, on_bullet: t.Optional[t.Callable[[str], None]] = None) -> None:
+        self.tok = tok
+        self.parser = parser
+        self.on_bullet = on_bullet
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        text = self.tok.decode(input_ids[0], skip_special_tokens=True)
+        for bullet in self.parser.update(text):
+            if self.on_bullet is not None:
+                self.on_bullet(bullet)
+        return torch.full((input_ids.shape[0],), self.parser.done, dtype=torch.bool, device=input_ids.device)
+
 
 class NLPModels:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        profile: t.Optional[ExecutionProfile] = None,
+        cache: t.Optional[SemanticCache] = None,
+        quantize: t.Optional[bool] = None,
+    ) -> None:
+        # Thread budgets per model; see app/runtime.py
+        self.profile = profile or load_profile()
+        self.profile.apply_global()
+        # Near-duplicate cache for generated replies and plans
+        self.cache = cache if cache is not None else SemanticCache()
+        # CHATBOT_MODEL_CACHE: map converted safetensors instead of deserializing
+        self.weights_cache = model_cache()
+        self.mmap_weights = self.weights_cache is not None
         # Sentiment (multilingual)
-        self.sentiment = pipeline(
-            "sentiment-analysis",
-            model="cardiffnlp/twitter-xlm-roberta-base-sentiment",
-        )
+        self.sentiment = self._pipeline("sentiment-analysis", SENTIMENT_MODEL)
         # Empathy generator (FLAN-T5)
-        self.tok = AutoTokenizer.from_pretrained("google/flan-t5-base")
-        self.gen_model = AutoModelForSeq2SeqLM.from_pretrained("google/flan-t5-base")
+        if self.weights_cache is not None:
+            self.gen_model, self.tok = self.weights_cache.load_transformer(GENERATOR_MODEL, "AutoModelForSeq2SeqLM")
+        else:
+            self.tok = AutoTokenizer.from_pretrained(GENERATOR_MODEL)
+            self.gen_model = AutoModelForSeq2SeqLM.from_pretrained(GENERATOR_MODEL)
+        # Instruction text tokenized once; only slot values are tokenized per call
+        self.prompts = compile_templates(self.tok)
         # Optional: NLI for emotion inference or safety checks
-        self.nli = pipeline(
-            "text-classification",
-            model="joeddav/xlm-roberta-large-xnli",
-        )
+        self.nli = self._pipeline("text-classification", NLI_MODEL)
+        # Hypotheses are fixed: tokenize them once, per message only the premise
+        self.emotion_labels = tuple(load_v2("lexicons").LEXICONS["en"]["emotions"])
+        self._hypothesis_ids = [
+            self.nli.tokenizer(HYPOTHESIS_TEMPLATE.format(label), add_special_tokens=False)["input_ids"]
+            for label in self.emotion_labels
+        ]
+        label2id = {k.lower(): v for k, v in self.nli.model.config.label2id.items()}
+        self._entailment_id = next(v for k, v in label2id.items() if k.startswith("entail"))
+        # CHATBOT_QUANTIZE: int8 Linear layers for the roles that passed `python -m app.quantize check`
+        roles = None if quantize is None else (list(MODEL_ROLES) if quantize else [])
+        self.quantized = apply_quantization(self, roles)
+
+    def _pipeline(self, task: str, source: str):
+        if self.weights_cache is None:
+            return pipeline(task, model=source)
+        model, tokenizer = self.weights_cache.load_transformer(source, "AutoModelForSequenceClassification")
+        return pipeline(task, model=model, tokenizer=tokenizer)
 
     def detect_sentiment(self, text: str) -> str:
         try:
-            result = self.sentiment(text)[0]
+            if len(text) > LONG_TEXT_CHARS:
+                return self.sentiment_windows(text).label
+            with self.profile.run("sentiment"):
+                result = self.sentiment(text)[0]
             return result.get("label", "neutral")
         except Exception:
             return "neutral"
 
-    def _generate(self, prompt: str, max_new_tokens: int = 160) -> str:
-        inputs = self.tok(prompt, return_tensors="pt")
-        outputs = self.gen_model.generate(**inputs, max_new_tokens=max_new_tokens)
+    def sentiment_windows(
+        self, text: str, window: int = SENTIMENT_WINDOW, overlap: int = SENTIMENT_OVERLAP
+    ) -> WindowedSentiment:
+        """Score ``text`` in overlapping token windows, batched; cost is linear in length.
+
+        Each window votes for its label with the number of tokens it adds, so
+        overlaps aren't counted twice and a short tail window can't outvote
+        the body of the text.
+        """
+        tokenizer, model = self.sentiment.tokenizer, self.sentiment.model
+        enc = tokenizer(
+            text,
+            max_length=window,
+            stride=overlap,
+            truncation=True,
+            padding=True,
+            return_overflowing_tokens=True,
+            return_offsets_mapping=True,
+            return_tensors="pt",
+        )
+        offsets = enc.pop("offset_mapping")
+        enc.pop("overflow_to_sample_mapping", None)
+        probs = []
+        with torch.no_grad():
+            for i in range(0, enc["input_ids"].shape[0], WINDOW_BATCH):
+                batch = {k: v[i : i + WINDOW_BATCH] for k, v in enc.items()}
+                with self.profile.run("sentiment"):
+                    probs.append(model(**batch).logits.softmax(dim=-1))
+        probs = torch.cat(probs)
+        names = [model.config.id2label[i] for i in range(probs.shape[1])]
+
+        windows: t.List[SentimentWindow] = []
+        votes = dict.fromkeys(names, 0.0)
+        for i, (row, spans) in enumerate(zip(probs.tolist(), offsets.tolist())):
+            spans = [(a, b) for a, b in spans if b > a]  # drop specials and padding
+            tokens = len(spans)
+            weight = max(1, tokens - overlap) if i else max(1, tokens)
+            scores = dict(zip(names, row))
+            label = max(scores, key=scores.get)
+            votes[label] += weight
+            start, end = (spans[0][0], spans[-1][1]) if spans else (0, 0)
+            windows.append(SentimentWindow(start, end, weight, label, scores))
+        total = sum(votes.values()) or 1.0
+        votes = {name: v / total for name, v in votes.items()}
+        # Ties go to the label with the higher mean probability
+        label = max(names, key=lambda n: (votes[n], sum(w.scores[n] for w in windows)))
+        return WindowedSentiment(label, votes, windows)
+
+    def _generate(
+        self,
+        inputs: t.Dict[str, torch.Tensor],
+        max_new_tokens: int = 160,
+        stopping_criteria: t.Optional[StoppingCriteriaList] = None,
+    ) -> str:
+        with self.profile.run("generator"):
+            outputs = self.gen_model.generate(
+                **inputs, max_new_tokens=max_new_tokens, stopping_criteria=stopping_criteria
+            )
         return self.tok.decode(outputs[0], skip_special_tokens=True)
 
-    def generate_empathetic_reply(self, user_text: str, emotion_hint: t.Optional[str] = None) -> str:
+    def _cacheable(self, user_text: str, crisis: bool = False) -> bool:
+        # Crisis messages always get a fresh generation; same test as the UI's helpline banner
+        crisis = crisis or is_crisis(user_text)
+        if crisis:
+            self.cache.record_bypass()
+        return not crisis
+
+    def new_context(self) -> ConversationContext:
+        """Empty per-session history for ``generate_empathetic_reply``."""
+        return ConversationContext(self.tok, self.prompts["reply_context"].budgets["history"])
+
+    def generate_empathetic_reply(
+        self,
+        user_text: str,
+        emotion_hint: t.Optional[str] = None,
+        context: t.Optional[ConversationContext] = None,
+        crisis: bool = False,
+    ) -> str:
         sentiment_label = emotion_hint or self.detect_sentiment(user_text)
-        prompt = (
-            "You are a compassionate, non-judgmental mental health support bot. "
-            "Goals: reflect feelings, validate, normalize, and offer gentle hope. "
-            "Avoid medical claims or diagnosis. Keep tone warm, brief, and culturally sensitive.\n\n"
-            f"User message (may be multilingual): {user_text}\n"
-            f"Detected emotion: {sentiment_label}\n\n"
-            "Write a supportive, empathetic response in the same language as the user. "
-            "Use simple language and 2-4 sentences."
-        )
-        return self._generate(prompt, max_new_tokens=140)
-
-    def generate_support_plan(self, user_text: str) -> t.List[str]:
-        prompt = (
-            "You are a supportive assistant. Create a brief, safe, actionable plan with 3-5 bullet points "
-            "to help the user cope right now. Include self-care, grounding, and optional social/pro help. "
-            "Avoid medical advice, diagnosis, or unsafe instructions. Keep steps simple and feasible.\n\n"
-            f"User message: {user_text}\n\n"
-            "Return only bullet points starting with '- '. Keep each under 18 words."
-        )
-        text = self._generate(prompt, max_new_tokens=160)
-        lines = [l.strip() for l in text.splitlines() if l.strip()]
-        bullets = [l[2:].strip() for l in lines if l.startswith("- ")]
-        # Fallback if model returns a paragraph
-        if not bullets:
-            bullets = [text.strip()[:140]]
-        # Cap 5 items
-        return bullets[:5]
+        if context:
+            # A reply that depends on earlier turns can't be shared through the cache
+            inputs = self.prompts["reply_context"].encode(
+                history=context.encode(), user_text=user_text, emotion=sentiment_label
+            )
+            return self._generate(inputs, max_new_tokens=140)
+        namespace = f"reply:{sentiment_label}"
+        use_cache = self._cacheable(user_text, crisis)
+        if use_cache:
+            cached = self.cache.get(user_text, namespace)
+            if cached is not None:
+                return cached
+        inputs = self.prompts["reply"].encode(user_text=user_text, emotion=sentiment_label)
+        reply = self._generate(inputs, max_new_tokens=140)
+        if use_cache:
+            self.cache.put(user_text, reply, namespace)
+        return reply
+
+    def _run_support_plan(self, user_text: str, on_bullet: t.Optional[t.Callable[[str], None]] = None) -> t.List[str]:
+        # Decoding halts as soon as the parser has five bullets or sees prose
+        parser = BulletParser(max_bullets=5, max_words=18)
+        stop = StoppingCriteriaList([BulletStoppingCriteria(self.tok, parser, on_bullet)])
+        inputs = self.prompts["plan"].encode(user_text=user_text)
+        text = self._generate(inputs, max_new_tokens=160, stopping_criteria=stop)
+        parser.update(text)
+        return parser.finish()
+
+    def _plan_namespace(self, user_text: str, emotion_hint: t.Optional[str]) -> str:
+        # Keyed by sentiment like replies: a near-duplicate of the opposite mood gets its own plan
+        return f"plan:{emotion_hint or self.detect_sentiment(user_text)}"
+
+    def generate_support_plan(self, user_text: str, emotion_hint: t.Optional[str] = None,
+                              crisis: bool = False) -> t.List[str]:
+        use_cache = self._cacheable(user_text, crisis)
+        if use_cache:
+            namespace = self._plan_namespace(user_text, emotion_hint)
+            cached = self.cache.get(user_text, namespace)
+            if cached is not None:
+                return list(cached)
+        bullets = self._run_support_plan(user_text)
+        if use_cache:
+            self.cache.put(user_text, tuple(bullets), namespace)
+        return bullets
+
+    def stream_support_plan(self, user_text: str, emotion_hint: t.Optional[str] = None,
+                            crisis: bool = False) -> t.Iterator[str]:
+        """Yield plan bullets as soon as each one is complete."""
+        use_cache = self._cacheable(user_text, crisis)
+        if use_cache:
+            namespace = self._plan_namespace(user_text, emotion_hint)
+            cached = self.cache.get(user_text, namespace)
+            if cached is not None:
+                yield from cached
+                return
+        updates: "queue.Queue[t.Tuple[str, t.Any]]" = queue.Queue()
+
+        def worker() -> None:
+            try:
+                plan = self._run_support_plan(user_text, on_bullet=lambda b: updates.put(("bullet", b)))
+                updates.put(("done", plan))
+            except Exception as exc:
+                updates.put(("error", exc))
+
+        threading.Thread(target=worker, daemon=True).start()
+        sent = 0
+        while True:
+            kind, value = updates.get()
+            if kind == "bullet":
+                sent += 1
+                yield value
+            elif kind == "error":
+                raise value
+            else:
+                # Bullets only known at end of output (last bullet, prose fallback)
+                yield from value[sent:]
+                if use_cache:
+                    self.cache.put(user_text, tuple(value), namespace)
+                return
+
+    def emotion_scores(self, premise: str) -> EmotionScores:
+        """Zero-shot scores over the V2 emotions from one batched XNLI forward pass."""
+        tokenizer, model = self.nli.tokenizer, self.nli.model
+        longest = max(len(ids) for ids in self._hypothesis_ids)
+        budget = tokenizer.model_max_length - longest - tokenizer.num_special_tokens_to_add(pair=True)
+        premise_ids = tokenizer(premise, add_special_tokens=False, truncation=True, max_length=budget)["input_ids"]
+        pairs = [tokenizer.build_inputs_with_special_tokens(premise_ids, hyp) for hyp in self._hypothesis_ids]
+        width = max(len(ids) for ids in pairs)
+        input_ids = torch.full((len(pairs), width), tokenizer.pad_token_id, dtype=torch.long)
+        attention = torch.zeros((len(pairs), width), dtype=torch.long)
+        for row, ids in enumerate(pairs):
+            input_ids[row, : len(ids)] = torch.tensor(ids)
+            attention[row, : len(ids)] = 1
+        with torch.no_grad(), self.profile.run("nli"):
+            logits = model(input_ids=input_ids, attention_mask=attention).logits
+        # Single-label: softmax of the entailment logits across emotions
+        vector = logits[:, self._entailment_id].softmax(dim=0).tolist()
+        return EmotionScores(self.emotion_labels, vector)
 
     def nli_emotion(self, premise: str) -> str:
-        # Simple wrapper; could map NLI labels to emotions
         try:
-            result = self.nli(premise)[0]
-            return result.get("label", "UNKNOWN")
+            return self.emotion_scores(premise).top
         except Exception:
             return "UNKNOWN"
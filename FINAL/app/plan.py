@@ -0,0 +1,106 @@
+"""Incremental parser for the support plan's "- " bullet list.
+
+Fed decoded text as generation progresses, it reports each bullet the
+moment it is complete and says when decoding can stop: enough bullets
+exist, a bullet has run on far past the word limit, or the output is a
+paragraph rather than a list.
+"""
+from __future__ import annotations
+
+import re
+from typing import List, Optional
+
+# "- " at the start of the text or of a line. T5 cannot emit newlines, so inline
+# " - " also counts after a sentence end or before a capitalized step; a dash
+# inside a bullet ("stress - and sleep", "5 - 10 minutes") never does
+_MARKER_RE = re.compile(r"(?:^|(?<=\n)|(?<=[.!?;]\s)|(?<=\s)(?=-\s+[A-Z]))-\s")
+_MARKER_LOOKAHEAD = 3  # chars after a dash the pattern may need to see
+_SENTENCE_END = (".", "!", "?")
+
+
+class BulletParser:
+    def __init__(self, max_bullets: int = 5, max_words: int = 18, prose_limit: int = 140) -> None:
+        self.max_bullets = max_bullets
+        self.max_words = max_words
+        self.prose_limit = prose_limit
+        self.reset()
+
+    def reset(self) -> None:
+        self.text = ""
+        self.bullets: List[str] = []
+        self.stop_reason: Optional[str] = None
+        self._open_start: Optional[int] = None  # start of the bullet being written
+        self._scan_pos = 0
+
+    @property
+    def done(self) -> bool:
+        return self.stop_reason is not None
+
+    def _trim(self, bullet: str) -> str:
+        words = bullet.split()
+        if len(words) > self.max_words:
+            return " ".join(words[: self.max_words])
+        return bullet
+
+    def _close(self, end: int) -> List[str]:
+        bullet = self.text[self._open_start:end].strip()
+        if not bullet:
+            return []
+        self.bullets.append(self._trim(bullet))
+        return [self.bullets[-1]]
+
+    def feed(self, delta: str) -> List[str]:
+        """Consume newly decoded text; return bullets completed by it."""
+        if self.done:
+            return []
+        self.text += delta
+        completed: List[str] = []
+        for match in _MARKER_RE.finditer(self.text, self._scan_pos):
+            if self._open_start is not None:
+                completed += self._close(match.start())
+            self._open_start = match.end()
+            self._scan_pos = match.end()
+            if len(self.bullets) >= self.max_bullets:
+                self.stop_reason = "enough_bullets"
+                return completed
+        # Rescan the tail next time: a trailing "-" may become a marker
+        self._scan_pos = max(self._scan_pos, len(self.text) - _MARKER_LOOKAHEAD)
+        self._check_open_bullet(completed)
+        return completed
+
+    def _check_open_bullet(self, completed: List[str]) -> None:
+        if self._open_start is None:
+            if len(self.text.strip()) >= self.prose_limit:
+                self.stop_reason = "not_a_list"
+            return
+        open_text = self.text[self._open_start:].strip()
+        words = open_text.split()
+        if len(words) > 2 * self.max_words:
+            self.stop_reason = "runaway_bullet"
+        elif (
+            len(self.bullets) == self.max_bullets - 1
+            and len(words) >= self.max_words
+            and open_text.endswith(_SENTENCE_END)
+        ):
+            # Last bullet already at full length and sentence-final
+            completed += self._close(len(self.text))
+            self._open_start = None
+            self.stop_reason = "enough_bullets"
+
+    def update(self, full_text: str) -> List[str]:
+        """Feed the whole decoded output so far; re-parses if the prefix changed."""
+        if full_text.startswith(self.text):
+            return self.feed(full_text[len(self.text):])
+        self.reset()
+        return self.feed(full_text)
+
+    def finish(self) -> List[str]:
+        """Close the open bullet at end of output and return the final plan."""
+        if self._open_start is not None and len(self.bullets) < self.max_bullets:
+            self._close(len(self.text))
+            self._open_start = None
+        if not self.bullets:
+            # Fallback if the model returned a paragraph
+            prose = self.text.strip()[: self.prose_limit]
+            return [prose] if prose else []
+        return self.bullets[: self.max_bullets]
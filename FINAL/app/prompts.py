@@ -0,0 +1,199 @@
+"""Prompt templates compiled to token ids.
+
+A template is a format string with ``{name}`` slots. ``compile`` tokenizes
+the fixed instruction text once; ``encode`` tokenizes only the slot values
+and splices their ids between the precomputed segments, so per-call
+tokenization cost follows the user message, not the prompt. Each slot can
+carry a token budget (the one place user input is capped), and small
+closed-vocabulary slots such as the emotion label are memoized. A slot
+value may also be a list of token ids that were tokenized earlier (the
+conversation history, see app/context.py); it is spliced as is, within
+its budget. A template with ``max_tokens`` gives its ``fill`` slot
+whatever the fixed text and the other budgets leave, computed once the
+fixed text is tokenized, so editing the instructions can't push a prompt
+past the model's input limit.
+
+Splicing matches tokenizing the rendered string as long as every slot sits
+on a word boundary (whitespace before and after), which SentencePiece
+tokenizers like T5's respect. Fixed text is tokenized without its trailing
+whitespace: on its own, "message: " can end in a bare "▁" piece that the
+full string never has. ``python -m app.prompts check`` and
+``tests/test_prompts.py`` verify this for the bundled templates.
+"""
+from __future__ import annotations
+
+import argparse
+import string
+import sys
+import typing as t
+from dataclasses import dataclass, field
+
+REPLY_PROMPT = (
+    "You are a compassionate, non-judgmental mental health support bot. "
+    "Goals: reflect feelings, validate, normalize, and offer gentle hope. "
+    "Avoid medical claims or diagnosis. Keep tone warm, brief, and culturally sensitive.\n\n"
+    "User message (may be multilingual): {user_text}\n"
+    "Detected emotion: {emotion}\n\n"
+    "Write a supportive, empathetic response in the same language as the user. "
+    "Use simple language and 2-4 sentences."
+)
+REPLY_CONTEXT_PROMPT = (
+    "You are a compassionate, non-judgmental mental health support bot. "
+    "Goals: reflect feelings, validate, normalize, and offer gentle hope. "
+    "Avoid medical claims or diagnosis. Keep tone warm, brief, and culturally sensitive.\n\n"
+    "Conversation so far (oldest first): {history}\n\n"
+    "User message (may be multilingual): {user_text}\n"
+    "Detected emotion: {emotion}\n\n"
+    "Write a supportive, empathetic response to the latest message, in the same language as the user. "
+    "Refer back to earlier turns only where it helps. Use simple language and 2-4 sentences."
+)
+PLAN_PROMPT = (
+    "You are a supportive assistant. Create a brief, safe, actionable plan with 3-5 bullet points "
+    "to help the user cope right now. Include self-care, grounding, and optional social/pro help. "
+    "Avoid medical advice, diagnosis, or unsafe instructions. Keep steps simple and feasible.\n\n"
+    "User message: {user_text}\n\n"
+    "Return only bullet points starting with '- '. Keep each under 18 words."
+)
+
+# Token budgets per slot; FLAN-T5 was trained on 512-token inputs
+MAX_INPUT_TOKENS = 512
+USER_TEXT_BUDGET = 384
+EMOTION_BUDGET = 8  # a label or two ("negative", "sadness")
+# With history: the history slot gets what the fixed text and user text leave
+CONTEXT_USER_TEXT_BUDGET = 256
+
+
+@dataclass
+class PromptTemplate:
+    text: str
+    budgets: t.Dict[str, int] = field(default_factory=dict)
+    memoize: t.Tuple[str, ...] = ()  # slots with a small set of values
+    max_tokens: t.Optional[int] = None  # whole prompt, special tokens included
+    fill: t.Optional[str] = None  # slot budgeted at compile time to fill max_tokens
+    segments: t.List[t.Union[t.List[int], str]] = field(default_factory=list, init=False)
+    eos: t.List[int] = field(default_factory=list, init=False)
+    truncated: int = field(default=0, init=False)
+
+    def compile(self, tok) -> "PromptTemplate":
+        self._tok = tok
+        self._memo: t.Dict[t.Tuple[str, str], t.List[int]] = {}
+        self.segments = []
+        for literal, slot, _spec, _conv in string.Formatter().parse(self.text):
+            if literal.rstrip():
+                self.segments.append(self._ids(literal.rstrip()))
+            if slot is not None:
+                self.segments.append(slot)
+        # Special tokens the tokenizer appends to a full encode (T5: </s>)
+        self.eos = tok("", add_special_tokens=True)["input_ids"]
+        if self.fill is not None:
+            others = sum(b for name, b in self.budgets.items() if name != self.fill)
+            budget = self.max_tokens - self.static_tokens - others
+            if budget <= 0:
+                raise ValueError(f"no room for {{{self.fill}}}: {self.static_tokens} static tokens "
+                                 f"+ {others} budgeted >= {self.max_tokens}")
+            self.budgets = {**self.budgets, self.fill: budget}
+        return self
+
+    @property
+    def slots(self) -> t.List[str]:
+        return [s for s in self.segments if isinstance(s, str)]
+
+    @property
+    def static_tokens(self) -> int:
+        return sum(len(s) for s in self.segments if not isinstance(s, str)) + len(self.eos)
+
+    def _ids(self, text: str) -> t.List[int]:
+        return self._tok(text, add_special_tokens=False)["input_ids"]
+
+    def _capped(self, name: str, ids: t.List[int]) -> t.List[int]:
+        budget = self.budgets.get(name)
+        if budget is not None and len(ids) > budget:
+            self.truncated += 1
+            ids = ids[:budget]
+        return ids
+
+    def _slot_ids(self, name: str, value: str) -> t.List[int]:
+        if name in self.memoize:
+            key = (name, value)
+            ids = self._memo.get(key)
+            if ids is None:
+                ids = self._memo[key] = self._capped(name, self._ids(value))
+            return ids
+        return self._capped(name, self._ids(value))
+
+    def encode_ids(self, **values: t.Union[str, t.List[int]]) -> t.List[int]:
+        ids: t.List[int] = []
+        for seg in self.segments:
+            if not isinstance(seg, str):
+                ids.extend(seg)
+            elif isinstance(values[seg], list):  # already tokenized by the caller
+                ids.extend(self._capped(seg, values[seg]))
+            else:
+                ids.extend(self._slot_ids(seg, str(values[seg])))
+        return ids + self.eos
+
+    def encode(self, **values: t.Union[str, t.List[int]]) -> t.Dict[str, t.Any]:
+        """``input_ids``/``attention_mask`` tensors for ``generate``, batch of one."""
+        import torch
+
+        ids = torch.tensor([self.encode_ids(**values)], dtype=torch.long)
+        return {"input_ids": ids, "attention_mask": torch.ones_like(ids)}
+
+    def render(self, **values: str) -> str:
+        return self.text.format(**values)
+
+
+def compile_templates(tok) -> t.Dict[str, PromptTemplate]:
+    return {
+        "reply": PromptTemplate(
+            REPLY_PROMPT, budgets={"user_text": USER_TEXT_BUDGET, "emotion": EMOTION_BUDGET}, memoize=("emotion",)
+        ).compile(tok),
+        "reply_context": PromptTemplate(
+            REPLY_CONTEXT_PROMPT,
+            budgets={"user_text": CONTEXT_USER_TEXT_BUDGET, "emotion": EMOTION_BUDGET},
+            memoize=("emotion",),
+            max_tokens=MAX_INPUT_TOKENS,
+            fill="history",
+        ).compile(tok),
+        "plan": PromptTemplate(PLAN_PROMPT, budgets={"user_text": USER_TEXT_BUDGET}).compile(tok),
+    }
+
+
+SAMPLES = [
+    {"user_text": "I feel so alone lately and nothing helps.", "emotion": "negative",
+     "history": "User: I moved to a new city last month. Companion: That is a big change, how is it going?"},
+    {"user_text": "Me siento muy cansado, no puedo dormir bien.", "emotion": "negative"},
+    {"user_text": "मुझे परीक्षा की बहुत चिंता है", "emotion": "neutral"},
+    {"user_text": "Work was okay today, I guess!", "emotion": "positive"},
+]
+
+
+def main(argv: t.Optional[t.List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Check spliced prompt ids against full tokenization")
+    parser.add_argument("command", choices=["check"])
+    parser.add_argument("--model", default=None, help="tokenizer to check (default: the generator's)")
+    args = parser.parse_args(argv)
+
+    from transformers import AutoTokenizer
+
+    from app.nlp import GENERATOR_MODEL
+
+    tok = AutoTokenizer.from_pretrained(args.model or GENERATOR_MODEL)
+    mismatches = 0
+    for name, template in compile_templates(tok).items():
+        print(f"{name}: {template.static_tokens} static tokens, slots {template.slots}, budgets {template.budgets}")
+        for values in SAMPLES:
+            values = {k: v for k, v in values.items() if k in template.slots}
+            if set(values) != set(template.slots):
+                continue
+            spliced = template.encode_ids(**values)
+            full = tok(template.render(**values))["input_ids"]
+            if spliced != full:
+                mismatches += 1
+                print(f"  MISMATCH {values}: spliced {len(spliced)} ids vs full {len(full)}")
+    print("ok" if not mismatches else f"{mismatches} mismatches")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""Opt-in int8 dynamic quantization of the CPU models, gated per role by an fp32 agreement check.
+
+    python -m app.quantize check                  # writes quantize_report.json
+    CHATBOT_QUANTIZE=1 streamlit run streamlit_app.py
+    CHATBOT_QUANTIZE=sentiment,nli ...            # only these roles (still gated)
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import typing as t
+
+import torch
+
+from app.runtime import MODEL_ROLES
+
+QUANTIZE_ENV = "CHATBOT_QUANTIZE"
+REPORT_ENV = "CHATBOT_QUANTIZE_REPORT"
+DEFAULT_REPORT_PATH = "quantize_report.json"
+DEFAULT_SAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "sentiment_sample.jsonl")
+# Minimum agreement with fp32: labels for the classifiers, next tokens for the generator
+THRESHOLDS = {"sentiment": 0.95, "nli": 0.90, "generator": 0.90}
+GEN_TOKENS = 48
+
+
+def quantize_module(model: torch.nn.Module, inplace: bool = False) -> torch.nn.Module:
+    """Int8 copy of ``model``; ``inplace`` swaps its layers instead, so fp32 and int8 never coexist."""
+    return torch.ao.quantization.quantize_dynamic(model.eval(), {torch.nn.Linear}, dtype=torch.qint8,
+                                                  inplace=inplace)
+
+
+def model_nbytes(model: torch.nn.Module) -> int:
+    """Serialized state dict size, packed int8 weights included."""
+    buf = io.BytesIO()
+    torch.save(model.state_dict(), buf)
+    return buf.tell()
+
+
+def checkpoints() -> t.Dict[str, str]:
+    from app.nlp import GENERATOR_MODEL, NLI_MODEL, SENTIMENT_MODEL
+
+    return {"sentiment": SENTIMENT_MODEL, "nli": NLI_MODEL, "generator": GENERATOR_MODEL}
+
+
+def get_module(models, role: str) -> torch.nn.Module:
+    return {"sentiment": lambda: models.sentiment.model, "nli": lambda: models.nli.model,
+            "generator": lambda: models.gen_model}[role]()
+
+
+def set_module(models, role: str, module: torch.nn.Module) -> None:
+    if role == "sentiment":
+        models.sentiment.model = module
+    elif role == "nli":
+        models.nli.model = module
+    else:
+        models.gen_model = module
+
+
+def load_report(path: t.Optional[str] = None) -> t.Optional[t.Dict]:
+    path = path or os.environ.get(REPORT_ENV) or DEFAULT_REPORT_PATH
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def requested_roles(value: t.Optional[str] = None) -> t.List[str]:
+    """Roles named by ``$CHATBOT_QUANTIZE``: "1"/"int8" means all of them."""
+    value = (os.environ.get(QUANTIZE_ENV, "") if value is None else value).strip().lower()
+    if value in ("", "0", "false", "off"):
+        return []
+    if value in ("1", "true", "on", "int8"):
+        return list(MODEL_ROLES)
+    return [role for role in (part.strip() for part in value.split(",")) if role in MODEL_ROLES]
+
+
+def apply(models, roles: t.Optional[t.List[str]] = None, report: t.Optional[t.Dict] = None) -> t.List[str]:
+    """Quantize the requested roles that passed the check; returns the ones quantized."""
+    roles = requested_roles() if roles is None else roles
+    if not roles:
+        return []
+    report = load_report() if report is None else report
+    if report is None:
+        print("quantize: no report; run `python -m app.quantize check` first. Keeping fp32.", file=sys.stderr)
+        return []
+    names = checkpoints()
+    done = []
+    for role in roles:
+        result = report.get("roles", {}).get(role)
+        if result is None or result.get("model") != names[role]:
+            print(f"quantize: {role} not checked for {names[role]}; keeping fp32", file=sys.stderr)
+        elif not result.get("passed"):
+            print(f"quantize: {role} agreement {result['agreement']:.3f} below "
+                  f"{result['threshold']}; keeping fp32", file=sys.stderr)
+        else:
+            # Serving never needs the fp32 weights again; don't hold a second copy at load time
+            set_module(models, role, quantize_module(get_module(models, role), inplace=True))
+            done.append(role)
+    return done
+
+
+# ---------------------------------------------------------------------------
+# Check
+
+
+def load_samples(path: str, limit: int = 0) -> t.List[str]:
+    with open(path, "r", encoding="utf-8") as fh:
+        texts = [json.loads(line)["text"] for line in fh if line.strip()]
+    return texts[:limit] if limit else texts
+
+
+def _timed(fn: t.Callable[[], t.Any]) -> t.Tuple[t.Any, float]:
+    started = time.perf_counter()
+    value = fn()
+    return value, 1000 * (time.perf_counter() - started)
+
+
+def _reply_inputs(models, text: str) -> t.Dict[str, torch.Tensor]:
+    return models.prompts["reply"].encode(user_text=text, emotion="neutral")
+
+
+def run_role(models, role: str, texts: t.List[str], references: t.Optional[t.List] = None) -> t.Tuple[t.List, t.List[float], float]:
+    """(outputs, per-sample ms, agreement with ``references``; 1.0 without them)."""
+    outputs, times = [], []
+    matched = total = 0
+    with torch.no_grad():
+        for i, text in enumerate(texts):
+            if role == "generator":
+                inputs = _reply_inputs(models, text)
+                with models.profile.run("generator"):
+                    ids, ms = _timed(lambda: models.gen_model.generate(**inputs, max_new_tokens=GEN_TOKENS))
+                out = ids[:, 1:]  # drop the decoder start token
+                if references is not None:
+                    # Teacher-forced on the fp32 reply: does int8 predict the same next tokens?
+                    labels = references[i]
+                    logits = models.gen_model(**inputs, labels=labels).logits
+                    matched += int((logits.argmax(-1) == labels).sum())
+                    total += labels.shape[1]
+            else:
+                if role == "sentiment":
+                    with models.profile.run("sentiment"):
+                        out, ms = _timed(lambda: models.sentiment(text)[0]["label"])
+                else:
+                    out, ms = _timed(lambda: models.emotion_scores(text).top)
+                if references is not None:
+                    matched += int(out == references[i])
+                    total += 1
+            outputs.append(out)
+            times.append(ms)
+    return outputs, times, (matched / total if total else 1.0)
+
+
+def check(samples: str = DEFAULT_SAMPLES, limit: int = 0, roles: t.Sequence[str] = MODEL_ROLES,
+          min_agreement: t.Optional[float] = None) -> t.Dict:
+    from app.nlp import NLPModels
+
+    texts = load_samples(samples, limit)
+    models = NLPModels(quantize=False)
+    names = checkpoints()
+    report: t.Dict[str, t.Any] = {"samples": samples, "count": len(texts), "roles": {}}
+    for role in roles:
+        fp32 = get_module(models, role)
+        references, fp32_ms, _ = run_role(models, role, texts)
+        int8 = quantize_module(fp32)  # a copy: fp32 is the reference for the next roles
+        set_module(models, role, int8)
+        _, int8_ms, agreement = run_role(models, role, texts, references)
+        set_module(models, role, fp32)  # later roles are measured against fp32 neighbours
+        threshold = THRESHOLDS[role] if min_agreement is None else min_agreement
+        fp32_mb, int8_mb = model_nbytes(fp32) / 2**20, model_nbytes(int8) / 2**20
+        report["roles"][role] = {
+            "model": names[role],
+            "agreement": round(agreement, 4),
+            "threshold": threshold,
+            "passed": agreement >= threshold,
+            "fp32_mb": round(fp32_mb, 1),
+            "int8_mb": round(int8_mb, 1),
+            "fp32_ms_p50": round(statistics.median(fp32_ms), 1),
+            "int8_ms_p50": round(statistics.median(int8_ms), 1),
+        }
+        del int8
+    return report
+
+
+def main(argv: t.Optional[t.List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Int8 dynamic quantization: accuracy gate and deltas")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    run = sub.add_parser("check", help="compare fp32 and int8 on the bundled set and write the report")
+    run.add_argument("--samples", default=DEFAULT_SAMPLES, help="JSONL with a 'text' field")
+    run.add_argument("--limit", type=int, default=0, help="first N samples only")
+    run.add_argument("--role", action="append", choices=MODEL_ROLES, help="repeatable; default all")
+    run.add_argument("--min-agreement", type=float, default=None, help="override the per-role thresholds")
+    run.add_argument("--out", default=os.environ.get(REPORT_ENV) or DEFAULT_REPORT_PATH)
+    show = sub.add_parser("show", help="print the saved report")
+    show.add_argument("--report", default=None)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "show":
+        report = load_report(args.report)
+        if report is None:
+            sys.exit("no report; run `python -m app.quantize check`")
+    else:
+        report = check(args.samples, args.limit, args.role or MODEL_ROLES, args.min_agreement)
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+    print(f"{report['count']} samples from {report['samples']}")
+    for role, row in report["roles"].items():
+        verdict = "PASS" if row["passed"] else "FAIL"
+        print(f"{role:<10} {verdict} agreement {row['agreement']:.3f} (>= {row['threshold']})  "
+              f"size {row['fp32_mb']:.0f} -> {row['int8_mb']:.0f} MB  "
+              f"p50 {row['fp32_ms_p50']:.0f} -> {row['int8_ms_p50']:.0f} ms")
+    if args.cmd == "check":
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Client for the pre-fork model server (app/serve.py).
+
+``RemoteModels`` exposes the parts of ``NLPModels`` the UI uses, so setting
+``CHATBOT_MODEL_SERVER=http://127.0.0.1:8600`` makes Streamlit a thin front
+end while the server's workers share one copy of the weights.
+"""
+from __future__ import annotations
+
+import json
+import os
+import typing as t
+import urllib.error
+import urllib.request
+
+SERVER_ENV = "CHATBOT_MODEL_SERVER"
+
+
+class RemoteModels:
+    def __init__(self, base_url: str, timeout: float = 120.0) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, path: str, payload: t.Optional[t.Dict] = None):
+        data = None if payload is None else json.dumps(payload).encode("utf-8")
+        req = urllib.request.Request(self.base_url + path, data=data,
+                                     headers={"Content-Type": "application/json"})
+        try:
+            return urllib.request.urlopen(req, timeout=self.timeout)
+        except urllib.error.HTTPError as exc:
+            detail = exc.read().decode("utf-8", "replace")
+            raise RuntimeError(f"model server {path} failed ({exc.code}): {detail}") from exc
+
+    def _call(self, path: str, payload: t.Optional[t.Dict] = None) -> t.Dict:
+        with self._request(path, payload) as resp:
+            return json.load(resp)
+
+    def detect_sentiment(self, text: str) -> str:
+        return self._call("/v1/sentiment", {"text": text})["label"]
+
+    def generate_empathetic_reply(self, user_text: str, emotion_hint: t.Optional[str] = None,
+                                  crisis: bool = False) -> str:
+        payload = {"text": user_text, "emotion": emotion_hint, "crisis": crisis}
+        return self._call("/v1/reply", payload)["reply"]
+
+    def generate_support_plan(self, user_text: str, emotion_hint: t.Optional[str] = None,
+                              crisis: bool = False) -> t.List[str]:
+        return self._call("/v1/plan", {"text": user_text, "emotion": emotion_hint, "crisis": crisis})["plan"]
+
+    def stream_support_plan(self, user_text: str, emotion_hint: t.Optional[str] = None,
+                            crisis: bool = False) -> t.Iterator[str]:
+        payload = {"text": user_text, "emotion": emotion_hint, "crisis": crisis}
+        with self._request("/v1/plan/stream", payload) as resp:
+            for line in resp:
+                if line.strip():
+                    item = json.loads(line)
+                    if "error" in item:
+                        raise RuntimeError(f"model server /v1/plan/stream failed: {item['error']}")
+                    yield item["bullet"]
+
+    def nli_emotion(self, premise: str) -> str:
+        return self._call("/v1/nli", {"text": premise})["label"]
+
+    def stats(self) -> t.Dict:
+        """Cache stats of whichever worker answered, plus the server's memory report."""
+        return {**self._call("/v1/stats"), "memory": self._call("/v1/memory")}
+
+
+def from_env() -> t.Optional[RemoteModels]:
+    url = os.environ.get(SERVER_ENV)
+    return RemoteModels(url) if url else None
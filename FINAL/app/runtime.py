@@ -0,0 +1,300 @@
+"""CPU execution profiles for model inference.
+
+A profile says how many intra-op threads the models may use, how many
+forward passes of each role (sentiment, nli, generator) may run at once,
+and optionally which cores to run on. Without it every concurrent request
+asks PyTorch for all cores and they oversubscribe.
+
+Thread counts and core pinning are per process, not per role: PyTorch has
+one intra-op pool per process, and ``sched_setaffinity`` only pins the
+calling thread (and threads it starts later), not OpenMP workers that
+already exist. ``apply_global`` therefore sets both once, at startup, from
+the largest per-role ``intra_op`` and the union of the roles' ``cores``;
+``run`` only enforces the per-role concurrency limit. To give each role
+its own cores, run it in its own process (``app/serve.py``) or start the
+process under ``taskset``.
+
+Profiles are JSON files. ``python -m app.runtime autotune`` benchmarks
+candidate settings on the current machine and writes the best one. It
+tunes intra-op threads and concurrency only: the inter-op pool can be
+sized once per process, so every candidate runs with ``inter_op=1``.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field, replace
+from typing import Callable, Dict, Iterator, List, Optional
+
+try:
+    import torch
+except Exception:
+    torch = None
+
+PROFILE_ENV = "CHATBOT_EXEC_PROFILE"
+DEFAULT_PROFILE_PATH = "exec_profile.json"
+MODEL_ROLES = ("sentiment", "nli", "generator")
+CLASSIFIER_ROLES = ("sentiment", "nli")
+
+
+@dataclass
+class ModelThreads:
+    intra_op: int = 0  # 0 keeps the PyTorch default; process-wide, the largest role wins
+    inter_op: int = 0
+    concurrency: int = 0  # max simultaneous forward passes, 0 = unlimited
+    cores: List[int] = field(default_factory=list)  # empty = no pinning; process-wide union
+
+
+@dataclass
+class ExecutionProfile:
+    models: Dict[str, ModelThreads] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        for role in MODEL_ROLES:
+            self.models.setdefault(role, ModelThreads())
+        self._gates: Dict[str, threading.BoundedSemaphore] = {
+            role: threading.BoundedSemaphore(cfg.concurrency)
+            for role, cfg in self.models.items()
+            if cfg.concurrency > 0
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ExecutionProfile":
+        models = {role: ModelThreads(**cfg) for role, cfg in data.get("models", {}).items()}
+        return cls(models=models)
+
+    def to_dict(self) -> dict:
+        return {"models": {role: asdict(cfg) for role, cfg in self.models.items()}}
+
+    def for_worker(self, threads: int) -> "ExecutionProfile":
+        """This profile for one of several worker processes on the node.
+
+        Each role gets at most ``threads`` intra-op threads and no pinning:
+        the workers would otherwise all pin, and oversubscribe, the same cores.
+        """
+        return ExecutionProfile(models={
+            role: replace(cfg, intra_op=min(cfg.intra_op or threads, threads), cores=[])
+            for role, cfg in self.models.items()
+        })
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(self.to_dict(), fh, indent=2)
+
+    def apply_global(self, interop: bool = True) -> None:
+        """Set the process-wide thread pools and pinning; call once before any inference.
+
+        PyTorch has a single intra-op and a single inter-op pool per process,
+        so the largest per-role value wins. Cores are the union of the roles'
+        and pin the calling thread, which should be the one that loads and
+        first runs the models so the OpenMP pool inherits them. The inter-op
+        pool can only be sized before its first use; ``interop=False`` leaves
+        it alone (autotune re-applies intra-op settings per candidate).
+        """
+        if torch is not None:
+            intra_op = max(cfg.intra_op for cfg in self.models.values())
+            if intra_op > 0:
+                torch.set_num_threads(intra_op)
+            inter_op = max(cfg.inter_op for cfg in self.models.values())
+            if interop and inter_op > 0 and torch.get_num_interop_threads() != inter_op:
+                try:
+                    torch.set_num_interop_threads(inter_op)
+                except RuntimeError:
+                    # Already fixed by earlier parallel work in this process
+                    print(f"runtime: inter_op={inter_op} ignored, the pool already has "
+                          f"{torch.get_num_interop_threads()} threads", file=sys.stderr)
+        cores = sorted({core for cfg in self.models.values() for core in cfg.cores})
+        if cores and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cores)
+
+    @contextmanager
+    def run(self, role: str) -> Iterator[None]:
+        """Run one forward pass of ``role`` within its concurrency limit."""
+        gate = self._gates.get(role)
+        if gate is not None:
+            gate.acquire()
+        try:
+            yield
+        finally:
+            if gate is not None:
+                gate.release()
+
+
+def available_cores() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def partition_cores(cores: List[int], classifier_share: float = 0.25) -> Dict[str, List[int]]:
+    """Split cores between the classifiers and the generator.
+
+    The classifiers (sentiment, nli) share the first slice; the generator,
+    which dominates latency, gets the rest.
+    """
+    if len(cores) < 2:
+        return {role: list(cores) for role in MODEL_ROLES}
+    n_cls = min(len(cores) - 1, max(1, round(len(cores) * classifier_share)))
+    parts = {role: cores[:n_cls] for role in CLASSIFIER_ROLES}
+    parts["generator"] = cores[n_cls:]
+    return parts
+
+
+def default_profile(pin_cores: bool = False, classifier_share: float = 0.25) -> ExecutionProfile:
+    """A conservative profile: one pass per role at a time, threads sized to the role's share.
+
+    The process runs with the largest share's thread count (see the module
+    docstring); the per-role numbers matter when roles run in separate processes.
+    """
+    cores = available_cores()
+    parts = partition_cores(cores, classifier_share)
+    models = {}
+    for role in MODEL_ROLES:
+        owned = parts[role]
+        models[role] = ModelThreads(
+            intra_op=len(owned),
+            inter_op=1,
+            concurrency=1,
+            cores=list(owned) if pin_cores else [],
+        )
+    return ExecutionProfile(models=models)
+
+
+def load_profile(path: Optional[str] = None) -> ExecutionProfile:
+    """Load the profile from ``path``, ``$CHATBOT_EXEC_PROFILE`` or the default file.
+
+    Falls back to PyTorch defaults when no profile file exists.
+    """
+    path = path or os.environ.get(PROFILE_ENV) or DEFAULT_PROFILE_PATH
+    if not os.path.exists(path):
+        return ExecutionProfile()
+    with open(path, "r", encoding="utf-8") as fh:
+        return ExecutionProfile.from_dict(json.load(fh))
+
+
+# ---------------------------------------------------------------------------
+# Autotune
+
+SAMPLE_TEXTS = [
+    "I feel so anxious about my exams tomorrow.",
+    "Today was actually a really good day with my friends.",
+    "I can't sleep and everything feels overwhelming lately.",
+    "Me siento muy solo desde que me mudé.",
+]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _bench(call: Callable[[str], object], profile: ExecutionProfile, role: str,
+           clients: int, rounds: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def client(idx: int) -> None:
+        for i in range(rounds):
+            text = SAMPLE_TEXTS[(idx + i) % len(SAMPLE_TEXTS)]
+            start = time.perf_counter()
+            with profile.run(role):
+                call(text)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    wall = time.perf_counter() - start
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "throughput": len(latencies) / wall,
+    }
+
+
+def _candidates(n_cores: int) -> List[ModelThreads]:
+    out = []
+    intra = 1
+    while intra <= n_cores:
+        concurrency = 1
+        while intra * concurrency <= n_cores:
+            out.append(ModelThreads(intra_op=intra, inter_op=1, concurrency=concurrency))
+            concurrency *= 2
+        intra *= 2
+    return out
+
+
+def autotune(clients: int = 4, rounds: int = 3, pin_cores: bool = False,
+             classifier_share: float = 0.25, log: Callable[[str], None] = print) -> ExecutionProfile:
+    """Benchmark intra-op thread/concurrency candidates per role and keep the lowest p99.
+
+    The inter-op pool is sized once, to 1, before the models load; candidates
+    can't vary it within one process, so they don't.
+    """
+    from app.nlp import NLPModels
+
+    base = default_profile(pin_cores=pin_cores, classifier_share=classifier_share)
+    fixed = ExecutionProfile(models={role: ModelThreads(inter_op=1) for role in MODEL_ROLES})
+    log("autotune: inter_op fixed at 1 for every candidate; tuning intra_op and concurrency")
+    models = NLPModels(profile=fixed)  # applies it before any inference
+    calls = {
+        "sentiment": lambda text: models.sentiment(text),
+        "nli": lambda text: models.nli(text),
+        "generator": lambda text: models.gen_model.generate(
+            **models.tok(text, return_tensors="pt"), max_new_tokens=32
+        ),
+    }
+    best: Dict[str, ModelThreads] = {}
+    for role in MODEL_ROLES:
+        owned = base.models[role].cores or partition_cores(available_cores(), classifier_share)[role]
+        best_score = None
+        for cand in _candidates(len(owned)):
+            cand.cores = list(base.models[role].cores)
+            trial = ExecutionProfile(models={role: cand})
+            trial.apply_global(interop=False)  # one role at a time, so its budget is the process's
+            stats = _bench(calls[role], trial, role, clients, rounds)
+            log(f"{role:<9} intra={cand.intra_op:<2} concurrency={cand.concurrency:<2} "
+                f"p50={stats['p50_ms']:.0f}ms p99={stats['p99_ms']:.0f}ms "
+                f"throughput={stats['throughput']:.2f}/s")
+            if best_score is None or stats["p99_ms"] < best_score:
+                best_score = stats["p99_ms"]
+                best[role] = cand
+    return ExecutionProfile(models=best)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Inference thread profile tools")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    tune = sub.add_parser("autotune", help="benchmark settings and write the best profile")
+    tune.add_argument("--out", default=DEFAULT_PROFILE_PATH)
+    tune.add_argument("--clients", type=int, default=4, help="simulated concurrent requests")
+    tune.add_argument("--rounds", type=int, default=3, help="calls per client per candidate")
+    tune.add_argument("--pin-cores", action="store_true", help="partition cores between roles")
+    tune.add_argument("--classifier-share", type=float, default=0.25)
+    show = sub.add_parser("default", help="write a static partitioned profile without benchmarking")
+    show.add_argument("--out", default=DEFAULT_PROFILE_PATH)
+    show.add_argument("--pin-cores", action="store_true")
+    show.add_argument("--classifier-share", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "autotune":
+        profile = autotune(args.clients, args.rounds, args.pin_cores, args.classifier_share)
+    else:
+        profile = default_profile(args.pin_cores, args.classifier_share)
+    profile.save(args.out)
+    print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""Pre-fork model server: weights loaded once in shared memory, one worker per core group.
+
+    python -m app.serve --workers 4 --port 8600
+    python -m app.serve memory --url http://127.0.0.1:8600   # RSS/PSS per process
+    CHATBOT_MODEL_SERVER=http://127.0.0.1:8600 streamlit run streamlit_app.py
+
+Linux/macOS only (needs ``os.fork``); the memory report needs Linux.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import signal
+import socket
+import sys
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+DEFAULT_PORT = 8600
+SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+# ---------------------------------------------------------------------------
+# Memory accounting
+
+
+def smaps_rollup(pid) -> Dict[str, int]:
+    """Selected /proc/<pid>/smaps_rollup fields in kB (Linux >= 4.14)."""
+    values: Dict[str, int] = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as fh:
+        for line in fh:
+            key, _, rest = line.partition(":")
+            if key in SMAPS_FIELDS:
+                values[key] = int(rest.split()[0])
+    return values
+
+
+def _children(pid: int) -> List[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children", "r") as fh:
+            return [int(p) for p in fh.read().split()]
+    except OSError:
+        return []
+
+
+def memory_report(parent_pid: int) -> Dict:
+    """RSS vs PSS for the parent and its workers.
+
+    Shared pages are counted in full in every RSS but split in PSS, so when
+    the weights are shared the PSS total stays close to one process's RSS.
+    """
+    rows = []
+    for role, pid in [("parent", parent_pid)] + [("worker", p) for p in _children(parent_pid)]:
+        try:
+            rows.append({"pid": pid, "role": role, **{k: v // 1024 for k, v in smaps_rollup(pid).items()}})
+        except OSError:
+            continue
+    totals = {f"{k}_total": sum(r.get(k, 0) for r in rows) for k in ("Rss", "Pss")}
+    return {"unit": "MiB", "processes": rows, **totals}
+
+
+# ---------------------------------------------------------------------------
+# Loading and freezing
+
+
+def _modules(models) -> List:
+    return [models.sentiment.model, models.gen_model, models.nli.model]
+
+
+def freeze_for_fork(models) -> None:
+    """Make the loaded weights read-only and shared before forking."""
+    import torch
+
+    with torch.no_grad():
+        for module in _modules(models):
+            module.eval()
+            module.requires_grad_(False)
+            if not getattr(models, "mmap_weights", False):
+                # Weights mapped from the model cache are already shared page cache
+                module.share_memory()
+    gc.collect()
+    gc.freeze()  # keep inherited objects out of the collector's reach
+
+
+# ---------------------------------------------------------------------------
+# HTTP API
+
+
+class _Handler(BaseHTTPRequestHandler):
+    models = None  # set per worker
+    parent_pid = 0
+    protocol_version = "HTTP/1.0"  # close-delimited, so /v1/plan/stream can stream lines
+
+    def log_message(self, fmt: str, *args) -> None:
+        pass
+
+    def _send_json(self, status: int, payload) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        data = json.loads(self.rfile.read(length) or b"{}")
+        if not isinstance(data, dict) or not isinstance(data.get("text", ""), str):
+            raise ValueError("expected a JSON object with a 'text' string")
+        return data
+
+    def _write_line(self, payload) -> None:
+        self.wfile.write((json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+    def _stream_plan(self, text: str, emotion: Optional[str], crisis: bool) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        try:
+            for bullet in self.models.stream_support_plan(text, emotion_hint=emotion, crisis=crisis):
+                self._write_line({"bullet": bullet})
+        except (BrokenPipeError, ConnectionResetError):
+            raise
+        except Exception as exc:
+            # Status line is already out: report in-band and end the body
+            self._write_line({"error": f"{type(exc).__name__}: {exc}"})
+            self.close_connection = True
+
+    def do_GET(self) -> None:
+        if self.path == "/healthz":
+            self._send_json(200, {"ok": True, "pid": os.getpid()})
+        elif self.path == "/v1/memory":
+            self._send_json(200, memory_report(self.parent_pid))
+        elif self.path == "/v1/stats":
+            self._send_json(200, {"pid": os.getpid(), "cache": self.models.cache.stats()})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        try:
+            data = self._read_json()
+        except ValueError as exc:
+            self._send_json(400, {"error": str(exc)})
+            return
+        text = data.get("text", "")
+        # The caller's crisis decision: such turns never read or fill the cache
+        emotion, crisis = data.get("emotion"), bool(data.get("crisis"))
+        try:
+            if self.path == "/v1/sentiment":
+                self._send_json(200, {"label": self.models.detect_sentiment(text)})
+            elif self.path == "/v1/reply":
+                reply = self.models.generate_empathetic_reply(text, emotion_hint=emotion, crisis=crisis)
+                self._send_json(200, {"reply": reply})
+            elif self.path == "/v1/plan":
+                plan = self.models.generate_support_plan(text, emotion_hint=emotion, crisis=crisis)
+                self._send_json(200, {"plan": plan})
+            elif self.path == "/v1/plan/stream":
+                self._stream_plan(text, emotion, crisis)
+            elif self.path == "/v1/nli":
+                scores = self.models.emotion_scores(text)
+                self._send_json(200, {"label": scores.top, "scores": scores.as_dict()})
+            else:
+                self._send_json(404, {"error": "not found"})
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as exc:
+            self._send_json(500, {"error": f"{type(exc).__name__}: {exc}"})
+
+
+def _worker_main(sock: socket.socket, models, profile, threads: int, parent_pid: int) -> None:
+    # The node-wide exec profile would give every worker all the cores, and pin them all alike
+    models.profile = profile.for_worker(threads)
+    models.profile.apply_global()
+    signal.signal(signal.SIGTERM, lambda *_: os._exit(0))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the parent handles Ctrl-C
+    _Handler.models = models
+    _Handler.parent_pid = parent_pid
+    server = ThreadingHTTPServer(sock.getsockname(), _Handler, bind_and_activate=False)
+    server.socket = sock  # inherited listening socket; the kernel spreads accepts
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+# ---------------------------------------------------------------------------
+# Supervisor
+
+
+class PreforkServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT, workers: int = 0,
+                 threads_per_worker: int = 0) -> None:
+        cores = os.cpu_count() or 1
+        self.workers = workers or max(1, cores // 2)
+        self.threads = threads_per_worker or max(1, cores // self.workers)
+        self.sock = socket.create_server((host, port), backlog=128)
+        self.children: Dict[int, int] = {}  # pid -> slot
+        self.stopping = False
+
+    def _spawn(self, slot: int, models, profile) -> None:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _worker_main(self.sock, models, profile, self.threads, os.getppid())
+            finally:
+                os._exit(1)
+        self.children[pid] = slot
+
+    def _stop(self, *_args) -> None:
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _log_memory(self, *_args) -> None:
+        try:
+            print(json.dumps(memory_report(os.getpid()), indent=2), file=sys.stderr, flush=True)
+        except OSError as exc:
+            print(f"memory report unavailable: {exc}", file=sys.stderr, flush=True)
+
+    def run(self) -> None:
+        if not hasattr(os, "fork"):
+            raise SystemExit("app.serve needs os.fork (Linux/macOS)")
+        # No intra-op pool or tokenizer threads in the parent: they don't survive fork
+        os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+        import torch
+
+        torch.set_num_threads(1)
+        from app.nlp import NLPModels
+        from app.runtime import load_profile
+
+        started = time.perf_counter()
+        profile = load_profile()
+        models = NLPModels(profile=profile.for_worker(1))  # no pinning or thread pool in the parent
+        freeze_for_fork(models)
+        print(f"Loaded and froze models in {time.perf_counter() - started:.1f}s; forking "
+              f"{self.workers} workers x {self.threads} threads on {self.sock.getsockname()}",
+              file=sys.stderr, flush=True)
+
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGUSR1, self._log_memory)
+        for slot in range(self.workers):
+            self._spawn(slot, models, profile)
+        self._log_memory()
+
+        while self.children:
+            try:
+                pid, _status = os.wait()
+            except InterruptedError:
+                continue
+            except ChildProcessError:
+                break
+            slot = self.children.pop(pid, None)
+            if slot is not None and not self.stopping:
+                print(f"worker {pid} exited; restarting slot {slot}", file=sys.stderr, flush=True)
+                self._spawn(slot, models, profile)
+        self.sock.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["memory"]:
+        parser = argparse.ArgumentParser(prog="python -m app.serve memory",
+                                         description="Per-process memory of a running server")
+        parser.add_argument("--url", default=f"http://127.0.0.1:{DEFAULT_PORT}")
+        args = parser.parse_args(argv[1:])
+        with urllib.request.urlopen(args.url.rstrip("/") + "/v1/memory", timeout=10) as resp:
+            report = json.load(resp)
+        for row in report["processes"]:
+            print(f"{row['role']:<7} pid {row['pid']:<8} rss {row.get('Rss', 0):>7} MiB  "
+                  f"pss {row.get('Pss', 0):>7} MiB  shared {row.get('Shared_Clean', 0) + row.get('Shared_Dirty', 0):>7} MiB  "
+                  f"private {row.get('Private_Clean', 0) + row.get('Private_Dirty', 0):>7} MiB")
+        print(f"total   rss {report['Rss_total']} MiB  pss {report['Pss_total']} MiB")
+        return
+    parser = argparse.ArgumentParser(description="Pre-fork JSON model server with shared weights")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=0, help="default: half the cores")
+    parser.add_argument("--threads-per-worker", type=int, default=0, help="default: cores / workers")
+    args = parser.parse_args(argv)
+    PreforkServer(args.host, args.port, args.workers, args.threads_per_worker).run()
+
+
+if __name__ == "__main__":
+    main()
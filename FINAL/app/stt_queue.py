@@ -0,0 +1,264 @@
+"""Background Whisper transcription in a pool of worker processes; jobs keyed by audio hash."""
+from __future__ import annotations
+
+import hashlib
+import multiprocessing as mp
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from multiprocessing.connection import wait
+from typing import Deque, Dict, List, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+@dataclass
+class Job:
+    job_id: str
+    audio_path: str
+    state: str = QUEUED
+    progress: float = 0.0
+    text: str = ""
+    partial_text: str = ""
+    error: str = ""
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+
+def _worker_main(conn, model_name: str) -> None:
+    """Worker process: load Whisper once, then transcribe jobs until told to stop."""
+    try:
+        from app.voice import Speech
+
+        speech = Speech()
+        speech.load_whisper(model_name)
+    except Exception as exc:
+        conn.send(("fatal", None, f"{type(exc).__name__}: {exc}"))
+        return
+    conn.send(("ready", None, None))
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        job_id, audio_path = msg
+        conn.send(("progress", job_id, (0.0, "")))
+        try:
+            text = speech.transcribe(
+                audio_path,
+                on_progress=lambda frac, partial: conn.send(("progress", job_id, (frac, partial))),
+            )
+            conn.send(("done", job_id, text))
+        except Exception as exc:
+            conn.send(("error", job_id, f"{type(exc).__name__}: {exc}"))
+
+
+class _Worker:
+    def __init__(self, ctx, model_name: str) -> None:
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child, model_name), daemon=True)
+        self.process.start()
+        child.close()
+        self.ready = False
+        self.fatal = False  # could not load Whisper; never restarted
+        self.job_id: Optional[str] = None
+
+    def stop(self, kill: bool = False) -> None:
+        if kill:
+            self.process.terminate()
+        else:
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class TranscriptionQueue:
+    def __init__(self, workers: int = 1, model_name: str = "small", keep_results: int = 256,
+                 spool_dir: Optional[str] = None) -> None:
+        # spawn: torch and Whisper are not fork-safe once threads exist
+        self._ctx = mp.get_context("spawn")
+        self.model_name = model_name
+        self.keep_results = keep_results
+        self.spool_dir = spool_dir or tempfile.mkdtemp(prefix="stt_jobs_")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._pending: Deque[str] = deque()
+        self._lock = threading.Lock()
+        self.startup_error = ""
+        self._workers: List[_Worker] = [_Worker(self._ctx, model_name) for _ in range(max(1, workers))]
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._serve, name="stt-dispatch", daemon=True)
+        self._thread.start()
+
+    # -- public API -----------------------------------------------------------
+
+    def submit(self, audio: bytes, suffix: str = ".wav", retry: bool = False) -> str:
+        """Queue audio for transcription and return its job id (content hash)."""
+        job_id = hashlib.sha256(audio).hexdigest()[:32]
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and not (retry and job.state in (FAILED, CANCELLED)):
+                self._jobs.move_to_end(job_id)
+                return job_id
+            path = os.path.join(self.spool_dir, job_id + suffix)
+            with open(path, "wb") as fh:
+                fh.write(audio)
+            self._jobs[job_id] = Job(job_id, path)
+            self._pending.append(job_id)
+            self._trim()
+        return job_id
+
+    def status(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return None if job is None else Job(**job.__dict__)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; a running worker is restarted."""
+        retired: List[_Worker] = []
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.state in FINISHED:
+                return False
+            if job.state == QUEUED:
+                self._pending.remove(job_id)
+            else:
+                retired = [self._swap(w) for w in list(self._workers) if w.job_id == job_id]
+            self._finish(job, CANCELLED)
+        # Killing and joining can take seconds; not while other sessions wait on the lock
+        for worker in retired:
+            worker.stop(kill=True)
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.state] = counts.get(job.state, 0) + 1
+            counts["workers"] = len(self._workers)
+            counts["busy_workers"] = sum(1 for w in self._workers if w.job_id)
+            return counts
+
+    def live_paths(self) -> List[str]:
+        """Audio of jobs not finished yet; the memory ledger must not sweep these."""
+        with self._lock:
+            return [job.audio_path for job in self._jobs.values() if job.state not in FINISHED]
+
+    def shutdown(self) -> None:
+        self._closed.set()
+        self._thread.join(timeout=5)
+        for worker in self._workers:
+            worker.stop()
+
+    # -- internals ------------------------------------------------------------
+
+    def _finish(self, job: Job, state: str) -> None:
+        job.state = state
+        job.finished_at = time.time()
+        if state == DONE:
+            job.progress = 1.0
+        try:
+            os.unlink(job.audio_path)
+        except OSError:
+            pass
+
+    def _trim(self) -> None:
+        finished = [jid for jid, job in self._jobs.items() if job.state in FINISHED]
+        for jid in finished[: max(0, len(finished) - self.keep_results)]:
+            del self._jobs[jid]
+
+    def _swap(self, worker: _Worker) -> _Worker:
+        """Put a fresh worker in ``worker``'s slot (lock held); the caller stops the old one."""
+        self._workers[self._workers.index(worker)] = _Worker(self._ctx, self.model_name)
+        return worker
+
+    def _dispatch(self) -> List[_Worker]:
+        """Hand pending jobs to idle workers; returns dead workers to stop once unlocked."""
+        if self.startup_error and all(w.fatal for w in self._workers):
+            while self._pending:
+                job = self._jobs[self._pending.popleft()]
+                job.error = self.startup_error
+                self._finish(job, FAILED)
+            return []
+        retired: List[_Worker] = []
+        for worker in list(self._workers):
+            if not self._pending:
+                break
+            if worker.ready and worker.job_id is None:
+                job_id = self._pending.popleft()
+                job = self._jobs[job_id]
+                try:
+                    worker.conn.send((job_id, job.audio_path))
+                except (BrokenPipeError, OSError):
+                    # Died while idle: the job goes back to the front for the next worker
+                    self._pending.appendleft(job_id)
+                    retired.append(self._swap(worker))
+                    continue
+                job.state = RUNNING
+                worker.job_id = job_id
+        return retired
+
+    def _handle(self, worker: _Worker, kind: str, job_id: Optional[str], payload) -> None:
+        if kind == "ready":
+            worker.ready = True
+            return
+        if kind == "fatal":
+            worker.fatal = True
+            self.startup_error = payload
+            return
+        job = self._jobs.get(job_id)
+        if kind in ("done", "error"):
+            worker.job_id = None
+        if job is None or job.state in FINISHED:
+            return
+        if kind == "progress":
+            job.progress, job.partial_text = payload
+        elif kind == "done":
+            job.text = payload
+            self._finish(job, DONE)
+        else:
+            job.error = payload
+            self._finish(job, FAILED)
+
+    def _serve(self) -> None:
+        while not self._closed.is_set():
+            with self._lock:
+                retired = self._dispatch()
+                conns = {w.conn: w for w in self._workers if not w.fatal}
+            for worker in retired:
+                worker.stop(kill=True)
+            try:
+                ready = wait(list(conns), timeout=0.1) if conns else []
+            except (OSError, ValueError):
+                continue  # a worker was replaced by cancel() mid-wait
+            if not conns:
+                time.sleep(0.1)
+            for conn in ready:
+                worker = conns[conn]
+                try:
+                    kind, job_id, payload = conn.recv()
+                except (EOFError, OSError):
+                    self._replace_dead(worker)
+                    continue
+                with self._lock:
+                    self._handle(worker, kind, job_id, payload)
+
+    def _replace_dead(self, worker: _Worker) -> None:
+        with self._lock:
+            if worker not in self._workers or worker.fatal:
+                return  # replaced by cancel(), or failed to start
+            job = self._jobs.get(worker.job_id) if worker.job_id else None
+            if job is not None and job.state not in FINISHED:
+                job.error = "worker process exited"
+                self._finish(job, FAILED)
+            self._swap(worker)
+        worker.stop(kill=True)
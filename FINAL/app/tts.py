@@ -0,0 +1,49 @@
+"""Text-to-speech rendered by a dedicated worker process.
+
+pyttsx3's ``runAndWait`` blocks and is not thread-safe, so one long-lived
+process owns the engine and replies are rendered sentence by sentence,
+in order, while the plan is still generating. The queue itself
+is V2's ``app/tts.py``; this module supplies the spawned worker, which
+has to live in FINAL's ``app`` package so it drives FINAL's ``Speech``.
+``join_wavs`` turns the sentence WAVs back into one clip, so the reply
+plays through in a single player.
+"""
+from __future__ import annotations
+
+import io
+import wave
+from typing import Iterable, Optional
+
+from app.v2 import load as load_v2
+
+
+def _worker_main(conn, rate: Optional[int], voice_id: Optional[str]) -> None:
+    def make_speech():
+        from app.voice import Speech
+
+        speech = Speech()
+        speech.load_tts(rate=rate, voice_id=voice_id)
+        return speech
+
+    load_v2("tts").worker_loop(conn, make_speech)
+
+
+def start_queue(rate: Optional[int] = None, voice_id: Optional[str] = None, spool_dir: Optional[str] = None):
+    """Start the shared TTS worker; ``submit(reply)`` returns an in-order WAV stream."""
+    return load_v2("tts").SpeechQueue(worker=_worker_main, worker_args=(rate, voice_id), spool_dir=spool_dir)
+
+
+def join_wavs(paths: Iterable[str]) -> bytes:
+    """Concatenate WAVs rendered by the same engine (same rate, width and channels)."""
+    buf = io.BytesIO()
+    out = None
+    for path in paths:
+        with wave.open(path, "rb") as src:
+            if out is None:
+                out = wave.open(buf, "wb")
+                out.setparams(src.getparams())
+            out.writeframes(src.readframes(src.getnframes()))
+    if out is None:
+        return b""
+    out.close()
+    return buf.getvalue()
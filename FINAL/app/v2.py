@@ -0,0 +1,40 @@
+"""Mounts the stdlib-only V2 app (``../V2/app``) as ``v2app`` for the FINAL app.
+
+    CHATBOT_V2_DIR=/path/to/V2/app   # a V2 checkout elsewhere
+"""
+from __future__ import annotations
+
+import importlib
+import os
+import sys
+import threading
+import types
+from pathlib import Path
+from types import ModuleType
+
+PACKAGE = "v2app"
+V2_APP_DIR = Path(
+    os.environ.get("CHATBOT_V2_DIR", Path(__file__).resolve().parents[2] / "V2")
+) / "app"
+
+_lock = threading.Lock()
+
+
+def check() -> None:
+    """Raise ImportError, with the fix, when the V2 checkout is missing."""
+    if not V2_APP_DIR.is_dir():
+        raise ImportError(
+            f"V2 app not found at {V2_APP_DIR}; FINAL needs it for helplines, crisis lexicons and TTS. "
+            "Check out V2 next to FINAL or set CHATBOT_V2_DIR."
+        )
+
+
+def load(name: str) -> ModuleType:
+    """Import ``V2/app/<name>.py`` as ``v2app.<name>``."""
+    with _lock:
+        if PACKAGE not in sys.modules:
+            check()
+            pkg = types.ModuleType(PACKAGE)
+            pkg.__path__ = [str(V2_APP_DIR)]
+            sys.modules[PACKAGE] = pkg
+    return importlib.import_module(f"{PACKAGE}.{name}")
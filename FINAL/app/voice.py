@@ -2,10 +2,13 @@ from __future__ import annotations
 
 import os
 import tempfile
-from typing import Optional
+from typing import Callable, Optional
 
 import soundfile as sf
 
+from app.audio import chunk_for_whisper, preprocess
+from app.model_cache import from_env as model_cache
+
 try:
     import whisper  # openai-whisper
 except Exception:
@@ -25,13 +28,30 @@ class Speech:
     def load_whisper(self, model_name: str = "small") -> None:
         if whisper is None:
             raise RuntimeError("openai-whisper not installed")
-        self._whisper_model = whisper.load_model(model_name)
+        cache = model_cache()
+        if cache is not None:
+            self._whisper_model = cache.load_whisper(model_name)
+        else:
+            self._whisper_model = whisper.load_model(model_name)
 
-    def transcribe(self, audio_path: str) -> str:
+    def transcribe(
+        self,
+        audio_path: str,
+        on_progress: Optional[Callable[[float, str], None]] = None,
+    ) -> str:
         if self._whisper_model is None:
             self.load_whisper("small")
-        result = self._whisper_model.transcribe(audio_path)
-        return result.get("text", "").strip()
+        # Whisper only sees 16 kHz mono speech; silence is trimmed beforehand
+        prepared = preprocess(audio_path)
+        chunks = chunk_for_whisper(prepared)
+        text = ""
+        for idx, chunk in enumerate(chunks):
+            # Carry the previous chunk's tail so words split at a cut still decode
+            result = self._whisper_model.transcribe(chunk, initial_prompt=text[-200:] or None)
+            text = (text + " " + result.get("text", "").strip()).strip()
+            if on_progress is not None:
+                on_progress((idx + 1) / len(chunks), text)
+        return text
 
     def load_tts(self, rate: Optional[int] = None, voice_id: Optional[str] = None) -> None:
         if pyttsx3 is None:
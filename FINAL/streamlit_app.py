@@ -1,21 +1,58 @@
 import os
-import tempfile
+import time
+import uuid
 import streamlit as st
 
-from app.nlp import NLPModels
-from app.crisis import detect_crisis, crisis_helpline
+from app.nlp import LONG_TEXT_CHARS, NLPModels
+from app.remote import from_env as remote_models
+from app.crisis import StreamingCrisisDetector, detect_crisis, crisis_helpline, preload_helplines
 from app.avatars import pick_avatar_from_sentiment
-from app.voice import Speech
+from app.admission import GuardedGeneration
+from app.cascade import CascadeClassifier
+from app.stt_queue import TranscriptionQueue
+from app.tts import join_wavs, start_queue
+from app.v2 import check as check_v2, load as load_v2
 
 st.set_page_config(page_title="Mental Health Chatbot (Prototype)", page_icon="🧠")
 
+try:
+    # Helplines and crisis phrases come from V2; fail here, not mid-conversation
+    check_v2()
+except ImportError as e:
+    st.error(str(e))
+    st.stop()
+
 @st.cache_resource
 def get_models():
-    return NLPModels()
+    # CHATBOT_MODEL_SERVER: use the pre-fork server (app/serve.py) instead of loading weights here
+    return remote_models() or NLPModels()
+
+@st.cache_resource
+def get_cascade():
+    # Keyword analyzer first; XLM-R only for ambiguous messages
+    return CascadeClassifier(get_models())
+
+@st.cache_resource
+def get_generation():
+    # Admission control: template replies when FLAN-T5 would miss the latency SLO
+    return GuardedGeneration(get_models())
+
+@st.cache_resource
+def get_tts():
+    # One pyttsx3 worker process for all sessions; requests queue in front of it
+    queue = start_queue()
+    load_v2("memwatch").get_ledger().watch(queue.spool_dir, live=queue.live_paths)
+    return queue
 
 @st.cache_resource
-def get_speech():
-    return Speech()
+def get_stt_queue():
+    # Whisper runs in worker processes, never in the script thread
+    queue = TranscriptionQueue(
+        workers=int(os.environ.get("CHATBOT_STT_WORKERS", "1")),
+        model_name=os.environ.get("CHATBOT_WHISPER_MODEL", "small"),
+    )
+    load_v2("memwatch").get_ledger().watch(queue.spool_dir, live=queue.live_paths)
+    return queue
 
 st.title("🧠 Multilingual Mental Health Chatbot (Prototype)")
 
@@ -24,10 +61,18 @@ with st.sidebar:
     enable_stt = st.toggle("Voice input (Whisper)", value=False)
     enable_tts = st.toggle("Voice output (pyttsx3)", value=False)
     locale = st.selectbox("Locale (for helpline)", ["en", "es", "fr", "hi", "ar", "sw"], index=0)
+    region = st.text_input("Country code (optional, e.g. MX, IN)", value="").strip()
+    if region:
+        locale = f"{locale}-{region.upper()}"
     st.info("This is a research prototype. Not a medical device.")
 
 models = get_models()
-speech = get_speech()
+cascade = get_cascade()
+preload_helplines()
+if "context" not in st.session_state:
+    # Earlier turns, tokenized once; only in-process models take history
+    st.session_state.context = models.new_context() if hasattr(models, "new_context") else None
+context = st.session_state.context
 
 st.write("Type a message in your language. The bot replies empathetically.")
 
@@ -36,49 +81,147 @@ user_text = ""
 if enable_stt:
     audio_file = st.file_uploader("Upload audio (wav/mp3)", type=["wav", "mp3", "m4a", "ogg"]) 
     if audio_file is not None:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f"_{audio_file.name}") as tmp:
-            tmp.write(audio_file.read())
-            tmp_path = tmp.name
-        with st.spinner("Transcribing..."):
-            try:
-                user_text = speech.transcribe(tmp_path)
-                st.success("Transcription complete")
-            except Exception as e:
-                st.error(f"STT failed: {e}")
-        os.unlink(tmp_path)
+        stt = get_stt_queue()
+        suffix = os.path.splitext(audio_file.name)[1] or ".wav"
+        job_id = stt.submit(audio_file.getvalue(), suffix=suffix)
+        job = stt.status(job_id)
+        # Screen the transcript as it grows, so helplines show before it finishes
+        screen = st.session_state.get("stt_screen")
+        if screen is None or screen[0] != job_id:
+            screen = st.session_state.stt_screen = [job_id, StreamingCrisisDetector(), 0]
+        heard = job.text if job.state == "done" else job.partial_text
+        if len(heard) > screen[2]:
+            screen[1].feed(heard[screen[2]:])
+            screen[2] = len(heard)
+        if screen[1].level == "high" and job.state in ("queued", "running"):
+            st.warning("High-risk content detected in the recording so far.")
+            st.info(crisis_helpline(locale))
+        if job.state in ("queued", "running"):
+            label = "Waiting for a transcription worker..." if job.state == "queued" else "Transcribing..."
+            st.progress(job.progress, text=label)
+            if job.partial_text:
+                st.caption(job.partial_text)
+            if st.button("Cancel transcription"):
+                stt.cancel(job_id)
+                st.rerun()
+            # Poll without holding the session: other widgets stay responsive
+            time.sleep(0.5)
+            st.rerun()
+        elif job.state == "done" and not job.text:
+            st.warning("No speech detected in the recording.")
+        elif job.state == "done":
+            user_text = job.text
+            st.success("Transcription complete")
+        elif job.state == "failed":
+            st.error(f"STT failed: {job.error}")
+        else:
+            st.info("Transcription cancelled.")
+            if st.button("Retry transcription"):
+                stt.submit(audio_file.getvalue(), suffix=suffix, retry=True)
+                st.rerun()
 
 # Text input fallback
 user_text = st.text_input("Your message", value=user_text)
 
 if st.button("Send") and user_text.strip():
+    generation = get_generation()
+    crisis, hits = detect_crisis(user_text)
+    crisis = crisis or generation.is_crisis(user_text)
+    if crisis:
+        # Before any model work, so load can never delay it
+        st.warning("High-risk content detected" + (": " + ", ".join(hits) if hits else ""))
+        st.info(crisis_helpline(locale))
+
     with st.spinner("Thinking empathetically..."):
-        crisis, hits = detect_crisis(user_text)
-        sentiment_label = models.detect_sentiment(user_text)
+        windows = None
+        if len(user_text) > LONG_TEXT_CHARS and hasattr(models, "sentiment_windows"):
+            # Long transcript or journal entry: scored window by window
+            try:
+                windows = models.sentiment_windows(user_text)
+            except Exception as e:
+                st.caption(f"Scoring the message as a whole ({type(e).__name__} in windowed scoring).")
+        sentiment_label = windows.label if windows is not None else cascade.detect_sentiment(user_text)
         avatar, mood = pick_avatar_from_sentiment(sentiment_label)
-        reply = models.generate_empathetic_reply(user_text, emotion_hint=sentiment_label)
-        plan = models.generate_support_plan(user_text)
+        generated = generation.reply(user_text, emotion_hint=sentiment_label, crisis=crisis, context=context)
+        reply = generated.text
+        if context is not None:
+            context.add("user", user_text)
+            context.add("assistant", reply)
 
     st.markdown(f"{avatar} {reply}")
-
-    if plan:
-        st.markdown("**Here are a few gentle next steps you could try:**")
-        for item in plan:
-            st.markdown(f"- {item}")
-
-    if crisis:
-        st.warning("High-risk content detected: " + ", ".join(hits))
-        st.info(crisis_helpline(locale))
-
+    if generated.mode == "template":
+        st.caption("Quick reply: the model is busy right now.")
+
+    if windows is not None and len(windows.windows) > 1:
+        peak = windows.peak("negative")
+        with st.expander("How the mood changes through your message"):
+            st.bar_chart({"negative": [w.scores.get("negative", 0.0) for w in windows.windows]})
+            if peak is not None and peak.label == "negative":
+                heavy = user_text[peak.start:peak.end].replace("[", "(").replace("]", ")")
+                st.markdown(user_text[:peak.start] + ":red-background[" + heavy + "]" + user_text[peak.end:])
+
+    # Queue speech now so synthesis overlaps plan generation
+    speech_stream = None
     if enable_tts:
         try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmpw:
-                out_path = tmpw.name
-            out_wav = speech.synthesize(reply, out_path)
-            audio_bytes = open(out_wav, "rb").read()
-            st.audio(audio_bytes, format="audio/wav")
-            os.unlink(out_wav)
+            speech_stream = get_tts().submit(reply)
         except Exception as e:
             st.error(f"TTS failed: {e}")
 
+    # Bullets appear as FLAN-T5 finishes each one
+    plan_slot = st.empty()
+    plan = []
+    with st.spinner("Putting together a few next steps..."):
+        plan_items, _plan_mode = generation.plan(user_text, crisis=crisis, emotion_hint=sentiment_label)
+        for item in plan_items:
+            plan.append(item)
+            plan_slot.markdown(
+                "**Here are a few gentle next steps you could try:**\n"
+                + "\n".join(f"- {step}" for step in plan)
+            )
+
+    if speech_stream is not None:
+        wav_paths = []
+        try:
+            # One player for the whole reply, so the sentences play back to back
+            wav_paths.extend(speech_stream)
+            if wav_paths:
+                st.audio(join_wavs(wav_paths), format="audio/wav", autoplay=True)
+        except Exception as e:
+            st.error(f"TTS failed: {e}")
+        finally:
+            for wav_path in wav_paths:
+                os.unlink(wav_path)
+
+with st.sidebar:
+    # Rendered last so the numbers include this run's request
+    with st.expander("Diagnostics"):
+        if hasattr(models, "cache"):
+            st.caption("Reply cache")
+            st.json(models.cache.stats())
+        else:
+            st.caption("Model server")
+            st.json(models.stats())
+        if context is not None:
+            st.caption("Conversation context")
+            st.json(context.stats())
+        if getattr(models, "quantized", None):
+            st.caption("Int8 models: " + ", ".join(models.quantized))
+        st.caption("Generation admission")
+        st.json(get_generation().stats())
+        st.caption("Sentiment cascade")
+        st.json(cascade.stats())
+        # V2's per-session ledger; the tokenizer the context points at is shared, not ours
+        memwatch = load_v2("memwatch")
+        ledger = memwatch.get_ledger()
+        memory_id = st.session_state.setdefault("memory_id", uuid.uuid4().hex)
+        if context is not None:
+            ledger.record(memory_id, ledger.measure(st.session_state, shared=(context.tok,)), owner=context)
+        if memwatch.debug_panel_enabled():
+            # Covers every session in the process; operators only
+            st.caption("Memory")
+            st.json({"metrics": ledger.metrics(),
+                     "session": next((row for row in ledger.sessions() if row["session"] == memory_id), {})})
+
 st.caption("Not a medical device. If you're in danger, contact local emergency services.")
 st.caption("Models: cardiffnlp/twitter-xlm-roberta-base-sentiment, google/flan-t5-base, joeddav/xlm-roberta-large-xnli. TTS: pyttsx3.")
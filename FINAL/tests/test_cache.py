@@ -0,0 +1,59 @@
+"""Near-duplicate cache: a negated message must never get the other one's output."""
+import pytest
+
+from app.cache import SemanticCache
+
+COPING = "I'm coping well with work stress, deadlines and exams lately"
+NOT_COPING = "I'm not coping well with work stress, deadlines and exams lately"
+
+
+def test_negation_never_matches():
+    cache = SemanticCache()
+    cache.put(COPING, "keep it up", "reply:positive")
+    assert cache.get(NOT_COPING, "reply:positive") is None
+    assert cache.get("I’m coping well with work stress, deadlines and exams lately!", "reply:positive") == "keep it up"
+
+
+def test_same_negators_still_match():
+    cache = SemanticCache()
+    cache.put("I don't feel like eating and I can't sleep", "eat something small", "reply:negative")
+    assert cache.get("I don’t feel like eating, and I can’t sleep", "reply:negative") == "eat something small"
+    assert cache.get("I feel like eating and I can't sleep", "reply:negative") is None
+
+
+def test_plans_are_keyed_by_sentiment(monkeypatch):
+    pytest.importorskip("transformers")
+    import app.nlp
+    from app.nlp import NLPModels
+
+    models = NLPModels.__new__(NLPModels)  # no weights: only the caching path runs
+    models.cache = SemanticCache()
+    runs = []
+    models._run_support_plan = lambda text, on_bullet=None: runs.append(text) or [f"step {len(runs)}"]
+    monkeypatch.setattr(app.nlp, "is_crisis", lambda text: False)
+
+    positive = models.generate_support_plan(COPING, emotion_hint="positive")
+    assert models.generate_support_plan(COPING, emotion_hint="positive") == positive
+    assert models.generate_support_plan(COPING, emotion_hint="negative") != positive
+    assert models.generate_support_plan(NOT_COPING, emotion_hint="positive") != positive
+    assert len(runs) == 3
+
+
+def test_crisis_turns_bypass_the_cache(monkeypatch):
+    pytest.importorskip("transformers")
+    from app.nlp import NLPModels
+
+    models = NLPModels.__new__(NLPModels)
+    models.cache = SemanticCache()
+    models._run_support_plan = lambda text, on_bullet=None: ["call someone"]
+    models.generate_support_plan("Quiero morir", emotion_hint="negative", crisis=True)
+    assert models.cache.stats()["entries"] == 0
+    assert models.cache.stats()["bypassed"] == 1
+
+
+def test_clear_resets_stats():
+    cache = SemanticCache()
+    cache.put(COPING, "keep it up")
+    cache.get(COPING)
+    cache.clear()
+    assert cache.stats() == {"entries": 0, "hits": 0, "misses": 0, "bypassed": 0, "evictions": 0, "hit_rate": 0.0}
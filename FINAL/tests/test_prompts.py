@@ -0,0 +1,43 @@
+"""Spliced prompt ids must equal tokenizing the rendered prompt (real FLAN-T5 tokenizer)."""
+import pytest
+
+transformers = pytest.importorskip("transformers")
+
+from app.nlp import GENERATOR_MODEL  # noqa: E402
+from app.prompts import SAMPLES, compile_templates  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def tok():
+    try:
+        return transformers.AutoTokenizer.from_pretrained(GENERATOR_MODEL)
+    except OSError as exc:  # offline without a cached copy
+        pytest.skip(f"tokenizer unavailable: {exc}")
+
+
+@pytest.fixture(scope="module")
+def templates(tok):
+    return compile_templates(tok)
+
+
+@pytest.mark.parametrize("name", ["reply", "reply_context", "plan"])
+@pytest.mark.parametrize("values", SAMPLES)
+def test_spliced_matches_full(tok, templates, name, values):
+    template = templates[name]
+    values = {k: v for k, v in values.items() if k in template.slots}
+    if set(values) != set(template.slots):
+        pytest.skip("sample does not fill every slot")
+    assert template.encode_ids(**values) == tok(template.render(**values))["input_ids"]
+
+
+def test_fixed_segments_have_no_trailing_space_piece(tok, templates):
+    space = tok.convert_tokens_to_ids("▁")
+    for template in templates.values():
+        for seg in template.segments:
+            if not isinstance(seg, str):
+                assert seg[-1] != space
+
+
+def test_prompt_fits_model_input(templates):
+    template = templates["reply_context"]
+    assert template.static_tokens + sum(template.budgets.values()) <= 512
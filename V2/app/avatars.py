@@ -3,8 +3,17 @@ import streamlit.components.v1 as components
 import html
 import json
 
-def render_dot_avatar(emotion_data: dict, speaking_intensity: float = 0.5, message_length: int = 0):
-    """Fixed dot matrix avatar with proper display and smooth animations"""
+def render_dot_avatar(emotion_data: dict, speaking_intensity: float = 0.5, message_length: int = 0,
+                      speech_clips=None, speaking_ms=None):
+    """Fixed dot matrix avatar with proper display and smooth animations
+
+    speech_clips: [{'audio': base64 WAV, 'levels': base64 uint8 envelope, 'frame_ms': int}, ...]
+    played back-to-back in the component; the mouth follows each clip's envelope at the
+    audio element's currentTime. Later clips can be appended with queue_avatar_clip while
+    the first one plays. Without clips, speaking_ms (e.g. from
+    Speech.estimate_speaking_ms) limits the synthetic mouth movement; None keeps it going.
+    """
+    speech_clips = speech_clips or []
     
     emotion = emotion_data.get('dominant_emotion', 'neutral').lower()
     confidence = emotion_data.get('confidence', 0.5)
@@ -95,11 +104,18 @@ def render_dot_avatar(emotion_data: dict, speaking_intensity: float = 0.5, messa
                 box-shadow: 0 8px 32px rgba(0,0,0,0.1);
                 background: rgba(255,255,255,0.05);
             }}
+            audio {{
+                display: block;
+                width: 512px;
+                height: 32px;
+                margin-top: 6px;
+            }}
         </style>
     </head>
     <body>
         <div class="avatar-container">
             <canvas id="emotionalAvatar" width="512" height="512"></canvas>
+            {'<audio id="voice" controls></audio>' if speech_clips else ''}
         </div>
         
         <script>
@@ -119,6 +135,17 @@ def render_dot_avatar(emotion_data: dict, speaking_intensity: float = 0.5, messa
                     this.confidence = {confidence};
                     this.crisisLevel = "{crisis_level}";
                     this.speakingIntensity = {speaking_intensity};
+                    this.speakingMs = {json.dumps(speaking_ms)};
+                    this.startedAt = performance.now();
+                    
+                    // Voice clips with precomputed mouth envelopes (uint8, one per frame)
+                    this.clips = {json.dumps(speech_clips)}.map(clip => this.decodeClip(clip));
+                    this.clipIdx = 0;
+                    this.audio = document.getElementById('voice');
+                    if (this.audio && this.clips.length) {{
+                        this.audio.addEventListener('ended', () => this.playClip(this.clipIdx + 1));
+                        this.playClip(0);
+                    }}
                     
                     // Pattern data
                     this.pattern = {json.dumps(pattern)};
@@ -132,6 +159,44 @@ def render_dot_avatar(emotion_data: dict, speaking_intensity: float = 0.5, messa
                     this.startAnimation();
                 }}
                 
+                decodeClip(clip) {{
+                    return {{
+                        src: 'data:audio/wav;base64,' + clip.audio,
+                        levels: Uint8Array.from(atob(clip.levels), c => c.charCodeAt(0)),
+                        frameMs: clip.frame_ms
+                    }};
+                }}
+                
+                // Clips streamed in after the first (see queue_avatar_clip); they may arrive out of order
+                addClip(idx, clip) {{
+                    this.clips[idx] = this.decodeClip(clip);
+                    if (idx === this.clipIdx && (this.audio.paused || this.audio.ended)) this.playClip(idx);
+                }}
+                
+                playClip(idx) {{
+                    this.clipIdx = idx;
+                    if (!this.clips[idx]) return;  // not synthesized yet; addClip starts it
+                    this.audio.src = this.clips[idx].src;
+                    // Autoplay may be blocked; the controls let the user start it
+                    this.audio.play().catch(() => {{}});
+                }}
+                
+                // Mouth opening in [0, 1]
+                mouthLevel() {{
+                    if (this.clips.length) {{
+                        if (this.audio.paused || this.audio.ended) return 0;
+                        const clip = this.clips[this.clipIdx];
+                        if (!clip) return 0;
+                        const pos = this.audio.currentTime * 1000 / clip.frameMs;
+                        const i = Math.floor(pos);
+                        if (i >= clip.levels.length) return 0;
+                        const next = i + 1 < clip.levels.length ? clip.levels[i + 1] : 0;
+                        return (clip.levels[i] + (next - clip.levels[i]) * (pos - i)) / 255;
+                    }}
+                    if (this.speakingMs !== null && performance.now() - this.startedAt > this.speakingMs) return 0;
+                    return (0.6 + 0.3 * Math.sin(this.t/2)) / 0.9;
+                }}
+                
                 getCrisisColor() {{
                     switch(this.crisisLevel) {{
                         case 'high': return 'rgba(255, 80, 80, 0.1)';
@@ -224,7 +289,7 @@ def render_dot_avatar(emotion_data: dict, speaking_intensity: float = 0.5, messa
                 }}
                 
                 drawMouth(animationEffect, intensity) {{
-                    const mouthScale = 0.6 + this.speakingIntensity * (0.6 + 0.3 * Math.sin(this.t/2));
+                    const mouthScale = 0.6 + this.speakingIntensity * 0.9 * this.mouthLevel();
                     this.pattern.mouth.forEach(([x, y]) => {{
                         this.ctx.beginPath();
                         this.ctx.fillStyle = this.pattern.mouth_color;
@@ -327,7 +392,30 @@ def render_dot_avatar(emotion_data: dict, speaking_intensity: float = 0.5, messa
     </html>
     """
     
-    components.html(avatar_html, height=550, scrolling=False)
+    components.html(avatar_html, height=600 if speech_clips else 550, scrolling=False)
+
+def queue_avatar_clip(index: int, clip: dict):
+    """Hand clip ``index`` of the current reply to the avatar rendered above it
+
+    Runs in its own zero-height component and calls the avatar frame's addClip, retrying
+    while that frame is still loading; the avatar plays it once the previous clip ends.
+    """
+    components.html(f"""
+    <script>
+        const clip = {json.dumps(clip)};
+        (function deliver(tries) {{
+            for (const frame of window.parent.document.querySelectorAll('iframe')) {{
+                let avatar = null;
+                try {{ avatar = frame.contentWindow.emotionalAvatar; }} catch (e) {{}}
+                if (avatar && avatar.addClip) {{
+                    avatar.addClip({int(index)}, clip);
+                    return;
+                }}
+            }}
+            if (tries > 0) setTimeout(() => deliver(tries - 1), 100);
+        }})(50);
+    </script>
+    """, height=0)
 
 def render_emotional_indicator(emotion_data: dict):
     """Enhanced emotional state indicator"""
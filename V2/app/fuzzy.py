@@ -0,0 +1,210 @@
+# app/fuzzy.py — typo- and obfuscation-tolerant crisis phrase matching
+#
+# Exact substring matching misses "suicde", "k!ll myself", "selfharm" and
+# full-width or accented variants. Text is normalized first (NFKC via the
+# lexicon fold, casefolding, per-character script handling, leetspeak inside
+# words), then every token is looked up in a SymSpell-style deletion index
+# built from the phrase vocabulary: all strings reachable by deleting up to
+# k characters from a vocabulary token point back to it, so a lookup only
+# generates the input token's own deletions and verifies the few candidates
+# with a bounded edit distance. No per-keyword distance computation.
+#
+# Edit budget per pair: exact when either the token or the phrase word has 4
+# characters or fewer, 1 edit when the shorter is 5-7, 2 when it is 8+, so
+# "dive" never passes for "die" nor "overdue" for "overdose". A phrase word
+# also matches inside a longer token only when what is left over is itself a
+# crisis word ("killmyself"), never "selfie" or "lifestyle". Multi-word
+# phrases also match written as one word ("selfharm"), and runs of up to three
+# tokens are re-joined ("kill my self"); such a compound may differ by one
+# edit, and only inside one of its 5+ character words ("killmyslef"), so
+# "want to dive" stays clear of "want to die".
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .lexicons import LEXICONS, fold
+
+LEET = {'0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't',
+        '@': 'a', '$': 's', '!': 'i', '|': 'i', '+': 't'}
+_TOKEN = re.compile(r"[\w@$!|+]+")  # apostrophes split: "d'en" -> "d", "en"
+MAX_JOIN = 3
+_DEVANAGARI = (0x0900, 0x097F)
+_LEVEL_RANK = {'medium': 1, 'high': 2}
+
+
+@lru_cache(maxsize=4096)
+def fold_char(ch: str) -> str:
+    """Lexicon folding for one character; Devanagari keeps its vowel signs."""
+    script = 'DEVANAGARI' if _DEVANAGARI[0] <= ord(ch) <= _DEVANAGARI[1] else 'ARABIC'
+    return fold(unicodedata.normalize('NFKC', ch).casefold(), script)
+
+
+def _clean_token(token: str) -> str:
+    # "die!" is punctuation, "$uicide" and "k!ll" are leetspeak
+    if token.isalpha():
+        return token
+    token = token.rstrip("@$!|+").lstrip("!|+")
+    if not any(ch.isalpha() for ch in token):
+        return token
+    return ''.join(LEET.get(ch, ch) for ch in token)
+
+
+def tokens(text: str) -> List[str]:
+    folded = ''.join(map(fold_char, text.replace('’', "'")))
+    return [t for t in map(_clean_token, _TOKEN.findall(folded)) if t]
+
+
+def max_edits(token: str) -> int:
+    n = len(token)
+    return 0 if n <= 4 else (1 if n <= 7 else 2)
+
+
+def _deletes(token: str, k: int) -> Set[str]:
+    out = {token}
+    frontier = {token}
+    for _ in range(k):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        out |= frontier
+    return out
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance, or limit + 1 once it is exceeded."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and prev2 is not None and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class FuzzyCrisisMatcher:
+    """Bounded-edit phrase matcher over a fixed crisis vocabulary."""
+
+    def __init__(self, phrases: Dict[str, str]):
+        # phrase -> level; each phrase is stored as its token tuple
+        self.phrases: Dict[Tuple[str, ...], Tuple[str, str]] = {}
+        self.compounds: Dict[str, Tuple[str, ...]] = {}  # phrase written as one word -> its words
+        for phrase, level in phrases.items():
+            toks = tuple(tokens(phrase))
+            if not toks:
+                continue
+            self._add(toks, phrase, level)
+            joined = ''.join(toks)
+            if len(toks) > 1 and len(joined) >= 6:
+                self._add((joined,), phrase, level)
+                self.compounds[joined] = toks
+        self.joined = {toks[0] for toks in self.phrases if len(toks) == 1}
+        self.max_joined = max(map(len, self.joined), default=0) + 2
+        self.by_first: Dict[str, List[Tuple[str, ...]]] = {}
+        for toks in self.phrases:
+            self.by_first.setdefault(toks[0], []).append(toks)
+        self.vocab = {t for toks in self.phrases for t in toks}
+        self.index: Dict[str, Set[str]] = {}
+        for word in self.vocab:
+            for d in _deletes(word, self.budget(word)):
+                self.index.setdefault(d, set()).add(word)
+
+    def budget(self, word: str) -> int:
+        """Most edits any token may be from ``word`` (sizes the deletion index)."""
+        return min(1, max_edits(word)) if word in self.compounds else max_edits(word)
+
+    def close(self, token: str, word: str) -> bool:
+        """Whether ``token`` is within the edits allowed for ``word``."""
+        if token == word:
+            return True
+        parts = self.compounds.get(word)
+        if parts is None:
+            # Sized by the shorter string: a long token can't buy edits for a short word
+            k = max_edits(token if len(token) < len(word) else word)
+            return edit_distance(token, word, k) <= k
+        for p, part in enumerate(parts):
+            head, tail = ''.join(parts[:p]), ''.join(parts[p + 1:])
+            if (len(part) >= 5 and token.startswith(head) and token.endswith(tail)
+                    and len(token) >= len(head) + len(tail) + 5):
+                if edit_distance(token[len(head):len(token) - len(tail)], part, 1) <= 1:
+                    return True
+        return False
+
+    def _add(self, toks, phrase, level):
+        known = self.phrases.get(toks)
+        if known is None or _LEVEL_RANK.get(level, 0) > _LEVEL_RANK.get(known[1], 0):
+            self.phrases[toks] = (phrase, level)
+
+    @lru_cache(maxsize=8192)
+    def candidates(self, token: str) -> frozenset:
+        """Vocabulary words within their edit budget of ``token``."""
+        found = set()
+        for d in _deletes(token, max_edits(token)):
+            for word in self.index.get(d, ()):
+                if word not in found and self.close(token, word):
+                    found.add(word)
+        # Compounds of crisis words: "killmyself", "selfharmtonight"
+        n = len(token)
+        for i in range(n - 3):
+            if i and token[:i] not in self.vocab:
+                continue
+            for j in range(i + (4 if i == 0 else 5), n + (0 if i == 0 else 1)):
+                if token[i:j] in self.vocab and (j == n or token[j:] in self.vocab):
+                    found.add(token[i:j])
+        return frozenset(found)
+
+    def matches(self, text: str) -> List[Tuple[str, str]]:
+        """(phrase, level) for every phrase found, in order of first appearance."""
+        toks = tokens(text)
+        cands = [self.candidates(t) for t in toks]
+        found: Dict[str, str] = {}
+        for i, first in enumerate(cands):
+            for word in first:
+                for phrase_toks in self.by_first.get(word, ()):
+                    end = i + len(phrase_toks)
+                    if end <= len(toks) and all(p in cands[i + j] for j, p in enumerate(phrase_toks[1:], 1)):
+                        phrase, level = self.phrases[phrase_toks]
+                        if _LEVEL_RANK.get(level, 0) > _LEVEL_RANK.get(found.get(phrase), 0):
+                            found[phrase] = level
+            for span in range(2, MAX_JOIN + 1):
+                joined = ''.join(toks[i:i + span])
+                if i + span > len(toks) or len(joined) > self.max_joined:
+                    break
+                for word in self.candidates(joined) & self.joined:
+                    if word != joined and word not in self.compounds:
+                        continue  # "overdo it" is two words, not a typo of "overdose"
+                    phrase, level = self.phrases[(word,)]
+                    if _LEVEL_RANK.get(level, 0) > _LEVEL_RANK.get(found.get(phrase), 0):
+                        found[phrase] = level
+        return list(found.items())
+
+    def level(self, text: str) -> str:
+        levels = {level for _, level in self.matches(text)}
+        return 'high' if 'high' in levels else ('medium' if 'medium' in levels else 'low')
+
+
+def lexicon_phrases(levels: Iterable[str] = ('high', 'medium')) -> Dict[str, str]:
+    """Crisis phrases from every language pack, phrase -> level."""
+    phrases = {}
+    for level in reversed(tuple(levels)):  # earlier levels win
+        for pack in LEXICONS.values():
+            for phrase in pack.get('crisis', {}).get(level, []):
+                phrases[phrase] = level
+    return phrases
+
+
+_default: Optional[FuzzyCrisisMatcher] = None
+
+
+def get_matcher() -> FuzzyCrisisMatcher:
+    """Process-wide matcher over the lexicon packs (built on first use)."""
+    global _default
+    if _default is None:
+        _default = FuzzyCrisisMatcher(lexicon_phrases())
+    return _default
@@ -0,0 +1,127 @@
+# app/helplines.py — locale-aware crisis helplines from data/helplines.json
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "helplines.json")
+GLOBAL_KEY = "GLOBAL"
+
+
+def _build_index(dataset: Dict) -> Dict[tuple, Dict]:
+    """Flatten the dataset into one lookup table.
+
+    Keys are ("locale", "ES-MX"), ("country", "MX") and ("language", "ES"),
+    so resolving a locale is a handful of dict lookups.
+    """
+    index = {}
+    by_language = {}
+    for code, entry in dataset.items():
+        code = code.upper()
+        entry = dict(entry, code=code)
+        index[("country", code)] = entry
+        for lang in entry.get("languages", []):
+            index[("locale", f"{lang}-{code}".upper())] = entry
+            by_language.setdefault(lang.upper(), entry)
+        for lang in entry.get("default_for", []):
+            by_language[lang.upper()] = entry
+    for lang, entry in by_language.items():
+        index[("language", lang)] = entry
+    return index
+
+
+def fallback_chain(locale: Optional[str]) -> List[tuple]:
+    """'es-MX' -> locale ES-MX, country MX, language ES, then global"""
+    parts = [p for p in (locale or "").replace("_", "-").upper().split("-") if p]
+    chain = []
+    if len(parts) >= 2:
+        chain.append(("locale", f"{parts[0]}-{parts[-1]}"))
+        chain.append(("country", parts[-1]))
+        chain.append(("language", parts[0]))
+    elif parts:
+        # A bare code is usually a language ("es"), sometimes a country ("IN")
+        chain.append(("language", parts[0]))
+        chain.append(("country", parts[0]))
+    chain.append(("country", GLOBAL_KEY))
+    return chain
+
+
+class HelplineResolver:
+    """In-memory helpline index with mtime-based hot reload.
+
+    A daemon thread polls the file's mtime and swaps in a rebuilt index, so
+    `resolve` never touches the disk.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, poll_interval: float = 5.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._mtime = None
+        self._index = {}
+        self.reload()
+        self._stop = threading.Event()
+        if poll_interval > 0:
+            threading.Thread(target=self._watch, name="helpline-watch", daemon=True).start()
+
+    def reload(self) -> bool:
+        """Rebuild the index if the file changed; keeps the old one on errors."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._mtime:
+                return False
+            with open(self.path, "r", encoding="utf-8") as fh:
+                index = _build_index(json.load(fh))
+        except (OSError, ValueError):
+            return False
+        self._index = index
+        self._mtime = mtime
+        return True
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            self.reload()
+
+    def stop(self):
+        self._stop.set()
+
+    def resolve(self, locale: Optional[str]) -> Dict:
+        index = self._index
+        for key in fallback_chain(locale):
+            if key in index:
+                return index[key]
+        return {"code": GLOBAL_KEY, "country": "International", "emergency": None, "suicide_hotline": None}
+
+    def locales(self) -> List[str]:
+        """Locale codes present in the dataset, e.g. 'es-MX'."""
+        codes = [k.split("-") for kind, k in self._index if kind == "locale"]
+        return [f"{lang.lower()}-{cc}" for lang, cc in sorted(codes, key=lambda p: (p[1], p[0]))]
+
+    def lines(self, locale: Optional[str]) -> List[str]:
+        """Bullet-ready contact lines for the resolved region."""
+        entry = self.resolve(locale)
+        lines = []
+        if entry.get("suicide_hotline"):
+            lines.append(f"Crisis line ({entry['country']}): {entry['suicide_hotline']}")
+        if entry.get("text_line"):
+            lines.append(f"Crisis Text Line: {entry['text_line']}")
+        if entry.get("emergency"):
+            lines.append(f"Emergency Services: {entry['emergency']}")
+        else:
+            lines.append("Emergency Services: your local emergency number")
+        if entry.get("website"):
+            lines.append(f"Find a helpline near you: {entry['website']}")
+        return lines
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def get_resolver() -> HelplineResolver:
+    """Process-wide resolver, loaded once on first use."""
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                _resolver = HelplineResolver()
+    return _resolver
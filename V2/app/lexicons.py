@@ -0,0 +1,385 @@
+# app/lexicons.py — per-language keyword packs and a character n-gram language router
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+# Each pack mirrors the English keyword tables the companion started with.
+# Matching is substring-based on folded (lower-cased, accent-stripped) text,
+# exactly like the original English analyzer.
+LEXICONS = {
+    'en': {
+        'emotions': {
+            'joy': ['happy', 'excited', 'great', 'good', 'wonderful', 'amazing', 'love', 'joy', 'fantastic'],
+            'sadness': ['sad', 'depressed', 'unhappy', 'miserable', 'cry', 'tears', 'hurt', 'lonely', 'down'],
+            'anger': ['angry', 'mad', 'furious', 'annoyed', 'frustrated', 'hate', 'rage', 'upset'],
+            'fear': ['scared', 'afraid', 'anxious', 'worried', 'nervous', 'panic', 'fear', 'terrified'],
+            'surprise': ['surprised', 'shocked', 'amazed', 'unexpected', 'wow', 'astonished'],
+            'disgust': ['disgusted', 'gross', 'dislike', 'hate', 'awful', 'revolting']
+        },
+        'crisis': {
+            'high': ["kill myself", "end it all", "suicide", "end my life", "want to die"],
+            'medium': ["hurt myself", "self harm", "can't cope", "breaking down", "overwhelmed"]
+        },
+        'topics': {
+            'work': ['work', 'job', 'career', 'office', 'boss', 'colleague', 'workplace'],
+            'projects': ['project', 'assignment', 'task', 'deadline', 'homework'],
+            'relationships': ['friend', 'partner', 'family', 'relationship', 'boyfriend', 'girlfriend', 'husband', 'wife'],
+            'health': ['health', 'sick', 'tired', 'sleep', 'exercise', 'doctor', 'hospital'],
+            'hobbies': ['hobby', 'interest', 'game', 'music', 'sport', 'art', 'reading', 'movie'],
+            'school': ['school', 'college', 'university', 'class', 'exam', 'test', 'study']
+        },
+        # Topics that pick a contextual follow-up reply
+        'followup_topics': {
+            'work': ['work', 'job', 'career', 'boss', 'colleague', 'workplace'],
+            'projects': ['project', 'assignment', 'deadline', 'homework', 'task'],
+            'relationships': ['friend', 'partner', 'relationship', 'boyfriend', 'girlfriend', 'family'],
+            'health': ['health', 'sick', 'tired', 'sleep', 'exercise', 'doctor'],
+            'school': ['school', 'college', 'university', 'class', 'exam', 'study']
+        },
+        'interests': ['book', 'movie', 'music', 'game', 'sport', 'travel', 'food', 'art', 'reading', 'writing'],
+        'greetings': [
+            'hi', 'hello', 'hey', 'hi there', 'hello there', 'hey there',
+            'good morning', 'good afternoon', 'good evening'
+        ],
+        'emotion_words': ['sad', 'happy', 'angry', 'scared', 'excited', 'worried', 'stressed'],
+        'sample': (
+            "i feel so tired and i don't know what to do about my work. "
+            "my friends have been there for me but it is still hard to sleep at night. "
+            "the exam is tomorrow and i am worried that i will fail. "
+            "thank you for listening, it helps to talk with someone who cares about how i am doing."
+        )
+    },
+    'es': {
+        'emotions': {
+            'joy': ['feliz', 'contento', 'contenta', 'alegre', 'alegria', 'genial', 'maravilloso', 'me encanta', 'emocionado', 'emocionada'],
+            'sadness': ['triste', 'deprimido', 'deprimida', 'infeliz', 'llorar', 'lloro', 'lagrimas', 'soledad', 'dolido', 'dolida'],
+            'anger': ['enojado', 'enojada', 'furioso', 'furiosa', 'molesto', 'molesta', 'odio', 'rabia', 'frustrado', 'frustrada'],
+            'fear': ['miedo', 'asustado', 'asustada', 'ansioso', 'ansiosa', 'ansiedad', 'nervioso', 'nerviosa', 'panico', 'preocupado', 'preocupada'],
+            'surprise': ['sorprendido', 'sorprendida', 'sorpresa', 'increible', 'inesperado'],
+            'disgust': ['asco', 'asqueroso', 'repugnante', 'odio']
+        },
+        'crisis': {
+            'high': ['suicidio', 'suicidarme', 'matarme', 'quitarme la vida', 'quiero morir', 'acabar con todo', 'no quiero vivir'],
+            'medium': ['hacerme dano', 'autolesion', 'no puedo mas', 'abrumado', 'abrumada']
+        },
+        'topics': {
+            'work': ['trabajo', 'empleo', 'jefe', 'oficina', 'companero de trabajo'],
+            'projects': ['proyecto', 'tarea', 'entrega', 'fecha limite'],
+            'relationships': ['amigo', 'amiga', 'pareja', 'familia', 'novio', 'novia', 'esposo', 'esposa'],
+            'health': ['salud', 'enfermo', 'enferma', 'cansado', 'cansada', 'dormir', 'medico', 'hospital'],
+            'hobbies': ['pasatiempo', 'musica', 'pelicula', 'juego', 'deporte', 'lectura'],
+            'school': ['escuela', 'colegio', 'universidad', 'clase', 'examen', 'estudiar']
+        },
+        'interests': ['libro', 'pelicula', 'musica', 'juego', 'deporte', 'viaje', 'comida', 'lectura', 'escribir'],
+        'greetings': ['hola', 'buenos dias', 'buenas tardes', 'buenas noches'],
+        'sample': (
+            "me siento muy cansado y no se que hacer con mi trabajo. "
+            "mis amigos estan conmigo pero todavia me cuesta dormir por la noche. "
+            "el examen es manana y tengo miedo de que voy a reprobar. "
+            "gracias por escucharme, me ayuda hablar con alguien que se preocupa por como estoy."
+        )
+    },
+    'fr': {
+        'emotions': {
+            'joy': ['heureux', 'heureuse', 'content', 'joie', 'genial', 'merveilleux', 'ravi', 'ravie'],
+            'sadness': ['triste', 'deprime', 'malheureux', 'malheureuse', 'pleurer', 'pleure', 'larmes', 'solitude', 'isole'],
+            'anger': ['en colere', 'fache', 'furieux', 'furieuse', 'enerve', 'frustre', 'deteste', 'rage'],
+            'fear': ['peur', 'effraye', 'anxieux', 'anxieuse', 'angoisse', 'inquiet', 'inquiete', 'nerveux', 'nerveuse', 'panique'],
+            'surprise': ['surpris', 'choque', 'inattendu', 'etonne'],
+            'disgust': ['degoute', 'degoutant', 'repugnant', 'ecoeure']
+        },
+        'crisis': {
+            'high': ['suicide', 'me tuer', 'mettre fin a mes jours', 'en finir', 'je veux mourir', 'envie de mourir'],
+            'medium': ['me faire du mal', 'automutilation', "je n'en peux plus", 'submerge', 'je craque']
+        },
+        'topics': {
+            'work': ['travail', 'boulot', 'patron', 'bureau', 'collegue'],
+            'projects': ['projet', 'devoir', 'echeance', 'date limite'],
+            'relationships': ['ami', 'copain', 'copine', 'famille', 'partenaire', 'mari', 'couple'],
+            'health': ['sante', 'malade', 'fatigue', 'sommeil', 'medecin', 'hopital'],
+            'hobbies': ['loisir', 'musique', 'film', 'jeu', 'lecture'],
+            'school': ['ecole', 'universite', 'fac', 'cours', 'examen', 'etudier']
+        },
+        'interests': ['livre', 'film', 'musique', 'jeu', 'voyage', 'cuisine', 'lecture', 'ecriture'],
+        'greetings': ['bonjour', 'salut', 'bonsoir', 'coucou'],
+        'sample': (
+            "je me sens tres fatigue et je ne sais pas quoi faire avec mon travail. "
+            "mes amis sont la pour moi mais j'ai encore du mal a dormir la nuit. "
+            "l'examen est demain et j'ai peur de ne pas reussir. "
+            "merci de m'ecouter, cela m'aide de parler avec quelqu'un qui se soucie de moi."
+        )
+    },
+    'hi': {
+        'emotions': {
+            'joy': ['खुश', 'ख़ुश', 'आनंद', 'बढ़िया', 'प्यार'],
+            'sadness': ['उदास', 'दुखी', 'दुख', 'रोना', 'रो रहा', 'रो रही', 'अकेला', 'अकेली', 'आंसू'],
+            'anger': ['गुस्सा', 'नाराज', 'नाराज़', 'चिढ़', 'नफरत', 'नफ़रत'],
+            'fear': ['डर', 'चिंता', 'घबराहट', 'घबरा', 'बेचैन'],
+            'surprise': ['हैरान', 'चौंक'],
+            'disgust': ['घिन', 'घृणा']
+        },
+        'crisis': {
+            'high': ['आत्महत्या', 'खुद को मार', 'अपनी जान ले', 'मरना चाहता', 'मरना चाहती', 'जीना नहीं चाहता', 'जीना नहीं चाहती'],
+            'medium': ['खुद को नुकसान', 'खुद को चोट', 'सहन नहीं', 'टूट गया', 'टूट गई']
+        },
+        'topics': {
+            'work': ['काम', 'नौकरी', 'ऑफिस', 'दफ्तर', 'बॉस'],
+            'projects': ['प्रोजेक्ट', 'असाइनमेंट', 'डेडलाइन', 'होमवर्क'],
+            'relationships': ['दोस्त', 'परिवार', 'पति', 'पत्नी', 'रिश्ता', 'रिश्ते'],
+            'health': ['सेहत', 'स्वास्थ्य', 'बीमार', 'थका', 'थकी', 'नींद', 'डॉक्टर', 'अस्पताल'],
+            'hobbies': ['शौक', 'संगीत', 'गाना', 'फिल्म', 'खेल'],
+            'school': ['स्कूल', 'कॉलेज', 'पढ़ाई', 'परीक्षा', 'इम्तिहान', 'क्लास']
+        },
+        'interests': ['किताब', 'फिल्म', 'संगीत', 'खेल', 'यात्रा', 'खाना', 'कला'],
+        'greetings': ['नमस्ते', 'नमस्कार', 'हैलो'],
+        'script': 'DEVANAGARI'
+    },
+    'ar': {
+        'emotions': {
+            'joy': ['سعيد', 'فرحان', 'مبسوط', 'رائع', 'احب'],
+            'sadness': ['حزين', 'مكتئب', 'ابكي', 'دموع', 'وحيد'],
+            'anger': ['غاضب', 'زعلان', 'منزعج', 'اكره', 'غضب'],
+            'fear': ['خائف', 'قلق', 'متوتر', 'خوف', 'ذعر'],
+            'surprise': ['متفاجئ', 'مندهش', 'صدمه'],
+            'disgust': ['مقرف', 'قرف', 'مقزز']
+        },
+        'crisis': {
+            'high': ['انتحار', 'اقتل نفسي', 'انهي حياتي', 'اريد ان اموت', 'بدي موت'],
+            'medium': ['اوذي نفسي', 'ايذاء النفس', 'لا استطيع التحمل', 'منهار']
+        },
+        'topics': {
+            'work': ['عمل', 'شغل', 'وظيفه', 'مدير', 'مكتب'],
+            'projects': ['مشروع', 'واجب', 'موعد نهائي'],
+            'relationships': ['صديق', 'عائله', 'زوج', 'اهلي'],
+            'health': ['صحه', 'مريض', 'تعبان', 'نوم', 'طبيب', 'مستشفي'],
+            'hobbies': ['هوايه', 'موسيقي', 'فيلم', 'لعبه', 'رياضه', 'قراءه'],
+            'school': ['مدرسه', 'جامعه', 'امتحان', 'دراسه']
+        },
+        'interests': ['كتاب', 'فيلم', 'موسيقي', 'لعبه', 'رياضه', 'سفر', 'طعام', 'فن', 'قراءه', 'كتابه'],
+        'greetings': ['مرحبا', 'السلام عليكم', 'اهلا', 'صباح الخير', 'مساء الخير'],
+        'script': 'ARABIC'
+    },
+    'sw': {
+        'emotions': {
+            'joy': ['furaha', 'nimefurahi', 'nafurahi', 'vizuri sana', 'upendo', 'napenda'],
+            'sadness': ['huzuni', 'najisikia vibaya', 'kulia', 'machozi', 'upweke', 'sina raha'],
+            'anger': ['hasira', 'nimekasirika', 'kukasirika', 'chuki', 'nachukia'],
+            'fear': ['hofu', 'naogopa', 'woga', 'wasiwasi'],
+            'surprise': ['nimeshangaa', 'mshangao'],
+            'disgust': ['kinyaa', 'karaha']
+        },
+        'crisis': {
+            'high': ['kujiua', 'nataka kufa', 'kujitoa uhai', 'kumaliza maisha yangu'],
+            'medium': ['kujidhuru', 'kujiumiza', 'siwezi tena', 'nimelemewa']
+        },
+        'topics': {
+            'work': ['kazi', 'ofisi', 'bosi'],
+            'projects': ['mradi', 'zoezi'],
+            'relationships': ['rafiki', 'familia', 'mpenzi', 'mume', 'ndugu'],
+            'health': ['afya', 'mgonjwa', 'nimechoka', 'usingizi', 'daktari', 'hospitali'],
+            'hobbies': ['muziki', 'filamu', 'mchezo', 'michezo'],
+            'school': ['shule', 'chuo', 'darasa', 'mtihani', 'kusoma']
+        },
+        'interests': ['kitabu', 'filamu', 'muziki', 'mchezo', 'safari', 'chakula', 'sanaa', 'kuandika'],
+        'greetings': ['habari', 'jambo', 'hujambo', 'mambo', 'shikamoo'],
+        'sample': (
+            "najisikia nimechoka sana na sijui nifanye nini kuhusu kazi yangu. "
+            "marafiki zangu wako pamoja nami lakini bado ni vigumu kulala usiku. "
+            "mtihani ni kesho na nina wasiwasi kwamba nitashindwa. "
+            "asante kwa kunisikiliza, inanisaidia kuzungumza na mtu anayejali hali yangu."
+        )
+    }
+}
+
+BASE_LANGUAGE = 'en'
+
+_NON_WORD = re.compile(r"[^\w']+")
+
+_ARABIC_FOLD = str.maketrans({'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ى': 'ي', 'ة': 'ه', 'ؤ': 'و', 'ئ': 'ي'})
+
+
+def fold(text: str, script: Optional[str] = None) -> str:
+    """Lower-case and strip accents so 'Pánico' matches 'panico'.
+
+    Combining marks are only dropped for Latin and Arabic text; Devanagari
+    vowel signs are combining marks too and carry meaning.
+    """
+    text = text.lower()
+    if script == 'DEVANAGARI':
+        return unicodedata.normalize('NFC', text)
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    if script == 'ARABIC':
+        stripped = stripped.translate(_ARABIC_FOLD)
+    return unicodedata.normalize('NFC', stripped)
+
+
+class CompiledLexicon:
+    """One language's pack plus the English base, pre-folded into tuples.
+
+    Native keywords match as substrings, like the original analyzer. For
+    non-English packs the English base is also checked, but only as whole
+    words, so code-switched messages ("estoy tan stressed") still register
+    while "estresado" does not count as "sad".
+    """
+
+    __slots__ = ('lang', 'script', 'emotions', 'crisis', 'topics', 'followup_topics',
+                 'interests', 'greetings', 'emotion_words')
+
+    def __init__(self, lang: str):
+        pack = LEXICONS[lang]
+        base = LEXICONS[BASE_LANGUAGE] if lang != BASE_LANGUAGE else {}
+        self.lang = lang
+        self.script = pack.get('script')
+
+        def words_of(p, key, fallback=None):
+            table = p.get(key)
+            if table is None and fallback is not None:
+                table = p.get(fallback)
+            return table or {}
+
+        def compile_map(key, fallback=None):
+            native = words_of(pack, key, fallback)
+            extra = words_of(base, key, fallback) if base else {}
+            return {
+                name: (self._fold_words(native.get(name, []), pack), self._fold_words(extra.get(name, []), base))
+                for name in list(native) + [n for n in extra if n not in native]
+            }
+
+        def compile_list(key, fallback=None):
+            def flat(p):
+                if not p:
+                    return []
+                if key in p:
+                    return p[key]
+                return [w for group in p.get(fallback, {}).values() for w in group]
+            return (self._fold_words(flat(pack), pack), self._fold_words(flat(base), base))
+
+        self.emotions = compile_map('emotions')
+        self.crisis = compile_map('crisis')
+        self.topics = compile_map('topics')
+        self.followup_topics = compile_map('followup_topics', fallback='topics')
+        self.interests = compile_list('interests')
+        self.greetings = compile_list('greetings')
+        self.emotion_words = compile_list('emotion_words', fallback='emotions')
+
+    @staticmethod
+    def _fold_words(words, pack):
+        return tuple(dict.fromkeys(fold(w, pack.get('script')) for w in words))
+
+    def fold(self, text: str) -> str:
+        return fold(text, self.script)
+
+    @staticmethod
+    def _padded(text: str) -> str:
+        return f" {_NON_WORD.sub(' ', text)} "
+
+    def hits(self, text: str, words) -> List[str]:
+        """Keywords from a compiled (native, base) pair found in folded text."""
+        native, base = words
+        found = [w for w in native if w in text]
+        if base:
+            padded = self._padded(text)
+            found.extend(w for w in base if f" {w} " in padded and w not in found)
+        return found
+
+    def emotion_scores(self, text: str) -> Dict[str, int]:
+        return {emotion: len(self.hits(text, words)) for emotion, words in self.emotions.items()}
+
+    def crisis_level(self, text: str) -> str:
+        for level in ('high', 'medium'):
+            if level in self.crisis and self.hits(text, self.crisis[level]):
+                return level
+        return 'low'
+
+    def matching_topics(self, text: str, followup: bool = False) -> List[str]:
+        table = self.followup_topics if followup else self.topics
+        return [topic for topic, words in table.items() if self.hits(text, words)]
+
+    def matching_interests(self, text: str) -> List[str]:
+        return self.hits(text, self.interests)
+
+    def is_greeting(self, text: str) -> bool:
+        return bool(self.hits(text, self.greetings))
+
+    def has_emotion_words(self, text: str) -> bool:
+        return bool(self.hits(text, self.emotion_words))
+
+
+class LanguageRouter:
+    """Tiny language identifier for the packs above.
+
+    Non-Latin scripts are decided by code point ranges; Latin-script
+    languages by character trigram log-likelihood against profiles built
+    from each pack's sample text and keywords. English wins ties and
+    messages with no signal.
+    """
+
+    SCRIPT_RANGES = (
+        ('DEVANAGARI', 0x0900, 0x097F),
+        ('ARABIC', 0x0600, 0x06FF),
+    )
+
+    def __init__(self, n: int = 3, margin: float = 0.15, min_ngrams: int = 4):
+        self.n = n
+        self.margin = margin
+        self.min_ngrams = min_ngrams
+        self.script_langs = {p['script']: lang for lang, p in LEXICONS.items() if p.get('script')}
+        self.profiles = {}
+        for lang, pack in LEXICONS.items():
+            if pack.get('script'):
+                continue
+            words = [pack.get('sample', '')]
+            for table in ('emotions', 'crisis', 'topics'):
+                for group in pack[table].values():
+                    words.extend(group)
+            words.extend(pack['greetings'])
+            counts = Counter(self._ngrams(fold(' '.join(words))))
+            total = sum(counts.values())
+            vocab = len(counts) + 1
+            self.profiles[lang] = (
+                {g: math.log((c + 1) / (total + vocab)) for g, c in counts.items()},
+                math.log(1 / (total + vocab)),
+            )
+
+    def _ngrams(self, text: str):
+        padded = f' {" ".join(text.split())} '
+        return [padded[i:i + self.n] for i in range(len(padded) - self.n + 1)]
+
+    def script_of(self, text: str) -> Optional[str]:
+        counts = Counter()
+        for ch in text:
+            cp = ord(ch)
+            if cp < 0x0600:
+                continue
+            for name, lo, hi in self.SCRIPT_RANGES:
+                if lo <= cp <= hi:
+                    counts[name] += 1
+                    break
+        return counts.most_common(1)[0][0] if counts else None
+
+    def detect(self, text: str) -> str:
+        script = self.script_of(text)
+        if script in self.script_langs:
+            return self.script_langs[script]
+        grams = self._ngrams(fold(text))
+        if len(grams) < self.min_ngrams:
+            return BASE_LANGUAGE
+        scores = {}
+        for lang, (logp, unseen) in self.profiles.items():
+            scores[lang] = sum(logp.get(g, unseen) for g in grams) / len(grams)
+        best = max(scores, key=scores.get)
+        if best != BASE_LANGUAGE and scores[best] - scores[BASE_LANGUAGE] < self.margin:
+            return BASE_LANGUAGE
+        return best
+
+
+COMPILED = {lang: CompiledLexicon(lang) for lang in LEXICONS}
+ROUTER = LanguageRouter()
+
+
+def route(text: str) -> CompiledLexicon:
+    """Pick the compiled lexicon for a message."""
+    return COMPILED[ROUTER.detect(text)]
@@ -0,0 +1,303 @@
+# app/memwatch.py — per-session memory accounting and leak hunting
+#
+# Streamlit keeps every session's state in the server process until the
+# session is dropped, so a pod grows with its sessions. Each run the UI
+# records what its session holds, per component (transcript, rendered
+# transcript HTML, CompanionNLP, the rest of st.session_state), in a
+# process-wide ledger. The ledger keeps a weak reference to the session's
+# companion: once Streamlit releases the session its entry disappears, so
+# sessions that stay held long after their last run are what to look at.
+#
+# Temp audio is tracked by scanning the spool dirs registered with watch()
+# (the TTS and STT queues' own dirs, never the shared temp root); a file
+# older than a few minutes that no live request still owns was never read
+# back and deleted. tracemalloc is opt-in: it costs memory and time on
+# every allocation, so it only runs while switched on from the debug panel,
+# and each check diffs against the previous snapshot. The panel itself
+# shows every session's footprint and can delete files, so it is only
+# rendered when CHATBOT_DEBUG_PANEL is set.
+import glob
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import types
+import weakref
+from array import array
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .lexicons import LEXICONS
+from .transcript import Transcript
+
+ORPHAN_AGE = 300  # seconds; WAVs are normally read back within a few
+IDLE_AFTER = 1800  # a session this quiet that is still held is suspicious
+DEBUG_PANEL_ENV = "CHATBOT_DEBUG_PANEL"
+_OPAQUE = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+           types.MethodType, weakref.ref, threading.Thread)
+_shared: Optional[frozenset] = None
+
+
+def _shared_ids() -> frozenset:
+    # Process-wide tables sessions point into (the lexicon packs); not theirs to count
+    global _shared
+    if _shared is None:
+        ids, stack = set(), [LEXICONS]
+        while stack:
+            obj = stack.pop()
+            if id(obj) in ids:
+                continue
+            ids.add(id(obj))
+            if isinstance(obj, dict):
+                stack.extend(obj.values())
+            elif isinstance(obj, (list, tuple, set, frozenset)):
+                stack.extend(obj)
+        _shared = frozenset(ids)
+    return _shared
+
+
+def deep_sizeof(obj, seen: Optional[set] = None) -> int:
+    """Bytes reachable from ``obj``; objects already in ``seen`` are not counted again."""
+    seen = set(_shared_ids()) if seen is None else seen
+    total, stack = 0, [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _OPAQUE):
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, Transcript):
+            total += obj.nbytes()
+            continue
+        total += sys.getsizeof(obj)
+        if isinstance(obj, (str, bytes, bytearray, int, float, array)):
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            stack.extend(obj)
+        else:
+            attrs = getattr(obj, "__dict__", None)
+            if attrs is not None:
+                stack.append(attrs)
+            for cls in type(obj).__mro__:
+                for name in getattr(cls, "__slots__", ()):
+                    if hasattr(obj, name):
+                        stack.append(getattr(obj, name))
+    return total
+
+
+def debug_panel_enabled() -> bool:
+    """Whether the UI may show the memory panel (operators only; off by default)."""
+    return os.environ.get(DEBUG_PANEL_ENV, "").strip().lower() in ("1", "true", "on", "yes")
+
+
+def process_rss() -> int:
+    """Resident set size of this process in bytes (0 where /proc is missing)."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class MemoryLedger:
+    """Latest per-component sizes of every live session in the process."""
+
+    def __init__(self, idle_after: float = IDLE_AFTER, orphan_age: float = ORPHAN_AGE):
+        self.idle_after = idle_after
+        self.orphan_age = orphan_age
+        self.spool_dirs: Dict[str, Optional[Callable[[], Iterable[str]]]] = {}
+        self._sessions: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._baseline = None
+        self._last = None
+
+    # -- sessions -------------------------------------------------------------
+
+    def measure(self, state, html_bytes: int = 0, skip: Iterable[str] = (), shared: Iterable = ()) -> Dict[str, int]:
+        """Component sizes for one session's state (st.session_state or a dict).
+
+        The transcript is counted once even though the companion reads it too;
+        ``html_bytes`` is the markup the UI rendered for it this run. Objects
+        in ``shared`` (a tokenizer, a model) are referenced but not counted.
+        """
+        seen = set(_shared_ids())
+        seen.update(id(obj) for obj in shared)
+        sizes = {}
+        transcript = state.get("conversation")
+        if transcript is not None:
+            sizes["transcript"] = deep_sizeof(transcript, seen)
+        sizes["transcript_html"] = html_bytes
+        companion = state.get("companion")
+        if companion is not None:
+            sizes["companion"] = deep_sizeof(companion, seen)
+        rest = {k: v for k, v in state.items() if k not in ("conversation", "companion") and k not in skip}
+        for key, value in rest.items():
+            sizes[f"state.{key}"] = deep_sizeof(value, seen)
+        return sizes
+
+    def record(self, session_id: str, sizes: Dict[str, int], owner=None):
+        """Store a session's sizes; ``owner`` is weakly held and marks when the session is released."""
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                entry = self._sessions[session_id] = {"first": now, "first_bytes": sum(sizes.values())}
+            entry["updated"] = now
+            entry["sizes"] = dict(sizes)
+            if owner is not None:
+                entry["owner"] = weakref.ref(owner)
+
+    def forget(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _prune(self):
+        for sid in [sid for sid, e in self._sessions.items() if "owner" in e and e["owner"]() is None]:
+            del self._sessions[sid]
+
+    def sessions(self) -> List[dict]:
+        """One row per held session, largest first."""
+        now = time.time()
+        with self._lock:
+            self._prune()
+            rows = []
+            for sid, entry in self._sessions.items():
+                total = sum(entry["sizes"].values())
+                rows.append({
+                    "session": sid,
+                    "bytes": total,
+                    "growth": total - entry["first_bytes"],
+                    "idle_s": round(now - entry["updated"]),
+                    "components": entry["sizes"],
+                })
+        rows.sort(key=lambda row: row["bytes"], reverse=True)
+        return rows
+
+    # -- temp files -----------------------------------------------------------
+
+    def watch(self, directory: Optional[str], live: Optional[Callable[[], Iterable[str]]] = None):
+        """Scan ``directory`` (a queue's own spool dir) for leftovers.
+
+        ``live`` returns the paths its owner is still working on (e.g.
+        ``SpeechQueue.live_paths``); those are never reported or swept.
+        """
+        if directory:
+            with self._lock:
+                self.spool_dirs[directory] = live
+
+    def orphans(self, min_age: Optional[float] = None) -> List[dict]:
+        """Files in the watched spool dirs older than ``min_age`` seconds that nobody deleted."""
+        cutoff = time.time() - (self.orphan_age if min_age is None else min_age)
+        with self._lock:
+            spool_dirs = list(self.spool_dirs.items())
+        paths, busy = set(), set()
+        for directory, live in spool_dirs:
+            paths.update(glob.glob(os.path.join(directory, "*")))
+            if live is not None:
+                busy.update(live())
+        found = []
+        for path in paths - busy:
+            try:
+                st = os.stat(path)
+            except OSError:  # deleted while scanning
+                continue
+            if st.st_mtime < cutoff and os.path.isfile(path):
+                found.append({"path": path, "bytes": st.st_size, "age_s": round(time.time() - st.st_mtime)})
+        found.sort(key=lambda row: row["age_s"], reverse=True)
+        return found
+
+    def sweep(self, min_age: Optional[float] = None) -> int:
+        """Delete orphaned temp files; returns how many were removed."""
+        removed = 0
+        for row in self.orphans(min_age):
+            try:
+                os.unlink(row["path"])
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+    # -- tracemalloc ----------------------------------------------------------
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start_tracing(self, frames: int = 8):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self._baseline = self._last = self._snapshot()
+
+    def stop_tracing(self):
+        self._baseline = self._last = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @staticmethod
+    def _snapshot():
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def heap_diff(self, limit: int = 15, since_start: bool = False) -> List[dict]:
+        """Top allocation sites by growth since the previous check (or since tracing started)."""
+        if not tracemalloc.is_tracing() or self._last is None:
+            return []
+        snapshot = self._snapshot()
+        stats = snapshot.compare_to(self._baseline if since_start else self._last, "lineno")
+        self._last = snapshot
+        rows = []
+        for stat in stats[:limit]:
+            frame = stat.traceback[0]
+            rows.append({
+                "where": f"{os.path.relpath(frame.filename)}:{frame.lineno}",
+                "size_diff": stat.size_diff,
+                "count_diff": stat.count_diff,
+                "size": stat.size,
+            })
+        return rows
+
+    # -- summary --------------------------------------------------------------
+
+    def metrics(self) -> Dict[str, int]:
+        """Flat gauges for the debug panel or a scraper."""
+        rows = self.sessions()
+        orphans = self.orphans()
+        metrics = {
+            "process_rss_bytes": process_rss(),
+            "sessions_held": len(rows),
+            "sessions_idle": sum(1 for row in rows if row["idle_s"] > self.idle_after),
+            "session_bytes_total": sum(row["bytes"] for row in rows),
+            "session_bytes_max": max((row["bytes"] for row in rows), default=0),
+            "orphan_files": len(orphans),
+            "orphan_bytes": sum(row["bytes"] for row in orphans),
+        }
+        components: Dict[str, int] = {}
+        for row in rows:
+            for name, size in row["components"].items():
+                components[name] = components.get(name, 0) + size
+        for name, size in components.items():
+            metrics[f"component_bytes.{name}"] = size
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            metrics["traced_bytes"] = current
+            metrics["traced_peak_bytes"] = peak
+        return metrics
+
+
+_default: Optional[MemoryLedger] = None
+_default_lock = threading.Lock()
+
+
+def get_ledger() -> MemoryLedger:
+    """Process-wide ledger shared by every session (and by FINAL through app/v2.py)."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = MemoryLedger()
+        return _default
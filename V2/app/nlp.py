@@ -1,26 +1,27 @@
 import re
 import random
-import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional
 import time
 
+from .fuzzy import get_matcher
+from .helplines import get_resolver
+from .lexicons import LEXICONS, route
+from .transcript import Transcript
+
 class CompanionNLP:
-    def __init__(self):
+    def __init__(self, transcript: Optional[Transcript] = None):
         print("Loading ultra-light companion AI...")
         
-        # Simple sentiment analysis using keyword matching
-        self.emotion_keywords = {
-            'joy': ['happy', 'excited', 'great', 'good', 'wonderful', 'amazing', 'love', 'joy', 'fantastic'],
-            'sadness': ['sad', 'depressed', 'unhappy', 'miserable', 'cry', 'tears', 'hurt', 'lonely', 'down'],
-            'anger': ['angry', 'mad', 'furious', 'annoyed', 'frustrated', 'hate', 'rage', 'upset'],
-            'fear': ['scared', 'afraid', 'anxious', 'worried', 'nervous', 'panic', 'fear', 'terrified'],
-            'surprise': ['surprised', 'shocked', 'amazed', 'unexpected', 'wow', 'astonished'],
-            'disgust': ['disgusted', 'gross', 'dislike', 'hate', 'awful', 'revolting']
-        }
+        # Simple sentiment analysis using keyword matching; per-language
+        # packs live in app/lexicons.py and are picked per message
+        self.emotion_keywords = LEXICONS['en']['emotions']
         
-        # Conversation memory
-        self.conversation_history = []
+        # Region for crisis helplines, e.g. "en-US", "es-MX", "hi"
+        self.locale = "en-US"
+        
+        # Conversation memory; the UI passes its own transcript so turns are stored once
         self.max_history = 8
+        self.transcript = transcript if transcript is not None else Transcript(max_messages=2 * self.max_history)
         
         # Companion personality
         self.companion_traits = {
@@ -35,98 +36,87 @@ class CompanionNLP:
 
     def analyze_sentiment(self, text: str) -> Dict:
         """Lightweight sentiment analysis using keyword matching"""
-        text_lower = text.lower()
+        lexicon = route(text)
+        text_lower = lexicon.fold(text)
         
         # Special case for greetings and simple messages
-        if self._is_greeting(text_lower):
+        if self._is_greeting(text_lower, lexicon):
             return {
                 'dominant_emotion': 'neutral',
                 'emotion_scores': {'neutral': 1.0},
                 'crisis_level': 'low',
-                'confidence': 1.0
+                'confidence': 1.0,
+                'language': lexicon.lang
             }
         
-        emotion_scores = {}
-        
-        for emotion, keywords in self.emotion_keywords.items():
-            score = sum(1 for keyword in keywords if keyword in text_lower)
-            emotion_scores[emotion] = score
+        emotion_scores = lexicon.emotion_scores(text_lower)
         
         # Find dominant emotion
         dominant_emotion = max(emotion_scores.items(), key=lambda x: x[1])
         
-        # Crisis detection
-        crisis_level = self._detect_crisis_level(text)
+        # Crisis detection; typos and obfuscation ("suicde", "k!ll myself") go through the fuzzy index
+        crisis_level = lexicon.crisis_level(text_lower)
+        if crisis_level == 'low':
+            crisis_level = get_matcher().level(text)
         
         return {
             'dominant_emotion': dominant_emotion[0] if dominant_emotion[1] > 0 else 'neutral',
             'emotion_scores': emotion_scores,
             'crisis_level': crisis_level,
-            'confidence': min(1.0, dominant_emotion[1] / 5.0)
+            'confidence': min(1.0, dominant_emotion[1] / 5.0),
+            'language': lexicon.lang
         }
 
-    def _is_greeting(self, text: str) -> bool:
+    def _is_greeting(self, text: str, lexicon=None) -> bool:
         """Check if message is a simple greeting"""
-        greetings = [
-            'hi', 'hello', 'hey', 'hi there', 'hello there', 'hey there',
-            'good morning', 'good afternoon', 'good evening'
-        ]
-        return any(greeting in text for greeting in greetings) and len(text.split()) <= 4
+        lexicon = lexicon or route(text)
+        return lexicon.is_greeting(text) and len(text.split()) <= 4
 
     def _detect_crisis_level(self, text: str) -> str:
         """Crisis detection"""
-        crisis_keywords = {
-            'high': ["kill myself", "end it all", "suicide", "end my life", "want to die"],
-            'medium': ["hurt myself", "self harm", "can't cope", "breaking down", "overwhelmed"]
-        }
-        
-        text_lower = text.lower()
-        for level, keywords in crisis_keywords.items():
-            if any(keyword in text_lower for keyword in keywords):
-                return level
-        return 'low'
+        lexicon = route(text)
+        level = lexicon.crisis_level(lexicon.fold(text))
+        return level if level != 'low' else get_matcher().level(text)
+
+    @property
+    def conversation_history(self):
+        """Last max_history exchanges (user, bot, emotion, ts), read from the transcript"""
+        return self.transcript.exchanges(self.max_history)
 
     def update_conversation_history(self, user_message: str, bot_response: str, emotion: str):
         """Maintain conversation context"""
-        self.conversation_history.append({
-            'user': user_message,
-            'bot': bot_response,
-            'emotion': emotion,
-            'timestamp': datetime.datetime.now().isoformat()
-        })
-        
-        if len(self.conversation_history) > self.max_history:
-            self.conversation_history.pop(0)
+        now = time.time()
+        self.transcript.append('user', user_message, ts=now)
+        self.transcript.append('companion', bot_response, emotion=emotion, ts=now)
         
         # Extract topics and interests
         self._extract_conversation_insights(user_message)
 
+    def restore_history(self, messages: List[Dict]):
+        """Rebuild recent context from stored messages (oldest first)"""
+        self.transcript.extend(messages)
+        history = self.transcript.exchanges()
+        for exchange in history:
+            self._extract_conversation_insights(exchange.user)
+        if history:
+            self.companion_traits["first_interaction"] = False
+
     def _extract_conversation_insights(self, message: str):
         """Extract topics and user interests"""
-        message_lower = message.lower()
+        lexicon = route(message)
+        message_lower = lexicon.fold(message)
         
         # Topics
-        topics = {
-            'work': ['work', 'job', 'career', 'office', 'boss', 'colleague', 'workplace'],
-            'projects': ['project', 'assignment', 'task', 'deadline', 'homework'],
-            'relationships': ['friend', 'partner', 'family', 'relationship', 'boyfriend', 'girlfriend', 'husband', 'wife'],
-            'health': ['health', 'sick', 'tired', 'sleep', 'exercise', 'doctor', 'hospital'],
-            'hobbies': ['hobby', 'interest', 'game', 'music', 'sport', 'art', 'reading', 'movie'],
-            'school': ['school', 'college', 'university', 'class', 'exam', 'test', 'study']
-        }
-        
-        for topic, keywords in topics.items():
-            if any(keyword in message_lower for keyword in keywords):
-                self.companion_traits["topics_discussed"].add(topic)
+        self.companion_traits["topics_discussed"].update(lexicon.matching_topics(message_lower))
         
         # User interests (specific things mentioned)
-        interests = ['book', 'movie', 'music', 'game', 'sport', 'travel', 'food', 'art', 'reading', 'writing']
-        for interest in interests:
-            if interest in message_lower:
-                self.companion_traits["user_interests"].add(interest)
+        self.companion_traits["user_interests"].update(lexicon.matching_interests(message_lower))
 
-    def generate_companion_response(self, text: str, sentiment_info: Dict) -> str:
-        """Generate natural, contextual companion responses"""
+    def generate_companion_response(self, text: str, sentiment_info: Dict, record: bool = True) -> str:
+        """Generate natural, contextual companion responses
+
+        record=False when the caller appends both turns to the shared transcript itself.
+        """
         
         # Handle crisis first
         if sentiment_info['crisis_level'] == 'high':
@@ -141,7 +131,8 @@ class CompanionNLP:
             text, 
             emotion, 
             self.conversation_history,
-            self.companion_traits
+            self.companion_traits,
+            lexicon=route(text)
         )
         
         # Update first interaction flag
@@ -149,17 +140,19 @@ class CompanionNLP:
             self.companion_traits["first_interaction"] = False
         
         # Update conversation history
-        self.update_conversation_history(text, response, emotion)
+        if record:
+            self.update_conversation_history(text, response, emotion)
+        else:
+            self._extract_conversation_insights(text)
         
         return response
 
     def _get_crisis_response(self) -> str:
-        return """I'm really concerned about what you're sharing. Your safety is the most important thing.
+        contacts = "\n".join(f"• {line}" for line in get_resolver().lines(self.locale))
+        return f"""I'm really concerned about what you're sharing. Your safety is the most important thing.
 
 Please reach out immediately:
-• Suicide Prevention: 988
-• Crisis Text Line: Text HOME to 741741  
-• Emergency Services: 911
+{contacts}
 
 You deserve professional support right now."""
 
@@ -180,9 +173,10 @@ Would you like to talk about what's feeling most overwhelming?"""
         }
 
     def _get_emotion_trend(self) -> str:
-        if len(self.conversation_history) < 2:
+        history = self.transcript.exchanges(3)
+        if len(history) < 2:
             return "neutral"
-        recent_emotions = [exchange['emotion'] for exchange in self.conversation_history[-3:]]
+        recent_emotions = [exchange.emotion for exchange in history]
         return max(set(recent_emotions), key=recent_emotions.count)
 
 
@@ -283,21 +277,22 @@ class AdvancedResponseSystem:
             ]
         }
     
-    def generate_response(self, user_text: str, emotion: str, history: List, traits: Dict) -> str:
+    def generate_response(self, user_text: str, emotion: str, history: List, traits: Dict, lexicon=None) -> str:
         """Generate sophisticated contextual response"""
         
-        user_text_lower = user_text.lower()
+        lexicon = lexicon or route(user_text)
+        user_text_lower = lexicon.fold(user_text)
         
         # 1. Handle greetings (first message or simple hello)
-        if self._is_greeting(user_text_lower, traits):
+        if self._is_greeting(user_text_lower, traits, lexicon):
             return random.choice(self.response_templates['greetings'])
         
         # 2. Handle very short messages that aren't greetings
-        if len(user_text.split()) <= 2 and not self._contains_emotion_words(user_text_lower):
+        if len(user_text.split()) <= 2 and not self._contains_emotion_words(user_text_lower, lexicon):
             return random.choice(self.response_templates['acknowledgment'])
         
         # 3. Check for contextual follow-up based on content
-        contextual_response = self._get_contextual_follow_up(user_text_lower, traits)
+        contextual_response = self._get_contextual_follow_up(user_text_lower, traits, lexicon)
         if contextual_response:
             return contextual_response
         
@@ -313,41 +308,33 @@ class AdvancedResponseSystem:
         
         return response
     
-    def _is_greeting(self, text: str, traits: Dict) -> bool:
+    def _is_greeting(self, text: str, traits: Dict, lexicon=None) -> bool:
         """Check if this is a greeting situation"""
-        greetings = ['hi', 'hello', 'hey', 'good morning', 'good afternoon', 'good evening']
+        lexicon = lexicon or route(text)
         
         # First interaction greeting
-        if traits.get("first_interaction", True) and any(greeting in text for greeting in greetings):
+        if traits.get("first_interaction", True) and lexicon.is_greeting(text):
             return True
         
         # Simple greeting in ongoing conversation
-        if any(greeting in text for greeting in greetings) and len(text.split()) <= 4:
+        if lexicon.is_greeting(text) and len(text.split()) <= 4:
             return True
             
         return False
     
-    def _contains_emotion_words(self, text: str) -> bool:
+    def _contains_emotion_words(self, text: str, lexicon=None) -> bool:
         """Check if text contains emotion-related words"""
-        emotion_words = ['sad', 'happy', 'angry', 'scared', 'excited', 'worried', 'stressed']
-        return any(word in text for word in emotion_words)
+        lexicon = lexicon or route(text)
+        return lexicon.has_emotion_words(text)
     
-    def _get_contextual_follow_up(self, user_text: str, traits: Dict) -> str:
+    def _get_contextual_follow_up(self, user_text: str, traits: Dict, lexicon=None) -> str:
         """Get context-aware follow-up question"""
+        lexicon = lexicon or route(user_text)
         
         # Check for topic matches
-        topic_mapping = {
-            'work': ['work', 'job', 'career', 'boss', 'colleague', 'workplace'],
-            'projects': ['project', 'assignment', 'deadline', 'homework', 'task'],
-            'relationships': ['friend', 'partner', 'relationship', 'boyfriend', 'girlfriend', 'family'],
-            'health': ['health', 'sick', 'tired', 'sleep', 'exercise', 'doctor'],
-            'school': ['school', 'college', 'university', 'class', 'exam', 'study']
-        }
-        
-        for topic, keywords in topic_mapping.items():
-            if any(keyword in user_text for keyword in keywords):
-                if topic in self.response_templates['contextual']:
-                    return random.choice(self.response_templates['contextual'][topic])
+        for topic in lexicon.matching_topics(user_text, followup=True):
+            if topic in self.response_templates['contextual']:
+                return random.choice(self.response_templates['contextual'][topic])
         
         return None
     
@@ -357,7 +344,7 @@ class AdvancedResponseSystem:
             return None
         
         # Get recent user messages (excluding current one)
-        previous_texts = [h['user'].lower() for h in history[:-1]][-2:]  # Last 2 previous messages
+        previous_texts = [h.user.lower() for h in history[:-1]][-2:]  # Last 2 previous messages
         
         # Check for common topics between current and previous messages
         common_topics = ['work', 'project', 'friend', 'family', 'health', 'school', 'relationship']
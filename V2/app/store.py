@@ -0,0 +1,142 @@
+# app/store.py — durable append-only conversation log (SQLite, WAL mode)
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    role TEXT NOT NULL,
+    text TEXT NOT NULL,
+    emotion TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_messages_session_ts ON messages (session_id, ts);
+"""
+
+_STOP = object()
+
+
+class ConversationStore:
+    """Append-only message log shared by all sessions in the process.
+
+    Writes are queued and committed in batches by one writer thread, so the
+    Streamlit script thread never waits on disk. Reads go through a
+    per-thread connection; WAL mode lets them run alongside the writer.
+    """
+
+    def __init__(self, path: str = "data/conversations.db", batch_size: int = 64,
+                 flush_interval: float = 0.25):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="conversation-store", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    # -- writes ---------------------------------------------------------------
+
+    def append(self, session_id: str, role: str, text: str, emotion: Optional[str] = None,
+               ts: Optional[float] = None):
+        self._queue.put((session_id, ts if ts is not None else time.time(), role, text, emotion))
+
+    def flush(self, timeout: Optional[float] = None):
+        """Block until everything appended so far is committed."""
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        if not self._writer.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._writer.join()
+
+    def _write_loop(self):
+        conn = self._connect()
+        stopping = False
+        while not stopping:
+            rows, waiters = [], []
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    rows.append(item)
+                if stopping or waiters or len(rows) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if rows:
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO messages (session_id, ts, role, text, emotion) VALUES (?, ?, ?, ?, ?)",
+                        rows,
+                    )
+            for waiter in waiters:
+                waiter.set()
+        conn.close()
+
+    # -- reads ----------------------------------------------------------------
+
+    def recent(self, session_id: str, limit: int = 50) -> List[Dict]:
+        """Last ``limit`` messages of a session, oldest first."""
+        rows = self._reader().execute(
+            "SELECT ts, role, text, emotion FROM messages WHERE session_id = ? "
+            "ORDER BY ts DESC, id DESC LIMIT ?",
+            (session_id, limit),
+        ).fetchall()
+        return [self._row(r) for r in reversed(rows)]
+
+    def between(self, session_id: str, start_ts: float, end_ts: Optional[float] = None) -> List[Dict]:
+        end_ts = end_ts if end_ts is not None else time.time()
+        rows = self._reader().execute(
+            "SELECT ts, role, text, emotion FROM messages WHERE session_id = ? AND ts BETWEEN ? AND ? "
+            "ORDER BY ts, id",
+            (session_id, start_ts, end_ts),
+        ).fetchall()
+        return [self._row(r) for r in rows]
+
+    def count(self, session_id: str) -> int:
+        return self._reader().execute(
+            "SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)
+        ).fetchone()[0]
+
+    @staticmethod
+    def _row(row) -> Dict:
+        ts, role, text, emotion = row
+        return {"ts": ts, "role": role, "text": text, "emotion": emotion}
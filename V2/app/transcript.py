@@ -0,0 +1,112 @@
+# app/transcript.py — compact in-memory transcript shared by the UI and CompanionNLP
+#
+# One Transcript per session holds every turn as parallel arrays: a role code
+# and an emotion code (one byte each), an integer epoch timestamp, and a
+# reference to the message text. The UI renders from it and the engine reads
+# its recent exchanges from it, so each message's text exists once. Records are
+# materialized as tuples only while iterating.
+import sys
+import time
+from array import array
+from collections import namedtuple
+from typing import Iterable, List, Optional
+
+ROLES = ("user", "companion")
+_ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+# Interned emotion table, process-wide; code 0 means "no emotion recorded"
+_EMOTIONS: List[Optional[str]] = [None, "neutral", "joy", "sadness", "anger", "fear", "surprise", "disgust"]
+_EMOTION_CODES = {name: code for code, name in enumerate(_EMOTIONS) if name}
+
+Message = namedtuple("Message", "role text emotion ts")
+Exchange = namedtuple("Exchange", "user bot emotion ts")
+
+
+def emotion_code(emotion: Optional[str]) -> int:
+    if not emotion:
+        return 0
+    code = _EMOTION_CODES.get(emotion)
+    if code is None:
+        if len(_EMOTIONS) >= 256:
+            return _EMOTION_CODES["neutral"]
+        code = len(_EMOTIONS)
+        _EMOTIONS.append(sys.intern(emotion))
+        _EMOTION_CODES[_EMOTIONS[code]] = code
+    return code
+
+
+class Transcript:
+    """Bounded, array-backed message log for one session (oldest first)."""
+
+    __slots__ = ("max_messages", "_roles", "_emotions", "_ts", "_texts")
+
+    def __init__(self, max_messages: Optional[int] = None):
+        self.max_messages = max_messages
+        self._roles = array("B")
+        self._emotions = array("B")
+        self._ts = array("q")
+        self._texts: List[str] = []
+
+    def append(self, role: str, text: str, emotion: Optional[str] = None, ts: Optional[float] = None):
+        self._roles.append(_ROLE_CODES[role])
+        self._emotions.append(emotion_code(emotion))
+        self._ts.append(int(time.time() if ts is None else ts))
+        self._texts.append(text)
+        if self.max_messages is not None and len(self._texts) > self.max_messages:
+            self.trim(self.max_messages)
+
+    def extend(self, rows: Iterable[dict]):
+        """Append store rows ({'role', 'text', 'emotion', 'ts'}), oldest first."""
+        for row in rows:
+            self.append(row["role"], row["text"], row.get("emotion"), row["ts"])
+
+    def trim(self, keep: int):
+        drop = max(0, len(self._texts) - keep)
+        if drop:
+            del self._roles[:drop]
+            del self._emotions[:drop]
+            del self._ts[:drop]
+            del self._texts[:drop]
+
+    def clear(self):
+        self.trim(0)
+
+    def __len__(self):
+        return len(self._texts)
+
+    def __bool__(self):
+        return bool(self._texts)
+
+    def _message(self, i: int) -> Message:
+        return Message(ROLES[self._roles[i]], self._texts[i], _EMOTIONS[self._emotions[i]], self._ts[i])
+
+    def __getitem__(self, i: int) -> Message:
+        if i < 0:
+            i += len(self._texts)
+        if not 0 <= i < len(self._texts):
+            raise IndexError("transcript index out of range")
+        return self._message(i)
+
+    def __iter__(self):
+        for i in range(len(self._texts)):
+            yield self._message(i)
+
+    def exchanges(self, limit: Optional[int] = None) -> List[Exchange]:
+        """Most recent user→companion pairs (oldest first); a trailing user turn is skipped."""
+        user, companion = _ROLE_CODES["user"], _ROLE_CODES["companion"]
+        pairs = []
+        i = len(self._texts) - 1
+        while i > 0 and (limit is None or len(pairs) < limit):
+            if self._roles[i] == companion and self._roles[i - 1] == user:
+                emotion = _EMOTIONS[self._emotions[i]] or "neutral"
+                pairs.append(Exchange(self._texts[i - 1], self._texts[i], emotion, self._ts[i]))
+                i -= 2
+            else:
+                i -= 1
+        pairs.reverse()
+        return pairs
+
+    def nbytes(self) -> int:
+        """Approximate memory held by this transcript, text included."""
+        arrays = sum(sys.getsizeof(a) for a in (self._roles, self._emotions, self._ts))
+        return sys.getsizeof(self._texts) + arrays + sum(sys.getsizeof(t) for t in self._texts)
@@ -0,0 +1,256 @@
+# app/tts.py — text-to-speech in a dedicated worker process, one sentence at a time
+#
+# pyttsx3's runAndWait blocks and its drivers are not thread-safe, so a single
+# long-lived process owns the engine and every session's requests queue up in
+# front of it. Replies are split into sentences and each WAV is handed back as
+# soon as it is written, so the first sentence can play while the rest are
+# still rendering. Sentences from concurrent replies are taken round-robin so
+# one long reply does not hold up everybody else.
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import re
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+SENTENCE_TIMEOUT = 60.0  # seconds to wait for each sentence, queueing behind other replies included
+
+# Sentence ends: Latin, Devanagari danda, Arabic question mark
+_SENTENCE_RE = re.compile(r"(?<=[.!?।؟])\s+")
+
+
+def split_sentences(text: str, max_chars: int = 240):
+    """Split a reply into speakable sentences, breaking very long ones at spaces."""
+    pieces: List[str] = []
+    for sentence in _SENTENCE_RE.split(text.strip()):
+        sentence = sentence.strip()
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            pieces.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if sentence:
+            pieces.append(sentence)
+    return pieces
+
+
+def worker_loop(conn, make_speech):
+    """Worker process body: build the engine once, then render one sentence per message.
+
+    ``make_speech`` returns a loaded engine with ``synthesize(text, out_path)``.
+    """
+    try:
+        speech = make_speech()
+    except Exception as exc:
+        conn.send(("fatal", None, f"{type(exc).__name__}: {exc}"))
+        return
+    conn.send(("ready", None, None))
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        key, text, out_path = msg
+        try:
+            conn.send(("done", key, speech.synthesize(text, out_path)))
+        except Exception as exc:
+            conn.send(("error", key, f"{type(exc).__name__}: {exc}"))
+
+
+def _worker_main(conn, lang="en"):
+    def make_speech():
+        from .voice import Speech
+        speech = Speech(lang)
+        speech.load_tts()
+        return speech
+
+    worker_loop(conn, make_speech)
+
+
+class SpeechStream:
+    """WAV paths for one reply, in sentence order. The caller deletes each file.
+
+    Iteration raises TimeoutError when a sentence takes longer than ``timeout``
+    (a wedged engine), instead of blocking the session forever.
+    """
+
+    def __init__(self, owner: "SpeechQueue", request_id: int, total: int, timeout: float = SENTENCE_TIMEOUT):
+        self._owner = owner
+        self.request_id = request_id
+        self.total = total
+        self.timeout = timeout
+        self._results: "queue.Queue[Tuple[str, str]]" = queue.Queue()
+
+    def __iter__(self):
+        try:
+            for idx in range(self.total):
+                try:
+                    kind, payload = self._results.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"TTS sentence {idx + 1}/{self.total} not ready after {self.timeout:.0f}s") from None
+                if kind == "error":
+                    raise RuntimeError(payload)
+                yield payload
+        finally:
+            self.close()
+
+    def close(self):
+        """Drop sentences not yet rendered (e.g. the session moved on)."""
+        self._owner._forget(self.request_id)
+
+
+class SpeechQueue:
+    """Single pyttsx3 worker process shared by every session.
+
+    ``worker`` must be a top-level function of an importable module (the
+    process is spawned); it receives the pipe plus ``worker_args`` and
+    normally just calls ``worker_loop``.
+    """
+
+    def __init__(self, worker=_worker_main, worker_args=(), spool_dir: Optional[str] = None):
+        # spawn: the engine's driver threads must not be inherited via fork
+        self._ctx = mp.get_context("spawn")
+        self.worker = worker
+        self.worker_args = tuple(worker_args)
+        self.spool_dir = spool_dir or tempfile.mkdtemp(prefix="tts_")
+        self._ids = itertools.count(1)
+        self._pending: "OrderedDict[int, Deque[Tuple[int, str]]]" = OrderedDict()
+        self._streams: Dict[int, SpeechStream] = {}
+        self._in_flight: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+        self.startup_error = ""
+        self._start_worker()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._serve, name="tts-dispatch", daemon=True)
+        self._thread.start()
+
+    # -- public API -----------------------------------------------------------
+
+    def submit(self, text: str):
+        """Queue a reply for synthesis now; iterate the stream to collect its WAVs."""
+        sentences = split_sentences(text)
+        with self._lock:
+            if self.startup_error:
+                raise RuntimeError(self.startup_error)
+            request_id = next(self._ids)
+            stream = SpeechStream(self, request_id, len(sentences))
+            if sentences:
+                self._streams[request_id] = stream
+                self._pending[request_id] = deque(enumerate(sentences))
+        return stream
+
+    def stats(self):
+        with self._lock:
+            return {
+                "replies_waiting": len(self._pending),
+                "sentences_waiting": sum(len(q) for q in self._pending.values()),
+                "busy": int(self._in_flight is not None),
+            }
+
+    def live_paths(self):
+        """Spool paths of replies still being synthesized or read (for the memory ledger)."""
+        with self._lock:
+            return {self._path(request_id, idx)
+                    for request_id, stream in self._streams.items() for idx in range(stream.total)}
+
+    def shutdown(self):
+        self._closed.set()
+        self._thread.join(timeout=5)
+        try:
+            self._conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self._process.join(timeout=5)
+        self._conn.close()
+
+    # -- internals ------------------------------------------------------------
+
+    def _start_worker(self):
+        self._conn, child = self._ctx.Pipe()
+        self._process = self._ctx.Process(
+            target=self.worker, args=(child,) + self.worker_args, daemon=True
+        )
+        self._process.start()
+        child.close()
+        self._ready = False
+
+    def _forget(self, request_id: int):
+        with self._lock:
+            self._pending.pop(request_id, None)
+            self._streams.pop(request_id, None)
+
+    def _path(self, request_id: int, idx: int):
+        return os.path.join(self.spool_dir, f"{request_id}-{idx}.wav")
+
+    def _dispatch(self):
+        if not self._ready or self._in_flight is not None or not self._pending:
+            return
+        # Round-robin: one sentence from the oldest reply, then it goes to the back
+        request_id, sentences = next(iter(self._pending.items()))
+        idx, text = sentences.popleft()
+        if sentences:
+            self._pending.move_to_end(request_id)
+        else:
+            del self._pending[request_id]
+        self._in_flight = (request_id, idx)
+        self._conn.send(((request_id, idx), text, self._path(request_id, idx)))
+
+    def _fail_all(self, error: str):
+        for stream in self._streams.values():
+            stream._results.put(("error", error))
+        self._pending.clear()
+        self._streams.clear()
+
+    def _handle(self, kind: str, key, payload):
+        if kind == "ready":
+            self._ready = True
+            return
+        if kind == "fatal":
+            self.startup_error = payload
+            self._fail_all(payload)
+            return
+        self._in_flight = None
+        stream = self._streams.get(key[0])
+        if stream is None:
+            # Reply was abandoned while this sentence rendered
+            if kind == "done":
+                try:
+                    os.unlink(payload)
+                except OSError:
+                    pass
+            return
+        stream._results.put((kind, payload))
+        if kind == "error":
+            self._pending.pop(key[0], None)
+            self._streams.pop(key[0], None)
+
+    def _serve(self):
+        while not self._closed.is_set():
+            with self._lock:
+                if self.startup_error:
+                    return
+                self._dispatch()
+            try:
+                if not self._conn.poll(0.1):
+                    continue
+                kind, key, payload = self._conn.recv()
+            except (EOFError, OSError):
+                self._restart()
+                continue
+            with self._lock:
+                self._handle(kind, key, payload)
+
+    def _restart(self):
+        with self._lock:
+            if not self._ready:
+                # Died before loading the engine: restarting would just loop
+                self._handle("fatal", None, "TTS worker exited during startup")
+                return
+            if self._in_flight is not None:
+                self._handle("error", self._in_flight, "TTS worker process exited")
+            self._process.terminate()
+            self._process.join(timeout=5)
+            self._conn.close()
+            self._start_worker()
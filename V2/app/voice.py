@@ -1,4 +1,6 @@
 # app/voice.py — offline TTS via pyttsx3 and RMS using soundfile + numpy
+# Synthesis runs in the app/tts.py worker process; don't call it from the UI thread.
+import base64
 import pyttsx3
 import tempfile
 import soundfile as sf
@@ -9,13 +11,22 @@ import os
 class Speech:
     def __init__(self, lang="en"):
         self.lang = lang
-        self.engine = pyttsx3.init()
-        self.engine.setProperty("rate", 165)
-        self.engine.setProperty("volume", 0.95)
-        # voice selection left to OS default
+        # Created on first use: RMS helpers don't need a TTS driver
+        self.engine = None
+
+    def load_tts(self):
+        if self.engine is None:
+            self.engine = pyttsx3.init()
+            self.engine.setProperty("rate", 165)
+            self.engine.setProperty("volume", 0.95)
+            # voice selection left to OS default
+        return self.engine
 
     def synthesize(self, text: str, out_path: str = None) -> str:
-        out_path = out_path or tempfile.mktemp(suffix=".wav")
+        self.load_tts()
+        if out_path is None:
+            fd, out_path = tempfile.mkstemp(suffix=".wav")
+            os.close(fd)
         # pyttsx3 writes to file synchronously
         self.engine.save_to_file(text, out_path)
         self.engine.runAndWait()
@@ -44,3 +55,11 @@ class Speech:
             if m > 0:
                 rms = [r/m for r in rms]
         return rms
+
+    def lipsync_timeline(self, wav_path: str, chunk_ms: int = 60) -> dict:
+        """Mouth envelope for the avatar: normalized RMS per frame as uint8, base64-encoded.
+
+        A few hundred bytes per reply; the canvas indexes it by audio currentTime.
+        """
+        levels = np.round(np.asarray(self.rms_from_wav(wav_path, chunk_ms)) * 255).astype(np.uint8)
+        return {"levels": base64.b64encode(levels.tobytes()).decode("ascii"), "frame_ms": chunk_ms}
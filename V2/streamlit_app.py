@@ -1,7 +1,17 @@
 import streamlit as st
 from app.nlp import CompanionNLP
-from app.avatars import render_dot_avatar, render_emotional_indicator
+from app.avatars import queue_avatar_clip, render_dot_avatar, render_emotional_indicator
+from app.helplines import get_resolver
+from app.memwatch import debug_panel_enabled, get_ledger
+from app.store import ConversationStore
+from app.transcript import Transcript
+from app.tts import SpeechQueue
+from app.voice import Speech
+import base64
 import datetime
+import os
+import time
+import uuid
 
 # Page configuration
 st.set_page_config(
@@ -64,16 +74,70 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Initialize companion
+# Messages kept in memory per session; older ones stay in the store
+MAX_VISIBLE_MESSAGES = 60
+
+@st.cache_resource
+def load_store():
+    return ConversationStore(os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "conversations.db"))
+
+@st.cache_resource
+def load_tts():
+    # One pyttsx3 worker process for every session; replies queue in front of it
+    return SpeechQueue()
+
 @st.cache_resource
-def load_companion():
-    return CompanionNLP()
+def load_speech():
+    # UI-side helpers only (envelope, duration estimate); synthesis is in the worker
+    return Speech()
+
+def read_clip(wav_path):
+    # A synthesized sentence as the avatar plays it; the WAV is gone once read
+    with open(wav_path, "rb") as fh:
+        clip = {"audio": base64.b64encode(fh.read()).decode("ascii")}
+    clip.update(load_speech().lipsync_timeline(wav_path))
+    os.unlink(wav_path)
+    return clip
+
+def get_session_id():
+    # The id lives in the URL so a reconnect or server restart finds the same session
+    sid = st.query_params.get("sid")
+    if not sid:
+        sid = uuid.uuid4().hex
+        st.query_params["sid"] = sid
+    return sid
+
+def add_message(role, text, emotion=None):
+    # The same str goes to the store and the session transcript (shared with the companion)
+    now = time.time()
+    store.append(session_id, role, text, emotion=emotion, ts=now)
+    st.session_state.conversation.append(role, text, emotion=emotion, ts=now)
+
+store = load_store()
+session_id = get_session_id()
 
-companion = load_companion()
+# Session state initialization (hydrated from the store on reconnect)
+if st.session_state.get("session_id") != session_id:
+    recent = store.recent(session_id, limit=MAX_VISIBLE_MESSAGES)
+    st.session_state.session_id = session_id
+    # One compact transcript per session: the UI renders it, the companion reads context from it
+    st.session_state.conversation = Transcript(max_messages=MAX_VISIBLE_MESSAGES)
+    st.session_state.companion = CompanionNLP(transcript=st.session_state.conversation)
+    st.session_state.companion.restore_history(recent)
+
+companion = st.session_state.companion
+
+with st.sidebar:
+    locales = get_resolver().locales()
+    locale = st.selectbox(
+        "Region (for helplines)",
+        locales,
+        index=locales.index("en-US") if "en-US" in locales else 0,
+        format_func=lambda code: f"{get_resolver().resolve(code)['country']} ({code})"
+    )
+    speak_replies = st.toggle("🔊 Read replies aloud", value=False)
+companion.locale = locale
 
-# Session state initialization
-if "conversation" not in st.session_state:
-    st.session_state.conversation = []
 if "emotional_state" not in st.session_state:
     st.session_state.emotional_state = {
         'dominant_emotion': 'neutral',
@@ -98,24 +162,26 @@ with col1:
     
     # Conversation display
     chat_container = st.container()
+    html_bytes = 0  # markup sent for the transcript this run (memory panel)
     with chat_container:
         for msg in st.session_state.conversation:
-            if msg["role"] == "user":
-                st.markdown(
+            msg_time = datetime.datetime.fromtimestamp(msg.ts).strftime("%H:%M")
+            if msg.role == "user":
+                html = (
                     f'<div class="message-user">'
-                    f'<div><strong>You:</strong> {msg["text"]}</div>'
-                    f'<div class="message-time">{msg.get("time", "")}</div>'
-                    f'</div>', 
-                    unsafe_allow_html=True
+                    f'<div><strong>You:</strong> {msg.text}</div>'
+                    f'<div class="message-time">{msg_time}</div>'
+                    f'</div>'
                 )
             else:
-                st.markdown(
+                html = (
                     f'<div class="message-companion">'
-                    f'<div><strong>Bot:</strong> {msg["text"]}</div>'
-                    f'<div class="message-time">{msg.get("time", "")}</div>'
-                    f'</div>', 
-                    unsafe_allow_html=True
+                    f'<div><strong>Bot:</strong> {msg.text}</div>'
+                    f'<div class="message-time">{msg_time}</div>'
+                    f'</div>'
                 )
+            html_bytes += len(html.encode("utf-8"))
+            st.markdown(html, unsafe_allow_html=True)
 
     # User input
     st.markdown("### 💭 Share what's on your mind")
@@ -145,7 +211,10 @@ with col1:
         pass  # Submit button is in form
     with col_act2:
         if st.button("🔄 Fresh Start", use_container_width=True):
-            st.session_state.conversation = []
+            # New session id; the old transcript stays in the store
+            st.query_params["sid"] = uuid.uuid4().hex
+            st.session_state.session_id = None
+            st.session_state.conversation = Transcript()
             st.session_state.emotional_state = {
                 'dominant_emotion': 'neutral',
                 'emotion_scores': {},
@@ -161,14 +230,9 @@ with col1:
     # Process submission
     if submit and user_input and user_input.strip():
         text = user_input.strip()
-        current_time = datetime.datetime.now().strftime("%H:%M")
         
         # Add user message
-        st.session_state.conversation.append({
-            "role": "user", 
-            "text": text,
-            "time": current_time
-        })
+        add_message("user", text)
         
         # Generate response immediately
         with st.spinner("💫 Bot is thinking..."):
@@ -178,15 +242,14 @@ with col1:
                 st.session_state.emotional_state = sentiment_info
                 
                 # Generate response
-                response = companion.generate_companion_response(text, sentiment_info)
+                response = companion.generate_companion_response(text, sentiment_info, record=False)
                 
                 # Add bot response
-                st.session_state.conversation.append({
-                    "role": "companion", 
-                    "text": response,
-                    "emotion": sentiment_info['dominant_emotion'],
-                    "time": datetime.datetime.now().strftime("%H:%M")
-                })
+                add_message("companion", response, emotion=sentiment_info['dominant_emotion'])
+                if speak_replies:
+                    # Played after the rerun below, next to the avatar
+                    st.session_state.pending_speech = load_tts().submit(response)
+                    get_ledger().watch(load_tts().spool_dir, live=load_tts().live_paths)
                 
                 # Show insight
                 emotion_emoji = {
@@ -198,13 +261,12 @@ with col1:
                 
                 # Crisis warnings
                 if sentiment_info['crisis_level'] == 'high':
-                    st.error("""
-                    🚨 **Immediate Support Needed**
-                    Your safety is the most important thing. Please contact:
-                    • **988** Suicide Prevention Lifeline
-                    • **911** Emergency Services
-                    • Text **HOME** to **741741**
-                    """)
+                    contacts = "\n".join(f"• **{line}**" for line in get_resolver().lines(locale))
+                    st.error(f"""
+🚨 **Immediate Support Needed**
+Your safety is the most important thing. Please contact:
+{contacts}
+""")
                 elif sentiment_info['crisis_level'] == 'medium':
                     st.warning("""
                     ⚠️ **Additional Support Available**
@@ -214,21 +276,47 @@ with col1:
             except Exception as e:
                 st.error(f"An error occurred: {e}")
                 # Add fallback response
-                st.session_state.conversation.append({
-                    "role": "companion",
-                    "text": "I'm here with you. Could you tell me more about what's on your mind?",
-                    "emotion": "neutral",
-                    "time": datetime.datetime.now().strftime("%H:%M")
-                })
+                add_message(
+                    "companion",
+                    "I'm here with you. Could you tell me more about what's on your mind?",
+                    emotion="neutral"
+                )
         
         st.rerun()
 
 with col2:
     st.markdown("### 🎭 Bot's Reactions")
     
+    # Spoken reply: each sentence's audio plus its mouth envelope, played by the avatar.
+    # The avatar starts on the first clip; the rest are handed to it as they are synthesized.
+    speech_clips = []
+    speech_stream = st.session_state.pop("pending_speech", None)
+    if speech_stream is not None:
+        speech_stream = iter(speech_stream)
+        try:
+            first = next(speech_stream, None)
+            if first is not None:
+                speech_clips.append(read_clip(first))
+        except Exception as e:
+            st.caption(f"Voice unavailable: {e}")
+
+    # Without audio the mouth moves for roughly as long as the reply takes to read
+    speaking_ms = None
+    if not speech_clips and st.session_state.conversation and st.session_state.conversation[-1].role != "user":
+        speaking_ms = load_speech().estimate_speaking_ms(st.session_state.conversation[-1].text)
+
     # Avatar
     if st.session_state.emotional_state:
-        render_dot_avatar(st.session_state.emotional_state)
+        render_dot_avatar(st.session_state.emotional_state, speech_clips=speech_clips, speaking_ms=speaking_ms)
+    if speech_clips:
+        try:
+            for index, wav_path in enumerate(speech_stream, start=1):
+                clip = read_clip(wav_path)
+                if st.session_state.emotional_state:
+                    queue_avatar_clip(index, clip)
+        except Exception as e:
+            st.caption(f"Voice unavailable: {e}")
+    if st.session_state.emotional_state:
         render_emotional_indicator(st.session_state.emotional_state)
     
     st.markdown("---")
@@ -276,6 +364,37 @@ if st.session_state.show_stats and st.session_state.conversation:
     with col_stat3:
         st.metric("Mood", summary['current_emotion_trend'].title())
 
+# Memory accounting: this session's sizes go to the process-wide ledger every run
+ledger = get_ledger()
+ledger.record(session_id, ledger.measure(st.session_state, html_bytes=html_bytes), owner=companion)
+# Operators only: the panel shows every session and can delete files
+if debug_panel_enabled():
+    with st.sidebar:
+        with st.expander("🩺 Memory (debug)"):
+            metrics = ledger.metrics()
+            mib = 1024 * 1024
+            col_m1, col_m2 = st.columns(2)
+            col_m1.metric("Process RSS", f"{metrics['process_rss_bytes'] / mib:.0f} MiB")
+            col_m2.metric("Sessions held", metrics["sessions_held"], help=f"{metrics['sessions_idle']} idle")
+            col_m1.metric("All sessions", f"{metrics['session_bytes_total'] / 1024:.0f} KiB")
+            col_m2.metric("Orphaned audio", metrics["orphan_files"], help=f"{metrics['orphan_bytes'] / 1024:.0f} KiB")
+            st.caption("This session, bytes per component")
+            st.json(next((row for row in ledger.sessions() if row["session"] == session_id), {}))
+            if metrics["orphan_files"] and st.button("Delete orphaned audio"):
+                st.caption(f"Removed {ledger.sweep()} files")
+            # tracemalloc slows every allocation; only on while someone is looking
+            trace = st.toggle("Trace allocations (tracemalloc)", value=ledger.tracing)
+            if trace and not ledger.tracing:
+                ledger.start_tracing()
+            elif not trace and ledger.tracing:
+                ledger.stop_tracing()
+            if ledger.tracing:
+                st.caption(f"Traced {metrics.get('traced_bytes', 0) / mib:.1f} MiB (peak {metrics.get('traced_peak_bytes', 0) / mib:.1f} MiB)")
+                st.caption("Growth since the previous check, by allocation site")
+                st.dataframe(ledger.heap_diff(), use_container_width=True)
+            st.caption("All metrics")
+            st.json(metrics, expanded=False)
+
 # Footer
 st.markdown("---")
 st.markdown("""